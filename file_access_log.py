@@ -0,0 +1,173 @@
+import os
+import json
+import time
+import queue
+import atexit
+import random
+import logging
+import threading
+from logging.handlers import QueueHandler
+
+"""
+* AccessLog mencatat satu record ringkas per request (perintah, nama
+file, bytes masuk/keluar, status, service time). Thread yang melayani
+request hanya memasukkan tuple ke queue.SimpleQueue; format JSON dan
+write ke file dikerjakan thread writer di belakang, beberapa record
+sekaligus dalam satu write()
+
+* sample_rate < 1 hanya mencatat sebagian request yang sukses (error
+selalu dicatat). Kalau access log tidak diaktifkan, record() langsung
+return setelah satu pengecekan atribut
+
+* file dibuka dengan O_APPEND dan setiap batch ditulis dengan satu
+os.write, jadi worker server processpool boleh menulis ke file yang sama
+
+* TraceLog memakai mekanisme yang sama untuk merekam trace workload
+(waktu datang, perintah, nama, ukuran, tanpa payload) yang bisa
+diputar ulang dengan file_trace_replay. Trace selalu mencatat semua
+request, tidak di-sample
+
+* AsyncHandler memindahkan log diagnostik biasa (logging.warning dst.)
+ke thread background dengan cara yang sama: record masuk queue, format
+dan I/O ke stderr/file dikerjakan handler asli di thread lain.
+setup_logging() memasangnya sebagai handler root logger
+"""
+
+LOG_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+MAX_BATCH = 1024        # record maksimal per write()
+
+
+class AccessLog:
+    def __init__(self, path=None, sample_rate=1.0):
+        self.path = path
+        self.sample_rate = sample_rate
+        self.enabled = bool(path) and sample_rate > 0
+        self.queue = queue.SimpleQueue()
+        self.writer = None
+        self.lock = threading.Lock()
+
+    def record(self, command, name='', bytes_in=0, bytes_out=0, ok=True, seconds=0.0):
+        if not self.enabled:
+            return
+        if ok and self.sample_rate < 1 and random.random() >= self.sample_rate:
+            return
+        if self.writer is None:
+            self.start()
+        self.queue.put((time.time(), command, name, bytes_in, bytes_out, ok, seconds))
+
+    def start(self):
+        # Thread writer dibuat saat record pertama, jadi juga jalan di worker hasil fork
+        with self.lock:
+            if self.writer is None:
+                self.writer = threading.Thread(target=self.write_loop, name='access-log', daemon=True)
+                self.writer.start()
+                atexit.register(self.close)
+
+    @staticmethod
+    def format(entry):
+        ts, command, name, bytes_in, bytes_out, ok, seconds = entry
+        return json.dumps({'ts': round(ts, 6), 'pid': os.getpid(), 'command': command, 'name': name,
+                           'bytes_in': bytes_in, 'bytes_out': bytes_out, 'status': 'OK' if ok else 'ERROR',
+                           'ms': round(seconds * 1000, 3)}, separators=(',', ':')) + '\n'
+
+    def write_loop(self):
+        try:
+            fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        except OSError as e:
+            logging.warning(f"access log disabled: {str(e)}")
+            self.enabled = False
+            return
+        try:
+            while True:
+                batch = [self.queue.get()]
+                # Ambil semua yang sudah antri tanpa menunggu lagi
+                try:
+                    while len(batch) < MAX_BATCH:
+                        batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    pass
+                closing = None in batch
+                lines = ''.join(self.format(entry) for entry in batch if entry is not None)
+                if lines:
+                    os.write(fd, lines.encode())
+                if closing:
+                    return
+        except OSError as e:
+            logging.warning(f"access log disabled: {str(e)}")
+            self.enabled = False
+        finally:
+            os.close(fd)
+
+    def close(self):
+        # Tulis sisa record di queue lalu hentikan writer
+        if self.writer is not None:
+            self.queue.put(None)
+            self.writer.join(timeout=5)
+            self.writer = None
+
+
+class TraceLog(AccessLog):
+    def __init__(self, path=None):
+        super().__init__(path, sample_rate=1.0)
+
+    @staticmethod
+    def format(entry):
+        # t = waktu request datang (selesai - service time), urutan baris mengikuti waktu selesai
+        ts, command, name, bytes_in, bytes_out, ok, seconds = entry
+        return json.dumps({'t': round(ts - seconds, 6), 'command': command, 'name': name, 'size_in': bytes_in,
+                           'size_out': bytes_out, 'status': 'OK' if ok else 'ERROR'}, separators=(',', ':')) + '\n'
+
+
+class AsyncHandler(QueueHandler):
+    def __init__(self, handlers):
+        super().__init__(queue.SimpleQueue())
+        self.handlers = handlers
+        self.thread = None
+        self.start_lock = threading.Lock()
+        # Thread tidak ikut ter-fork: worker processpool memulai thread-nya sendiri
+        os.register_at_fork(after_in_child=self.forked)
+
+    def forked(self):
+        self.queue = queue.SimpleQueue()
+        self.thread = None
+        self.start_lock = threading.Lock()
+
+    def prepare(self, record):
+        # Queue di process yang sama: record tidak perlu di-format di thread pemanggil
+        return record
+
+    def enqueue(self, record):
+        if self.thread is None:
+            with self.start_lock:
+                if self.thread is None:
+                    self.thread = threading.Thread(target=self.drain, name='log-writer', daemon=True)
+                    self.thread.start()
+        self.queue.put_nowait(record)
+
+    def drain(self):
+        while True:
+            record = self.queue.get()
+            if record is None:
+                return
+            for handler in self.handlers:
+                if record.levelno >= handler.level:
+                    handler.handle(record)
+
+    def close(self):
+        # Dipanggil logging.shutdown saat exit: kosongkan queue dulu supaya log terakhir tidak hilang
+        if self.thread is not None:
+            self.queue.put_nowait(None)
+            self.thread.join(timeout=5)
+            self.thread = None
+        for handler in self.handlers:
+            handler.close()
+        super().close()
+
+
+def setup_logging(level=logging.WARNING, handlers=None, fmt=LOG_FORMAT):
+    # Pengganti logging.basicConfig: handler asli dijalankan di thread background
+    handlers = handlers or [logging.StreamHandler()]
+    formatter = logging.Formatter(fmt)
+    for handler in handlers:
+        handler.setFormatter(formatter)
+    logging.basicConfig(level=level, handlers=[AsyncHandler(handlers)], force=True)
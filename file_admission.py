@@ -0,0 +1,221 @@
+import os
+import time
+import asyncio
+import threading
+
+from file_protocol import STREAMED_UPLOADS
+
+"""
+* AdmissionController membagi request ke dua lane dengan batas
+concurrency masing-masing: lane small (LIST, STATS, DELETE, GET/UPLOAD
+kecil, ...) dan lane large (transfer di atas SMALL_MAX_BYTES). Slot
+pool server tidak lagi dipegang per koneksi tapi per request, jadi LIST
+tidak perlu menunggu upload 100 MB selesai
+
+* biaya request ditaksir dari perintah dan ukurannya: payload_len di
+header biner / panjang perintah teks untuk upload, ukuran file di disk
+untuk GET dan MGET. Upload teks yang di-stream ukurannya belum
+diketahui, jadi selalu masuk lane large
+
+* lane large juga membatasi total bytes yang sedang ditransfer
+(max_inflight_bytes). Kalau lane penuh, request menunggu paling lama
+queue_timeout; kalau antriannya sudah max_queue atau waktunya habis,
+request ditolak dengan ServerBusy yang membawa retry_after (detik)
+"""
+
+SMALL = 'small'
+LARGE = 'large'
+
+SMALL_MAX_BYTES = 1024 * 1024
+MAX_INFLIGHT_BYTES = 1024 * 1024 * 1024
+QUEUE_TIMEOUT = 30      # detik maksimal menunggu slot
+MAX_QUEUE = 64          # request yang boleh antri per lane sebelum langsung ditolak
+RETRY_AFTER = 1.0       # dasar hint retry_after (detik)
+ASYNC_POLL = 0.01       # interval cek ulang slot untuk server asyncio
+
+UNLIMITED = float('inf')
+
+
+class ServerBusy(Exception):
+    def __init__(self, lane, retry_after):
+        super().__init__(f'Server busy ({lane} requests), retry after {retry_after:g}s')
+        self.lane = lane
+        self.retry_after = retry_after
+
+
+def busy_result(error, batch=False):
+    # Respons JSON untuk request yang ditolak; respons batch harus tetap diakhiri done=True
+    hasil = dict(status='ERROR', data=str(error), retry_after=error.retry_after)
+    if batch:
+        hasil['done'] = True
+    return hasil
+
+
+def known_size(filename):
+    try:
+        return os.stat(filename).st_size
+    except (OSError, ValueError):
+        return 0
+
+
+def request_cost(c_request, filename='', args=(), body_len=0, names=()):
+    # Return (lane, bytes) untuk satu request
+    if c_request == 'get':
+        size = known_size(filename)
+        try:
+            offset = int(args[0]) if len(args) > 0 else 0
+            length = int(args[1]) if len(args) > 1 else None
+        except ValueError:
+            offset, length = 0, None
+        nbytes = max(size - offset, 0) if length is None else max(min(length, size - offset), 0)
+    elif c_request == 'mget':
+        nbytes = sum(known_size(name) for name in names)
+    elif c_request in STREAMED_UPLOADS or c_request == 'mupload':
+        if body_len is None:
+            return LARGE, 0     # upload teks yang di-stream, ukurannya belum diketahui
+        nbytes = body_len
+    else:
+        nbytes = 0
+    return (LARGE if nbytes > SMALL_MAX_BYTES else SMALL), nbytes
+
+
+def text_request_cost(command):
+    c_request = command[:16].split(None, 1)[0].lower() if command.strip() else ''
+    if c_request in STREAMED_UPLOADS or c_request == 'mupload':
+        return request_cost(c_request, body_len=len(command))
+    if c_request in ('get', 'mget'):
+        parts = command.split()
+        return request_cost(c_request, parts[1] if len(parts) > 1 else '', parts[2:], names=parts[1:])
+    return request_cost(c_request)
+
+
+class Ticket:
+    # Slot yang didapat dari AdmissionController, dilepas dengan release() atau `with`
+    def __init__(self, controller, lane, nbytes):
+        self.controller = controller
+        self.lane = lane
+        self.nbytes = nbytes
+        self.released = False
+
+    def release(self):
+        if not self.released:
+            self.released = True
+            self.controller.release(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+class AdmissionController:
+    def __init__(self, small_slots=UNLIMITED, large_slots=UNLIMITED, max_inflight_bytes=MAX_INFLIGHT_BYTES,
+                 queue_timeout=QUEUE_TIMEOUT, max_queue=MAX_QUEUE, metrics=None):
+        self.limits = {SMALL: small_slots, LARGE: large_slots}
+        self.max_inflight_bytes = max_inflight_bytes
+        self.queue_timeout = queue_timeout
+        self.max_queue = max_queue
+        # metrics (opsional): gauge queued/busy dan counter rejected ikut di-update
+        self.metrics = metrics
+        self.cond = threading.Condition()
+        self.active = {SMALL: 0, LARGE: 0}
+        self.waiting = {SMALL: 0, LARGE: 0}
+        self.inflight_bytes = 0     # hanya lane large
+        self.rejected = {SMALL: 0, LARGE: 0}
+
+    def count(self, name, delta=1):
+        if self.metrics is not None:
+            self.metrics.add(name, delta)
+
+    def fits(self, lane, nbytes):
+        if self.active[lane] >= self.limits[lane]:
+            return False
+        if lane == SMALL:
+            return True
+        # Satu transfer yang lebih besar dari batas tetap boleh jalan kalau tidak ada transfer lain
+        return self.inflight_bytes == 0 or self.inflight_bytes + nbytes <= self.max_inflight_bytes
+
+    def take(self, lane, nbytes):
+        self.active[lane] += 1
+        if lane == LARGE:
+            self.inflight_bytes += nbytes
+        self.count('busy')
+        return Ticket(self, lane, nbytes)
+
+    def busy(self, lane):
+        # Perkiraan kasar: makin panjang antrian dibanding slot, makin lama klien sebaiknya menunggu
+        self.rejected[lane] += 1
+        self.count('rejected')
+        retry_after = round(RETRY_AFTER * (1 + self.waiting[lane] / max(min(self.limits[lane], MAX_QUEUE), 1)), 1)
+        return ServerBusy(lane, retry_after)
+
+    def enqueue(self, lane):
+        if self.waiting[lane] >= self.max_queue:
+            raise self.busy(lane)
+        self.waiting[lane] += 1
+        self.count('queued')
+
+    def dequeue(self, lane):
+        self.waiting[lane] -= 1
+        self.count('queued', -1)
+
+    def acquire(self, lane, nbytes=0):
+        # Untuk server thread/process: tunggu slot paling lama queue_timeout, lalu ServerBusy
+        with self.cond:
+            if self.fits(lane, nbytes):
+                return self.take(lane, nbytes)
+            self.enqueue(lane)
+            try:
+                deadline = time.monotonic() + self.queue_timeout
+                while not self.fits(lane, nbytes):
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise self.busy(lane)
+                    self.cond.wait(remaining)
+                return self.take(lane, nbytes)
+            finally:
+                self.dequeue(lane)
+
+    async def acquire_async(self, lane, nbytes=0):
+        # Untuk event loop: tidak memblokir loop, slot dicek ulang setiap ASYNC_POLL detik
+        with self.cond:
+            if self.fits(lane, nbytes):
+                return self.take(lane, nbytes)
+            self.enqueue(lane)
+        try:
+            deadline = time.monotonic() + self.queue_timeout
+            while True:
+                await asyncio.sleep(ASYNC_POLL)
+                with self.cond:
+                    if self.fits(lane, nbytes):
+                        return self.take(lane, nbytes)
+                    if time.monotonic() >= deadline:
+                        raise self.busy(lane)
+        finally:
+            with self.cond:
+                self.dequeue(lane)
+
+    def release(self, ticket):
+        with self.cond:
+            self.active[ticket.lane] -= 1
+            if ticket.lane == LARGE:
+                self.inflight_bytes -= ticket.nbytes
+            self.count('busy', -1)
+            self.cond.notify_all()
+
+    def stats(self):
+        with self.cond:
+            return dict(active=dict(self.active), waiting=dict(self.waiting), rejected=dict(self.rejected),
+                        inflight_bytes=self.inflight_bytes)
+
+
+def admission_controller(options=None, default_slots=UNLIMITED, metrics=None):
+    # Buat controller dari server_options(); slot yang tidak diisi memakai default engine
+    options = options or {}
+    small_slots = options.get('small_slots') or default_slots
+    large_slots = options.get('large_slots') or default_slots
+    return AdmissionController(small_slots, large_slots,
+                               max_inflight_bytes=options.get('max_inflight_bytes', MAX_INFLIGHT_BYTES),
+                               queue_timeout=options.get('queue_timeout', QUEUE_TIMEOUT),
+                               max_queue=options.get('max_queue', MAX_QUEUE), metrics=metrics)
@@ -0,0 +1,225 @@
+import os
+import json
+import time
+import base64
+import asyncio
+import logging
+
+import file_binary_protocol as fbp
+from file_framing import DELIMITER
+
+try:
+    import resource
+except ImportError:     # Windows
+    resource = None
+
+"""
+* AsyncLoadGenerator mensimulasikan banyak klien (ribuan) dari satu
+process dengan asyncio: satu coroutine dan satu koneksi per klien,
+bukan satu thread/process per klien seperti executor thread/process
+di StressTestClient
+
+* operasinya sama (list/upload/download, teks maupun biner). Isi file
+upload dibaca dari disk per CHUNK_SIZE dan langsung dikirim, body
+download dibaca per chunk lalu dibuang (hanya dihitung), jadi memory
+per klien terbatas berapa pun ukuran file dan jumlah kliennya
+
+* semua hasil dikumpulkan di process yang sama dengan format dict yang
+sama dengan remote_list/remote_upload/remote_download, sehingga
+statistik, CSV dan JSON StressTestClient dipakai apa adanya
+"""
+
+CHUNK_SIZE = 64 * 1024
+READ_LIMIT = 16 * 1024 * 1024   # batas readuntil untuk respons teks kecil (LIST, UPLOAD)
+TIMEOUT = 600
+
+
+def raise_open_files_limit():
+    # Ribuan koneksi butuh lebih banyak file descriptor dari default soft limit (sering 1024)
+    if resource is None:
+        return
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < hard:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+
+class AsyncLoadGenerator:
+    def __init__(self, server_address=('localhost', 6666), binary=False, requests_per_worker=1, rate=None,
+                 duration=10):
+        self.server_address = server_address
+        self.binary = binary
+        self.requests_per_worker = requests_per_worker
+        self.rate = rate
+        self.duration = duration
+
+    def run(self, operation, test_file, clients):
+        # Return list hasil per klien (atau per request terjadwal kalau open loop)
+        raise_open_files_limit()
+        return asyncio.run(self.run_all(operation, test_file, clients))
+
+    async def run_all(self, operation, test_file, clients):
+        if not self.rate:
+            return await asyncio.gather(*(self.run_client(operation, test_file, i) for i in range(clients)))
+
+        # Open loop: sama seperti submit_open_loop, paling banyak `clients` request berjalan
+        # sekaligus dan latency dihitung dari waktu jadwal (termasuk waktu menunggu slot)
+        slots = asyncio.Semaphore(clients)
+
+        async def scheduled_client(worker_id, scheduled):
+            async with slots:
+                return await self.run_client(operation, test_file, worker_id, scheduled)
+
+        tasks = []
+        start = time.time()
+        for i in range(max(int(self.rate * self.duration), 1)):
+            scheduled = start + i / self.rate
+            delay = scheduled - time.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            tasks.append(asyncio.create_task(scheduled_client(i % clients, scheduled)))
+        return await asyncio.gather(*tasks)
+
+    async def run_client(self, operation, test_file, worker_id, scheduled=None):
+        start_time = time.time()
+        file_size = os.path.getsize(test_file) if test_file else 0
+        result = {'worker_id': worker_id, 'operation': operation, 'file_size': file_size}
+        writer = None
+        try:
+            reader, writer = await asyncio.wait_for(
+                asyncio.open_connection(*self.server_address, limit=READ_LIMIT), timeout=TIMEOUT)
+            if operation == 'list':
+                samples = await self.list(reader, writer, scheduled or start_time)
+                wire_bytes = 0
+            else:
+                if operation == 'upload':
+                    wire_bytes = await self.upload(reader, writer, test_file)
+                else:
+                    wire_bytes = await self.download(reader, writer, os.path.basename(test_file))
+                end = time.time()
+                samples = [(end, end - (scheduled or start_time), file_size)]
+            end_time = time.time()
+            duration = end_time - start_time
+            result.update(status='OK', wire_bytes=wire_bytes, duration=duration, end=end_time, samples=samples,
+                          latency=(end_time - (scheduled or start_time)) / len(samples),
+                          throughput=file_size / duration if file_size and duration > 0 else 0)
+            logging.debug("Client %s: %s successful in %.2fs", worker_id, operation, duration)
+        except Exception as e:
+            end_time = time.time()
+            logging.debug("Client %s: %s failed: %s", worker_id, operation, e)
+            result.update(status='ERROR', error=str(e) or type(e).__name__, duration=end_time - start_time,
+                          throughput=0, end=end_time)
+        finally:
+            if writer is not None:
+                writer.close()
+        return result
+
+    async def command(self, reader, writer, command):
+        # Perintah teks kecil, return dict respons (error server jadi exception)
+        writer.write(command.encode() + DELIMITER)
+        await writer.drain()
+        response = await asyncio.wait_for(reader.readuntil(DELIMITER), timeout=TIMEOUT)
+        return self.check(json.loads(response[:-len(DELIMITER)]))
+
+    async def binary_command(self, reader, writer, command, filename='', payload=b''):
+        writer.write(fbp.pack_header(command, filename, len(payload)) + payload)
+        await writer.drain()
+        _, _, status, _, payload_len = await self.read_frame_header(reader)
+        return self.check(json.loads(await reader.readexactly(payload_len)), status)
+
+    @staticmethod
+    def check(result, status=fbp.STATUS_OK):
+        if status != fbp.STATUS_OK or result.get('status') != 'OK':
+            raise RuntimeError(result.get('data', 'Unknown error'))
+        return result
+
+    @staticmethod
+    async def read_frame_header(reader):
+        header = await asyncio.wait_for(reader.readexactly(fbp.HEADER_SIZE), timeout=TIMEOUT)
+        _, _, _, _, command_len, filename_len, _ = fbp.HEADER.unpack(header)
+        command, filename, status, flags, payload_len, _ = fbp.parse_header(
+            header + await reader.readexactly(command_len + filename_len))
+        return command, filename, status, flags, payload_len
+
+    async def list(self, reader, writer, sent_at):
+        # Beberapa LIST (--requests) berurutan di koneksi yang sama
+        samples = []
+        for _ in range(self.requests_per_worker):
+            if self.binary:
+                await self.binary_command(reader, writer, 'LIST')
+            else:
+                await self.command(reader, writer, 'LIST')
+            now = time.time()
+            samples.append((now, now - sent_at, 0))
+            sent_at = now
+        return samples
+
+    async def upload(self, reader, writer, test_file):
+        # Isi file di-stream dari disk per chunk, return bytes yang dikirim (tanpa header)
+        filename = os.path.basename(test_file)
+        size = os.path.getsize(test_file)
+        wire_bytes = 0
+        with open(test_file, 'rb') as f:
+            if self.binary:
+                writer.write(fbp.pack_header('UPLOAD', filename, size))
+            else:
+                writer.write(f"UPLOAD {filename} ".encode())
+            while True:
+                # Kelipatan 3 supaya base64 per chunk bisa langsung disambung tanpa padding di tengah
+                chunk = f.read(CHUNK_SIZE if self.binary else CHUNK_SIZE // 3 * 3)
+                if not chunk:
+                    break
+                if not self.binary:
+                    chunk = base64.b64encode(chunk)
+                writer.write(chunk)
+                wire_bytes += len(chunk)
+                await writer.drain()
+
+        if self.binary:
+            _, _, status, _, payload_len = await self.read_frame_header(reader)
+            self.check(json.loads(await reader.readexactly(payload_len)), status)
+        else:
+            writer.write(DELIMITER)
+            await writer.drain()
+            response = await asyncio.wait_for(reader.readuntil(DELIMITER), timeout=TIMEOUT)
+            self.check(json.loads(response[:-len(DELIMITER)]))
+        return wire_bytes
+
+    async def download(self, reader, writer, filename):
+        # Body dibaca per chunk dan dibuang, return bytes yang diterima
+        if self.binary:
+            writer.write(fbp.pack_header('GET', filename))
+            await writer.drain()
+            _, _, status, _, payload_len = await self.read_frame_header(reader)
+            if status != fbp.STATUS_OK:
+                self.check(json.loads(await reader.readexactly(payload_len)), status)
+            remaining = payload_len
+            while remaining:
+                chunk = await asyncio.wait_for(reader.read(min(CHUNK_SIZE, remaining)), timeout=TIMEOUT)
+                if not chunk:
+                    raise ConnectionError('Connection closed during download')
+                remaining -= len(chunk)
+            return payload_len
+
+        # Respons teks bisa ratusan MB (base64 di dalam JSON): hanya awal respons yang disimpan
+        # untuk cek status, sisanya dibuang sambil mencari delimiter penutup
+        writer.write(f"GET {filename}".encode() + DELIMITER)
+        await writer.drain()
+        head = b''
+        tail = b''
+        received = 0
+        while True:
+            chunk = await asyncio.wait_for(reader.read(CHUNK_SIZE), timeout=TIMEOUT)
+            if not chunk:
+                raise ConnectionError('Connection closed during download')
+            received += len(chunk)
+            if len(head) < CHUNK_SIZE:
+                head += chunk[:CHUNK_SIZE - len(head)]
+            data = tail + chunk
+            if DELIMITER in data:
+                break
+            tail = data[-(len(DELIMITER) - 1):]
+        if DELIMITER in head:
+            self.check(json.loads(head.split(DELIMITER)[0]))
+        elif not head.startswith(b'{"status": "OK"'):
+            raise RuntimeError(head[:200].decode(errors='replace'))
+        return received
@@ -0,0 +1,331 @@
+import asyncio
+import json
+import logging
+import concurrent.futures
+from file_protocol import FileProtocol, BATCH_COMMANDS, STREAMED_UPLOADS, is_batch_command, split_binary_command # Import protokol file untuk parsing perintah
+from file_connection import Base64StreamDecoder, DELIMITER, RECV_SIZE, IDLE_TIMEOUT, match_text_upload, region_command, \
+    upload_status
+from file_server_options import add_file_arguments, file_options, add_server_arguments, server_options, log_level
+from file_access_log import setup_logging
+from file_admission import ServerBusy, admission_controller, busy_result, request_cost, text_request_cost
+import file_binary_protocol as fbp
+from file_framing import FrameBuffer
+
+"""
+* file_asyncio_server melayani perintah FileProtocol yang sama dengan
+server threadpool/processpool, tapi semua koneksi dipegang oleh satu
+event loop sehingga koneksi yang idle tidak memakan worker
+
+* pekerjaan yang blocking (disk, base64, json) dijalankan di executor
+dengan ukuran terbatas (--pool-size)
+
+* admission control (lihat file_admission) ditunggu tanpa memblokir
+event loop. Secara default slot lane small/large sebesar
+--max-connections, executor sudah membatasi pekerjaan blocking; yang
+tetap berlaku adalah batas bytes transfer besar yang sedang berjalan
+"""
+
+
+class AsyncClientConnection:
+    def __init__(self, reader, writer, executor, fp, admission, idle_timeout=IDLE_TIMEOUT):
+        self.reader = reader
+        self.writer = writer
+        self.executor = executor
+        self.fp = fp
+        self.admission = admission
+        self.idle_timeout = idle_timeout
+        self.metrics = fp.metrics
+        self.loop = asyncio.get_running_loop()
+        self.buffer = FrameBuffer()
+
+    def run_blocking(self, func, *args):
+        self.metrics.add('queued')
+        return self.loop.run_in_executor(self.executor, self.run_tracked, func, args)
+
+    def run_tracked(self, func, args):
+        # Dijalankan di thread executor: task pindah dari antrian ke worker yang sibuk
+        self.metrics.add('queued', -1)
+        self.metrics.add('busy')
+        try:
+            return func(*args)
+        finally:
+            self.metrics.add('busy', -1)
+
+    async def fill(self):
+        # Tambah data dari socket ke buffer, False kalau koneksi ditutup klien
+        data = await asyncio.wait_for(self.reader.read(RECV_SIZE), timeout=self.idle_timeout)
+        if not data:
+            return False
+        self.metrics.add('bytes_in', len(data))
+        self.buffer.append(data)
+        return True
+
+    async def send(self, data):
+        self.writer.write(data)
+        self.metrics.add('bytes_out', len(data))
+        await self.writer.drain()
+
+    async def send_text(self, hasil):
+        body = hasil.encode()
+        self.writer.write(body)
+        self.writer.write(DELIMITER)
+        self.metrics.add('bytes_out', len(body) + len(DELIMITER))
+        await self.writer.drain()
+
+    async def serve(self):
+        while True:
+            await self.process_buffer()
+            if not await self.fill():
+                break
+
+    async def process_buffer(self):
+        # Proses semua perintah yang sudah lengkap di buffer
+        while self.buffer:
+            if fbp.is_binary_frame(self.buffer.view(0, len(fbp.MAGIC))):
+                header = fbp.parse_header(self.buffer.view())
+                if header is None:
+                    return
+                command, filename, status, flags, payload_len, header_len = header
+
+                c_request, args = split_binary_command(command)
+                if c_request in STREAMED_UPLOADS:
+                    self.buffer.consume(header_len)
+                    await self.handle_binary_upload(command, payload_len, [filename] + args, flags)
+                    continue
+
+                if len(self.buffer) < header_len + payload_len:
+                    return
+                self.buffer.consume(header_len)
+                payload = self.buffer.take(payload_len)
+
+                batch = c_request in BATCH_COMMANDS
+                names = payload.decode(errors='replace').splitlines() if c_request == 'mget' else ()
+                try:
+                    ticket = await self.admission.acquire_async(*request_cost(c_request, filename, args, payload_len,
+                                                                              names))
+                except ServerBusy as e:
+                    await self.send_binary_response(command, filename, fbp.STATUS_BUSY,
+                                                    json.dumps(busy_result(e, batch)).encode(),
+                                                    fbp.FLAG_BATCH_END if batch else 0)
+                    continue
+
+                with ticket:
+                    if batch:
+                        # Item batch diproses di executor satu per satu, frame dikirim begitu siap
+                        async for frame in self.iterate_blocking(self.fp.proses_batch_binary(command, filename, payload)):
+                            await self.send_binary_response(*frame)
+                    else:
+                        status, hasil = await self.run_blocking(self.fp.proses_binary, command, filename, payload, flags)
+                        await self.send_binary_response(command, filename, status, hasil)
+            else:
+                idx = self.buffer.find_delimiter()
+                if idx < 0:
+                    upload_args = match_text_upload(self.buffer)
+                    if upload_args is None:
+                        return
+                    await self.handle_text_upload(upload_args)
+                    continue
+
+                command = self.buffer.text(0, idx)
+                self.buffer.consume(idx + len(DELIMITER))
+
+                batch = is_batch_command(command)
+                try:
+                    ticket = await self.admission.acquire_async(*text_request_cost(command))
+                except ServerBusy as e:
+                    await self.send((json.dumps(busy_result(e, batch)) + "\r\n\r\n").encode())
+                    continue
+
+                with ticket:
+                    if batch:
+                        async for hasil in self.iterate_blocking(self.fp.proses_batch(command)):
+                            await self.send_text(hasil)
+                    else:
+                        hasil = await self.run_blocking(self.fp.proses_string, command)
+                        await self.send_text(hasil) # Kirim respons ke klien
+
+    async def iterate_blocking(self, generator):
+        # Ambil item generator yang blocking (disk I/O) di executor, bukan di event loop
+        try:
+            while True:
+                item = await self.run_blocking(next, generator, None)
+                if item is None:
+                    break
+                yield item
+        finally:
+            await self.run_blocking(generator.close)
+
+    async def send_binary_response(self, command, filename, status, payload, flags=0):
+        if hasattr(payload, 'fileno'):
+            # Streaming: header kecil dulu, lalu body lewat loop.sendfile
+            # (os.sendfile kalau tersedia, fallback read/write kalau tidak)
+            with payload:
+                await self.send(fbp.pack_header(region_command(command, payload), filename, payload.length, status,
+                                                payload.flags))
+                if payload.length:
+                    await self.loop.sendfile(self.writer.transport, payload.fp, payload.body_offset, payload.length)
+                    self.metrics.add('bytes_out', payload.length)
+            return
+
+        await self.send(fbp.pack_header(command, filename, len(payload), status, flags) + payload)
+
+    async def open_upload(self, upload_args, compressed=False, body_len=None):
+        # Return (writer, ticket, error), sama seperti ClientConnection.open_upload
+        try:
+            ticket = await self.admission.acquire_async(*request_cost('upload', body_len=body_len))
+        except ServerBusy as e:
+            return None, None, e
+        try:
+            return await self.run_blocking(lambda: self.fp.open_upload(*upload_args, compressed=compressed)), ticket, None
+        except Exception as e:
+            ticket.release()
+            return None, None, e
+
+    async def write_chunk(self, writer, chunk, decoder=None):
+        # Decode base64 (kalau ada) dan tulis ke disk di executor
+        if decoder is not None:
+            await self.run_blocking(lambda: writer.write(decoder.feed(chunk)))
+        else:
+            await self.run_blocking(writer.write, chunk)
+
+    async def handle_text_upload(self, upload_args):
+        writer, ticket, error = await self.open_upload(upload_args)
+        try:
+            await self.receive_text_upload(writer, error)
+        finally:
+            if ticket is not None:
+                ticket.release()
+
+    async def receive_text_upload(self, writer, error):
+        decoder = Base64StreamDecoder(self.fp.file.codec)
+        keep = len(DELIMITER) - 1
+
+        try:
+            while True:
+                idx = self.buffer.find_delimiter()
+                end = idx if idx >= 0 else max(len(self.buffer) - keep, 0)
+                if end and error is None:
+                    try:
+                        # Buffer tidak diisi selama write_chunk ditunggu, view aman dipakai di executor
+                        await self.write_chunk(writer, self.buffer.view(0, end), decoder)
+                    except Exception as e:
+                        error = e
+                if idx >= 0:
+                    self.buffer.consume(idx + len(DELIMITER))
+                    break
+                # Sisakan beberapa byte terakhir, delimiter bisa terpotong antar read
+                self.buffer.consume(end)
+                if not await self.fill():
+                    raise ConnectionError('Connection closed during upload')
+        except Exception:
+            if writer is not None:
+                await self.run_blocking(writer.abort)
+            raise
+
+        if error is None:
+            try:
+                decoder.flush()
+            except Exception as e:
+                error = e
+
+        hasil = await self.run_blocking(self.fp.finish_upload, writer, error)
+        await self.send((json.dumps(hasil) + "\r\n\r\n").encode())
+
+    async def handle_binary_upload(self, command, payload_len, upload_args, flags=0):
+        writer, ticket, error = await self.open_upload(upload_args, bool(flags & fbp.FLAG_ZLIB), payload_len)
+        try:
+            await self.receive_binary_upload(command, payload_len, upload_args, writer, error)
+        finally:
+            if ticket is not None:
+                ticket.release()
+
+    async def receive_binary_upload(self, command, payload_len, upload_args, writer, error):
+        remaining = payload_len
+
+        try:
+            while remaining:
+                if not self.buffer and not await self.fill():
+                    raise ConnectionError('Connection closed during upload')
+                take = min(len(self.buffer), remaining)
+                if error is None:
+                    try:
+                        await self.write_chunk(writer, self.buffer.view(0, take))
+                    except Exception as e:
+                        error = e
+                self.buffer.consume(take)
+                remaining -= take
+        except Exception:
+            if writer is not None:
+                await self.run_blocking(writer.abort)
+            raise
+
+        hasil = await self.run_blocking(self.fp.finish_upload, writer, error)
+        status = upload_status(hasil)
+        await self.send_binary_response(command, upload_args[0], status, json.dumps(hasil).encode())
+
+
+class Server:
+    def __init__(self, ipaddress='0.0.0.0', port=8889, pool_size=5, file_options=None, server_options=None):
+        self.ipinfo=(ipaddress, port)
+        self.pool_size=pool_size
+        self.server_options=server_options or {}
+        self.max_connections=self.server_options.get('max_connections', 256)
+        self.fp=FileProtocol(**(file_options or {}))
+        # Executor terbatas untuk pekerjaan blocking (disk, base64, json)
+        self.executor=concurrent.futures.ThreadPoolExecutor(max_workers=self.pool_size)
+        self.fp.metrics.add('workers', pool_size)
+        # Tanpa metrics: gauge queued/busy sudah dihitung oleh run_blocking
+        # Jumlah koneksi tidak dibatasi (koneksi idle hanya sebuah coroutine), beban dibatasi lane admission
+        self.admission=admission_controller(self.server_options, default_slots=self.max_connections)
+
+    # Fungsi untuk manage setiap koneksi klien
+    async def manage_client(self, reader, writer):
+        address = writer.get_extra_info('peername')
+        logging.debug("manage connection from %s", address)
+        client = AsyncClientConnection(reader, writer, self.executor, self.fp, self.admission,
+                                       self.server_options.get('idle_timeout', IDLE_TIMEOUT))
+        self.fp.metrics.add('connections')
+        self.fp.metrics.add('active_connections')
+        try:
+            await client.serve()
+        except Exception as e:
+            logging.warning(f"error: {str(e)}")
+        finally:
+            logging.debug("connection from %s has closed", address)
+            self.fp.metrics.add('active_connections', -1)
+            writer.close()
+
+    async def serve(self):
+        server = await asyncio.start_server(self.manage_client, self.ipinfo[0], self.ipinfo[1],
+                                            reuse_address=True, backlog=1024)
+        async with server:
+            await server.serve_forever()
+
+    # Fungsi utama server untuk menerima dan memproses koneksi masuk
+    def run(self):
+        logging.warning(f"server running on ip address {self.ipinfo}, executor pool size is {self.pool_size}")
+        try:
+            asyncio.run(self.serve())
+        except KeyboardInterrupt:
+            logging.warning("now server shutting down")
+        finally:
+            self.executor.shutdown(wait=False)
+
+
+def main():
+    import argparse
+    parser=argparse.ArgumentParser(description='File Server')
+    parser.add_argument('--port', type=int, default=6666, help='Server port (default: 6666)')
+    parser.add_argument('--pool-size', type=int, default=1, help='executor pool size for blocking work (default: 1)')
+    add_file_arguments(parser)
+    add_server_arguments(parser)
+    args=parser.parse_args()
+    setup_logging(log_level(args))
+
+    svr=Server(ipaddress='0.0.0.0', port=args.port, pool_size=args.pool_size, file_options=file_options(args),
+               server_options=server_options(args))
+    svr.run()
+
+
+if __name__ == "__main__":
+    main()
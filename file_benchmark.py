@@ -0,0 +1,249 @@
+import os
+import sys
+import csv
+import json
+import time
+import socket
+import logging
+import argparse
+import subprocess
+import contextlib
+
+from file_stress_test_client import StressTestClient
+from file_load_coordinator import LoadCoordinator
+from file_server_options import add_file_arguments, file_server_args
+
+"""
+* file_benchmark menjalankan matrix stress test tanpa campur tangan
+manusia: setiap engine server dijalankan sebagai subprocess di port
+bebas untuk setiap server pool size, ditunggu sampai siap melayani
+LIST, diuji dengan StressTestClient, lalu dimatikan
+
+* hasilnya disimpan seperti stress test biasa (CSV + JSON), lalu bisa
+dibandingkan dengan CSV baseline (mis. stress_test_thread_result.csv).
+Throughput yang turun atau latency yang naik melebihi --threshold
+dilaporkan sebagai regresi dan exit code menjadi 1, supaya bisa
+dipakai di CI
+"""
+
+# Engine server yang bisa di-benchmark, engine baru cukup ditambahkan di sini
+ENGINES = {
+    'thread': 'file_threadpool_server.py',
+    'process': 'file_processpool_server.py',
+    'asyncio': 'file_asyncio_server.py',
+}
+
+STARTUP_TIMEOUT = 15    # detik menunggu server siap
+SHUTDOWN_TIMEOUT = 10   # detik menunggu server berhenti setelah SIGTERM
+LOG_DIR = 'benchmark_logs'
+
+# Kolom CSV yang mengidentifikasi satu baris matrix. Baseline lama tidak
+# punya semua kolom ini, yang dipakai hanya kolom yang ada di kedua CSV
+KEY_FIELDS = (
+    'Server Engine', 'Operasi', 'Volume (MB)', 'Jumlah Client Worker Pool', 'Jumlah Server Worker Pool',
+    'Executor Type', 'Protocol', 'Mode Koneksi', 'Jumlah Load Generator',
+)
+
+# (kolom, arah yang lebih baik)
+METRICS = (
+    ('Throughput per client (bytes/s)', 'higher'),
+    ('Waktu total per client (s)', 'lower'),
+    ('Latency p99 (s)', 'lower'),
+)
+
+
+def free_port():
+    # Port bebas dari kernel; ada jeda kecil sebelum server bind, cukup untuk benchmark lokal
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_until_ready(process, port, timeout=STARTUP_TIMEOUT):
+    # Server dianggap siap kalau LIST dijawab OK
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f'server exited with code {process.returncode} during startup')
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=1) as sock:
+                sock.sendall(b"LIST\r\n\r\n")
+                data = b''
+                while b"\r\n\r\n" not in data:
+                    chunk = sock.recv(65536)
+                    if not chunk:
+                        break
+                    data += chunk
+            if json.loads(data.split(b"\r\n\r\n")[0]).get('status') == 'OK':
+                return
+        except (OSError, ValueError):
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f'server on port {port} not ready after {timeout}s')
+
+
+@contextlib.contextmanager
+def running_server(engine, pool_size, server_args=()):
+    """
+    Jalankan engine sebagai subprocess di port bebas, yield port-nya.
+    Server dijalankan dari direktori repo (direktori files/ ada di sana),
+    output-nya ditulis ke benchmark_logs/<engine>_<pool>.log
+    """
+    server_dir = os.path.dirname(os.path.abspath(__file__))
+    port = free_port()
+    os.makedirs(LOG_DIR, exist_ok=True)
+    log_path = os.path.join(LOG_DIR, f"{engine}_{pool_size}.log")
+
+    with open(log_path, 'w') as log:
+        process = subprocess.Popen([sys.executable, ENGINES[engine], '--port', str(port), '--pool-size', str(pool_size),
+                                    *server_args], cwd=server_dir, stdout=log, stderr=subprocess.STDOUT)
+        try:
+            wait_until_ready(process, port)
+            logging.info(f"{engine} server (pool size {pool_size}) ready on port {port}, pid {process.pid}")
+            yield port
+        finally:
+            # SIGTERM: server processpool ikut mematikan worker-worker-nya
+            process.terminate()
+            try:
+                process.wait(timeout=SHUTDOWN_TIMEOUT)
+            except subprocess.TimeoutExpired:
+                logging.warning(f"{engine} server did not stop after SIGTERM, killing it")
+                process.kill()
+                process.wait()
+            logging.info(f"{engine} server (pool size {pool_size}) stopped, log in {log_path}")
+
+
+def run_benchmark(engines, server_pool_sizes, file_sizes, client_pool_sizes, executor_types, operations,
+                  client_options=None, server_args=(), generators=0):
+    all_stats = []
+    client = None
+    for engine in engines:
+        for server_pool_size in server_pool_sizes:
+            logging.info(f"Benchmark {engine} server with pool size {server_pool_size}")
+            with running_server(engine, server_pool_size, server_args) as port:
+                client = StressTestClient(('localhost', port), **(client_options or {}))
+                if generators:
+                    # Generator dikonfigurasi dengan alamat server, jadi dibuat ulang untuk setiap server
+                    client.coordinator = LoadCoordinator(client, local=generators)
+                try:
+                    all_stats.extend(client.run_matrix(file_sizes, client_pool_sizes, executor_types, operations,
+                                                       server_pool_size, server_engine=engine))
+                finally:
+                    client.close()
+    if client is None:
+        return all_stats, None
+    csv_filename, _ = client.save_results(all_stats)
+    return all_stats, csv_filename
+
+
+def read_rows(csv_filename):
+    with open(csv_filename, newline='') as f:
+        reader = csv.DictReader(f)
+        rows = [row for row in reader if row.get('Nomor') != 'TOTAL']
+        return reader.fieldnames or [], rows
+
+
+def compare_with_baseline(current_csv, baseline_csv, threshold=0.10):
+    """
+    Bandingkan setiap baris current dengan baris baseline yang key-nya sama.
+    Return list dict per (baris, metric) dengan status OK / REGRESSION /
+    IMPROVED, atau NO BASELINE kalau kombinasi tersebut tidak ada di baseline
+    """
+    current_fields, current_rows = read_rows(current_csv)
+    baseline_fields, baseline_rows = read_rows(baseline_csv)
+    key_fields = [field for field in KEY_FIELDS if field in current_fields and field in baseline_fields]
+    metrics = [(field, better) for field, better in METRICS if field in current_fields and field in baseline_fields]
+
+    baseline = {tuple(row[field] for field in key_fields): row for row in baseline_rows}
+    report = []
+    for row in current_rows:
+        key = tuple(row[field] for field in key_fields)
+        base_row = baseline.get(key)
+        for field, better in metrics:
+            entry = dict(zip(key_fields, key), metric=field, current=float(row[field] or 0))
+            if base_row is None or not float(base_row[field] or 0):
+                entry.update(baseline=None, change=None, status='NO BASELINE')
+                report.append(entry)
+                continue
+            base_value = float(base_row[field])
+            change = (entry['current'] - base_value) / base_value
+            worse = -change if better == 'higher' else change
+            if worse > threshold:
+                status = 'REGRESSION'
+            elif worse < -threshold:
+                status = 'IMPROVED'
+            else:
+                status = 'OK'
+            entry.update(baseline=base_value, change=change, status=status)
+            report.append(entry)
+    return report
+
+
+def save_report(report, timestamp=None):
+    timestamp = timestamp or time.strftime("%Y%m%d-%H%M%S")
+    report_filename = f"benchmark_report_{timestamp}.csv"
+    fieldnames = [field for field in KEY_FIELDS if report and field in report[0]] + \
+        ['metric', 'baseline', 'current', 'change', 'status']
+    with open(report_filename, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=fieldnames)
+        writer.writeheader()
+        for entry in report:
+            change = entry['change']
+            writer.writerow(dict(entry, change='-' if change is None else f"{change:+.2%}",
+                                 baseline='-' if entry['baseline'] is None else entry['baseline']))
+    logging.info(f"Comparison report saved to {report_filename}")
+    return report_filename
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Automated file server benchmark matrix')
+    parser.add_argument('--engines', nargs='+', choices=sorted(ENGINES), default=['thread', 'process'],
+                        help='Server engines to benchmark (default: thread process)')
+    parser.add_argument('--operation', nargs='+', choices=['upload', 'download', 'list'],
+                        default=['list', 'download', 'upload'], help='Operations to test (default: all)')
+    parser.add_argument('--file-sizes', type=int, nargs='+', default=[10, 50, 100],
+                        help='File sizes in MB (default: 10 50 100)')
+    parser.add_argument('--client-pools', type=int, nargs='+', default=[1, 5, 10],
+                        help='Client worker pool sizes (default: 1 5 10)')
+    parser.add_argument('--server-pools', type=int, nargs='+', default=[1, 5, 10],
+                        help='Server worker pool sizes; each one gets a fresh server (default: 1 5 10)')
+    parser.add_argument('--executor', choices=['thread', 'process', 'both', 'asyncio'], default='thread',
+                        help='Client executor type (default: thread)')
+    parser.add_argument('--binary', action='store_true', help='Use the binary protocol')
+    parser.add_argument('--keepalive', action='store_true', help='Reuse pooled connections')
+    parser.add_argument('--compress', action='store_true', help='Negotiate zlib compression (binary protocol)')
+    parser.add_argument('--test-data', choices=['random', 'text'], default='random',
+                        help='Content of generated test files (default: random)')
+    parser.add_argument('--generators', type=int, default=0,
+                        help='Split each test across this many local load-generator processes (default: 0)')
+    add_file_arguments(parser)
+    parser.add_argument('--baseline', help='Baseline CSV to compare the new results against')
+    parser.add_argument('--threshold', type=float, default=0.10,
+                        help='Relative change counted as a regression, e.g. 0.10 = 10%% (default: 0.10)')
+    args = parser.parse_args()
+
+    executor_types = ['thread', 'process'] if args.executor == 'both' else [args.executor]
+    client_options = dict(binary=args.binary, keepalive=args.keepalive, compress=args.compress,
+                          test_data=args.test_data)
+    # Semua server yang dijalankan menulis ke access log/trace yang sama (O_APPEND)
+    server_args = file_server_args(args)
+
+    _, csv_filename = run_benchmark(args.engines, args.server_pools, args.file_sizes, args.client_pools,
+                                    executor_types, args.operation, client_options, server_args, args.generators)
+    if csv_filename is None or not args.baseline:
+        return 0
+
+    report = compare_with_baseline(csv_filename, args.baseline, args.threshold)
+    save_report(report)
+    regressions = [entry for entry in report if entry['status'] == 'REGRESSION']
+    for entry in regressions:
+        key = ', '.join(f"{field}={entry[field]}" for field in KEY_FIELDS if field in entry)
+        logging.warning(f"REGRESSION {entry['metric']}: {entry['baseline']:.6g} -> {entry['current']:.6g} "
+                        f"({entry['change']:+.2%}) [{key}]")
+    logging.info(f"{len(regressions)} regressions over {args.threshold:.0%} threshold "
+                 f"({len(report)} comparisons against {args.baseline})")
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
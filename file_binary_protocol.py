@@ -0,0 +1,136 @@
+import struct
+
+"""
+* file_binary_protocol berisi framing biner (length-prefixed) yang
+dipakai berdampingan dengan protokol teks/base64/JSON
+
+* setiap frame diawali MAGIC sehingga server bisa membedakan frame biner
+dengan perintah teks biasa pada koneksi yang sama (dipilih per perintah)
+
+* format header (network byte order):
+    magic(4) | version(1) | flags(1) | status(1) | panjang command(1)
+    | panjang filename(2) | panjang payload(8)
+  lalu diikuti bytes command, bytes filename, dan payload mentah
+  (isi file tanpa encoding apapun)
+
+* field command boleh membawa argumen setelah nama perintah, dipisah
+  spasi, mis. "GET <offset> <length>" atau "UPLOAD_AT <offset>". Respons
+  GET selalu berbentuk "GET <offset> <ukuran total file>"
+
+* bit FLAG_ZLIB pada flags: di request GET berarti klien menerima body
+  terkompresi, di request UPLOAD/UPLOAD_AT dan respons GET berarti
+  payload adalah stream zlib (payload_len = ukuran terkompresi)
+
+* perintah batch (MGET/MDELETE) dijawab dengan satu frame per item lalu
+  satu frame ringkasan (JSON) yang ditandai FLAG_BATCH_END
+
+* STATUS_BUSY: request ditolak admission control sebelum diproses,
+  payload JSON berisi retry_after (detik) sebelum klien boleh mencoba lagi
+"""
+
+MAGIC = b'FBIN'
+VERSION = 1
+
+HEADER = struct.Struct('!4sBBBBHQ')
+HEADER_SIZE = HEADER.size
+
+STATUS_OK = 0
+STATUS_ERROR = 1
+STATUS_BUSY = 2
+
+FLAG_ZLIB = 0x01
+FLAG_BATCH_END = 0x02
+
+
+def is_binary_frame(buffer):
+    # True kalau buffer diawali MAGIC, atau masih terlalu pendek untuk dipastikan
+    prefix = bytes(buffer[:len(MAGIC)])
+    return MAGIC.startswith(prefix) if len(prefix) < len(MAGIC) else prefix == MAGIC
+
+
+def pack_header(command, filename='', payload_len=0, status=STATUS_OK, flags=0):
+    command_bytes = command.encode()
+    filename_bytes = filename.encode()
+    header = HEADER.pack(MAGIC, VERSION, flags, status, len(command_bytes), len(filename_bytes), payload_len)
+    return header + command_bytes + filename_bytes
+
+
+def parse_header(buffer):
+    """
+    Parse header dari awal buffer.
+    Return (command, filename, status, flags, payload_len, header_len)
+    atau None kalau bytes header belum lengkap.
+    """
+    if len(buffer) < HEADER_SIZE:
+        return None
+
+    magic, version, flags, status, command_len, filename_len, payload_len = HEADER.unpack_from(buffer, 0)
+    if magic != MAGIC:
+        raise ValueError('Invalid binary frame magic')
+    if version != VERSION:
+        raise ValueError(f'Unsupported binary frame version: {version}')
+
+    header_len = HEADER_SIZE + command_len + filename_len
+    if len(buffer) < header_len:
+        return None
+
+    command = bytes(buffer[HEADER_SIZE:HEADER_SIZE + command_len]).decode()
+    filename = bytes(buffer[HEADER_SIZE + command_len:header_len]).decode()
+    return command, filename, status, flags, payload_len, header_len
+
+
+def recv_exact(sock, size):
+    # Terima tepat `size` bytes dari socket
+    data = bytearray(size)
+    view = memoryview(data)
+    received = 0
+    while received < size:
+        n = sock.recv_into(view[received:], size - received)
+        if n == 0:
+            raise ConnectionError('Connection closed before frame was complete')
+        received += n
+    return bytes(data)
+
+
+def send_frame(sock, command, filename='', payload=b'', status=STATUS_OK, flags=0):
+    sock.sendall(pack_header(command, filename, len(payload), status, flags))
+    if payload:
+        sock.sendall(payload)
+
+
+def send_file_frame(sock, command, filename, fileobj, size, status=STATUS_OK, flags=0):
+    # Seperti send_frame, payload sebesar `size` bytes di-stream dari awal fileobj (sendfile)
+    sock.sendall(pack_header(command, filename, size, status, flags))
+    if size:
+        sock.sendfile(fileobj, 0, size)
+
+
+def recv_frame_header(sock):
+    # Terima header saja, return (command, filename, status, flags, payload_len)
+    header = recv_exact(sock, HEADER_SIZE)
+    _, _, flags, status, command_len, filename_len, payload_len = HEADER.unpack(header)
+    rest = recv_exact(sock, command_len + filename_len)
+    command, filename, status, flags, payload_len, _ = parse_header(header + rest)
+    return command, filename, status, flags, payload_len
+
+
+def recv_frame(sock):
+    # Terima satu frame utuh, return (command, filename, status, flags, payload)
+    command, filename, status, flags, payload_len = recv_frame_header(sock)
+    payload = recv_exact(sock, payload_len) if payload_len else b''
+    return command, filename, status, flags, payload
+
+
+def recv_into_file(sock, fileobj, size, chunk_size=1024 * 1024):
+    # Stream payload sebesar `size` bytes dari socket langsung ke file,
+    # memory yang dipakai hanya sebesar satu chunk
+    buf = bytearray(min(chunk_size, size) or 1)
+    view = memoryview(buf)
+    remaining = size
+    while remaining > 0:
+        n = sock.recv_into(view, min(len(buf), remaining))
+        if n == 0:
+            raise ConnectionError('Connection closed before frame was complete')
+        fileobj.write(view[:n])
+        remaining -= n
+    return size
@@ -0,0 +1,129 @@
+import threading
+from collections import OrderedDict
+
+"""
+* ResponseCache menyimpan payload GET yang sudah di-encode (base64)
+supaya download berulang untuk file yang sama tidak perlu membaca
+disk dan encode ulang
+
+* key cache adalah (filename, versi file, ...), mis. versi berupa
+(size, mtime_ns), jadi file yang berubah otomatis miss. Satu nama boleh
+punya beberapa key untuk versi yang sama (mis. beberapa range GET yang
+dikompres), put versi baru membuang key versi lama; upload/delete juga
+meng-invalidate semua entry nama tersebut supaya memory-nya langsung
+dibebaskan
+
+* satu instance dipakai bersama oleh semua thread worker, semua akses
+dilindungi lock
+"""
+
+
+class ResponseCache:
+    def __init__(self, max_bytes=128 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()  # key -> value, urutan LRU (paling baru di akhir)
+        self.keys_by_name = {}        # filename -> set key untuk versi terbaru
+        self.loading = {}             # key -> Event, untuk miss yang sedang di-load thread lain
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key):
+        with self.lock:
+            value = self.entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def get_or_load(self, key, loader):
+        """
+        Ambil dari cache, atau panggil loader() kalau miss. Kalau beberapa
+        thread miss pada key yang sama bersamaan, hanya satu yang membaca
+        disk dan encode, yang lain menunggu hasilnya.
+        """
+        while True:
+            with self.lock:
+                value = self.entries.get(key)
+                if value is not None:
+                    self.entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                event = self.loading.get(key)
+                if event is None:
+                    self.misses += 1
+                    event = self.loading[key] = threading.Event()
+                    break
+            # Tunggu loader di thread lain, lalu cek cache lagi
+            event.wait()
+            if key not in self.entries:
+                # Loader gagal atau hasilnya tidak muat di cache
+                return loader()
+
+        try:
+            value = loader()
+            self.put(key, value)
+            return value
+        finally:
+            with self.lock:
+                del self.loading[key]
+            event.set()
+
+    def put(self, key, value):
+        size = len(value)
+        if size > self.max_bytes:
+            return
+        with self.lock:
+            keys = self.keys_by_name.get(key[0])
+            if keys and next(iter(keys))[1] != key[1]:
+                self._remove_name(key[0])
+            self._remove(key)
+            self.entries[key] = value
+            self.keys_by_name.setdefault(key[0], set()).add(key)
+            self.current_bytes += size
+            self._evict()
+
+    def invalidate(self, filename):
+        with self.lock:
+            if filename in self.keys_by_name:
+                self._remove_name(filename)
+                self.invalidations += 1
+
+    def resize(self, max_bytes):
+        with self.lock:
+            self.max_bytes = max_bytes
+            self._evict()
+
+    def stats(self):
+        with self.lock:
+            return dict(
+                entries=len(self.entries), bytes=self.current_bytes, max_bytes=self.max_bytes,
+                hits=self.hits, misses=self.misses, evictions=self.evictions,
+                invalidations=self.invalidations
+            )
+
+    # Dipanggil dengan lock sudah dipegang
+    def _remove(self, key):
+        value = self.entries.pop(key, None)
+        if value is not None:
+            self.current_bytes -= len(value)
+        keys = self.keys_by_name.get(key[0])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self.keys_by_name[key[0]]
+
+    def _remove_name(self, filename):
+        for key in list(self.keys_by_name.get(filename, ())):
+            self._remove(key)
+
+    def _evict(self):
+        while self.current_bytes > self.max_bytes and self.entries:
+            key = next(iter(self.entries))
+            self._remove(key)
+            self.evictions += 1
@@ -0,0 +1,217 @@
+import json
+import time
+import queue
+import select
+import socket
+import logging
+import threading
+import contextlib
+
+import file_binary_protocol as fbp
+from file_framing import DELIMITER, FrameBuffer, command_parts, send_parts
+from file_protocol import is_batch_command
+
+"""
+* FileClient adalah library klien untuk file server dengan connection
+pool: koneksi TCP dipakai ulang antar perintah (keep-alive), karena loop
+koneksi server memang menerima banyak perintah per koneksi
+
+* pool aman dipakai dari banyak thread; jumlah koneksi dibatasi
+pool_size, koneksi idle yang sudah ditutup server dibuang saat diambil
+
+* pipeline() mengirim beberapa perintah teks sekaligus di satu koneksi
+sebelum membaca respons-responsnya (server memproses perintah berurutan,
+jadi urutan respons sama dengan urutan perintah)
+
+* batch()/binary_batch() untuk MGET/MDELETE/MUPLOAD: respons per item
+dibaca sampai ringkasan penutupnya
+
+* command()/binary_command() mengulang perintah yang ditolak server
+karena sibuk (retry_after / STATUS_BUSY) sampai busy_retries kali,
+menunggu sesuai hint retry_after dari server
+"""
+
+class PooledConnection:
+    def __init__(self, sock):
+        self.sock = sock
+        self.buffer = FrameBuffer()     # sisa bytes setelah respons terakhir
+
+    def is_stale(self):
+        # Koneksi idle yang sudah ditutup server terlihat readable dengan recv kosong
+        if self.buffer:
+            return False
+        readable, _, _ = select.select([self.sock], [], [], 0)
+        if not readable:
+            return False
+        try:
+            return self.sock.recv(1, socket.MSG_PEEK) == b''
+        except OSError:
+            return True
+
+    def read_batch(self):
+        # Respons per item sampai ringkasan batch ("done": true), return (items, ringkasan)
+        items = []
+        while True:
+            hasil = self.read_response()
+            if hasil.get('done'):
+                return items, hasil
+            items.append(hasil)
+
+    def read_response(self):
+        # Satu respons teks (JSON diakhiri "\r\n\r\n")
+        while True:
+            idx = self.buffer.find_delimiter()
+            if idx >= 0:
+                response = json.loads(self.buffer.text(0, idx))
+                self.buffer.consume(idx + len(DELIMITER))
+                return response
+            if not self.buffer.recv_from(self.sock):
+                raise ConnectionError('Connection closed by server')
+
+    def close(self):
+        self.sock.close()
+
+
+class FileClient:
+    def __init__(self, server_address=('localhost', 6666), pool_size=4, timeout=600, busy_retries=3):
+        self.server_address = server_address
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.busy_retries = busy_retries
+        self.init_pool()
+
+    def init_pool(self):
+        self.idle = queue.LifoQueue()
+        self.slots = threading.BoundedSemaphore(self.pool_size)
+
+    # Pool tidak ikut di-pickle (mis. dikirim ke ProcessPoolExecutor),
+    # setiap process membuat koneksinya sendiri
+    def __getstate__(self):
+        return dict(server_address=self.server_address, pool_size=self.pool_size, timeout=self.timeout,
+                    busy_retries=self.busy_retries)
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.init_pool()
+
+    def connect(self):
+        sock = socket.create_connection(self.server_address, timeout=self.timeout)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        return PooledConnection(sock)
+
+    def acquire(self):
+        self.slots.acquire()
+        try:
+            while True:
+                try:
+                    conn = self.idle.get_nowait()
+                except queue.Empty:
+                    return self.connect()
+                if not conn.is_stale():
+                    return conn
+                conn.close()
+        except Exception:
+            self.slots.release()
+            raise
+
+    def release(self, conn, reuse=True):
+        if reuse:
+            self.idle.put(conn)
+        else:
+            conn.close()
+        self.slots.release()
+
+    @contextlib.contextmanager
+    def connection(self):
+        # Koneksi dikembalikan ke pool kalau perintah selesai normal,
+        # ditutup kalau terjadi error (state protokolnya tidak jelas lagi)
+        conn = self.acquire()
+        try:
+            yield conn
+        except BaseException:
+            self.release(conn, reuse=False)
+            raise
+        self.release(conn)
+
+    def command(self, command_str):
+        # command_str boleh str, bytes, atau list potongan (lihat file_framing.command_parts)
+        parts = command_parts(command_str)
+        for attempt in range(self.busy_retries + 1):
+            with self.connection() as conn:
+                send_parts(conn.sock, *parts, DELIMITER)
+                hasil = conn.read_response()
+            if 'retry_after' not in hasil or attempt == self.busy_retries:
+                return hasil
+            time.sleep(hasil['retry_after'])
+
+    def pipeline(self, commands):
+        """
+        Kirim semua perintah di satu koneksi, lalu baca respons sebanyak
+        jumlah perintah. Pengiriman berjalan di thread terpisah supaya
+        server tidak macet menulis respons saat klien masih mengirim.
+        Untuk perintah batch, hasilnya berupa (items, ringkasan) seperti batch().
+        """
+        payload = b''.join(command.encode() + DELIMITER for command in commands)
+        with self.connection() as conn:
+            errors = []
+
+            def send():
+                try:
+                    conn.sock.sendall(payload)
+                except Exception as e:
+                    errors.append(e)
+
+            sender = threading.Thread(target=send, daemon=True)
+            sender.start()
+            try:
+                responses = [conn.read_batch() if is_batch_command(command) else conn.read_response()
+                             for command in commands]
+            finally:
+                sender.join()
+            if errors:
+                raise errors[0]
+            return responses
+
+    def batch(self, command_str):
+        # Perintah batch teks (MGET/MDELETE/MUPLOAD), return (hasil per item, ringkasan)
+        with self.connection() as conn:
+            send_parts(conn.sock, *command_parts(command_str), DELIMITER)
+            return conn.read_batch()
+
+    def binary_batch(self, command, names):
+        # MGET/MDELETE biner, return ([(filename, status, payload)], ringkasan)
+        with self.connection() as conn:
+            fbp.send_frame(conn.sock, command, '', '\n'.join(names).encode())
+            items = []
+            while True:
+                _, filename, status, flags, payload = fbp.recv_frame(conn.sock)
+                if flags & fbp.FLAG_BATCH_END:
+                    return items, json.loads(payload)
+                items.append((filename, status, payload))
+
+    def binary_command(self, command, filename='', payload=b'', flags=0):
+        # Return (command, filename, status, flags, payload) dari frame respons
+        for attempt in range(self.busy_retries + 1):
+            with self.connection() as conn:
+                fbp.send_frame(conn.sock, command, filename, payload, flags=flags)
+                response = fbp.recv_frame(conn.sock)
+            if response[2] != fbp.STATUS_BUSY or attempt == self.busy_retries:
+                return response
+            time.sleep(json.loads(response[4]).get('retry_after', 1.0))
+
+    def close(self):
+        while True:
+            try:
+                self.idle.get_nowait().close()
+            except queue.Empty:
+                break
+        logging.debug(f"connection pool to {self.server_address} closed")
+
+
+if __name__ == '__main__':
+    # contoh pemakaian
+    client = FileClient(('localhost', 6666))
+    print(client.command('LIST'))
+    print(client.pipeline(['LIST', 'CACHESTATS']))
+    client.close()
@@ -0,0 +1,143 @@
+import os
+import time
+import base64
+import binascii
+import logging
+import threading
+import multiprocessing
+import concurrent.futures
+from multiprocessing import shared_memory
+
+"""
+* CodecPool menjalankan transform payload yang CPU-bound dan memegang
+GIL (base64 encode/decode) di process pool, supaya thread yang melayani
+socket dan disk tidak saling menunggu GIL. zlib dan hashlib tidak perlu
+dipindah: keduanya sudah melepas GIL untuk buffer besar
+
+* data tidak di-pickle: input disalin sekali ke segment
+multiprocessing.shared_memory, worker menulis hasilnya langsung ke
+segment output, yang dikirim lewat pipe hanya nama segment dan offset
+
+* payload besar dipecah per CHUNK_SIZE ke beberapa worker sekaligus,
+jadi satu file besar pun ikut memakai semua core. Payload kecil
+(< MIN_OFFLOAD) atau workers=0 dikerjakan langsung di thread pemanggil
+"""
+
+MIN_OFFLOAD = 256 * 1024            # di bawah ini overhead IPC lebih mahal dari transform-nya
+CHUNK_SIZE = 3 * 1024 * 1024        # kelipatan 3 dan 4: batas chunk tidak memotong grup base64
+PARENT_POLL = 1.0                   # detik, interval worker mengecek server masih hidup
+
+
+def _attach(name):
+    return shared_memory.SharedMemory(name=name)
+
+
+def _transform(op, in_name, in_start, in_end, out_name, out_start):
+    # Dijalankan di worker process: baca input dari segment, tulis hasil ke segment output
+    src = _attach(in_name)
+    dst = _attach(out_name)
+    try:
+        data = src.buf[in_start:in_end]
+        try:
+            result = base64.b64encode(data) if op == 'encode' else binascii.a2b_base64(data)
+        finally:
+            data.release()
+        dst.buf[out_start:out_start + len(result)] = result
+        return len(result)
+    finally:
+        src.close()
+        dst.close()
+
+
+def _watch_parent(parent_pid):
+    # Server yang mati karena SIGTERM/SIGKILL tidak sempat mematikan pool, worker keluar sendiri
+    while os.getppid() == parent_pid:
+        time.sleep(PARENT_POLL)
+    os._exit(0)
+
+
+def _init_worker(parent_pid):
+    threading.Thread(target=_watch_parent, args=(parent_pid,), daemon=True).start()
+
+
+def _warm_up(_):
+    return multiprocessing.current_process().pid
+
+
+class CodecPool:
+    def __init__(self, workers=0):
+        self.workers = workers
+        self.pool = None
+        if workers:
+            # spawn: fork dari server yang sudah punya banyak thread tidak aman
+            self.pool = concurrent.futures.ProcessPoolExecutor(max_workers=workers,
+                                                               mp_context=multiprocessing.get_context('spawn'),
+                                                               initializer=_init_worker, initargs=(os.getpid(),))
+            # Start semua worker sekarang, bukan saat request besar pertama datang
+            list(self.pool.map(_warm_up, range(workers)))
+            logging.warning(f"codec pool started with {workers} worker processes")
+
+    def offload(self, data):
+        return self.pool is not None and len(data) >= MIN_OFFLOAD
+
+    def b64encode(self, data):
+        if not self.offload(data):
+            return base64.b64encode(data)
+        size = len(data)
+        # Output per chunk tepat 4/3 input, jadi setiap worker tahu offset tulisnya
+        spans = [(start, min(start + CHUNK_SIZE, size), start // 3 * 4) for start in range(0, size, CHUNK_SIZE)]
+        out_size = (size + 2) // 3 * 4
+        with self.segments(data, out_size) as (src, dst):
+            total = sum(self.run('encode', src, dst, spans))
+            return bytes(dst.buf[:total])
+
+    def b64decode(self, data):
+        if isinstance(data, str):
+            data = data.encode('ascii')
+        if not self.offload(data):
+            return binascii.a2b_base64(data)
+        size = len(data)
+        if size % 4:
+            # base64 yang tidak rapi (mis. ada newline) tidak bisa dipecah di sembarang offset
+            return binascii.a2b_base64(data)
+        spans = [(start, min(start + CHUNK_SIZE, size), start // 4 * 3) for start in range(0, size, CHUNK_SIZE)]
+        with self.segments(data, size // 4 * 3) as (src, dst):
+            lengths = self.run('decode', src, dst, spans)
+            # Hanya chunk terakhir yang boleh lebih pendek (padding)
+            return b''.join(dst.buf[out_start:out_start + length] for (_, _, out_start), length in zip(spans, lengths))
+
+    def run(self, op, src, dst, spans):
+        futures = [self.pool.submit(_transform, op, src.name, in_start, in_end, dst.name, out_start)
+                   for in_start, in_end, out_start in spans]
+        return [future.result() for future in futures]
+
+    def segments(self, data, out_size):
+        return SharedSegments(data, out_size)
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown(wait=False, cancel_futures=True)
+
+
+class SharedSegments:
+    # Segment input (berisi salinan data) dan output, dihapus setelah dipakai
+    def __init__(self, data, out_size):
+        self.src = shared_memory.SharedMemory(create=True, size=max(len(data), 1))
+        try:
+            self.src.buf[:len(data)] = data
+            self.dst = shared_memory.SharedMemory(create=True, size=max(out_size, 1))
+        except Exception:
+            self.release(self.src)
+            raise
+
+    @staticmethod
+    def release(segment):
+        segment.close()
+        segment.unlink()
+
+    def __enter__(self):
+        return self.src, self.dst
+
+    def __exit__(self, *exc):
+        self.release(self.src)
+        self.release(self.dst)
@@ -0,0 +1,212 @@
+import os
+import zlib
+import tempfile
+
+from file_binary_protocol import FLAG_ZLIB
+
+"""
+* file_compression berisi kompresi zlib per transfer untuk framing biner,
+dinegosiasikan lewat FLAG_ZLIB di header (lihat file_binary_protocol)
+
+* kompresi dilewati kalau tidak sebanding: payload kecil, ekstensi yang
+isinya sudah terkompresi (jpg, zip, mp4, ...), atau sampel awal data
+yang hampir tidak mengecil saat dicoba dikompres
+
+* body dikompres/didekompres per chunk, jadi memory yang dipakai tidak
+bergantung pada ukuran file. Dekompresi juga dibatasi per chunk output
+(stream kecil berisi nol bisa mengembang ribuan kali), dan stream yang
+mengembang lebih dari MAX_EXPANSION kali (setelah EXPANSION_FLOOR)
+ditolak. Pengirim tidak mengompres body yang akan melewati batas ini
+
+* body GET terkompresi disimpan di file sementara dan di-cache per
+(nama, versi file, offset, length), jadi file yang sama hanya dikompres
+sekali sampai berubah atau di-evict
+"""
+
+LEVEL = 1                   # level cepat, cukup untuk teks/log
+CHUNK_SIZE = 1024 * 1024
+SAMPLE_SIZE = 64 * 1024
+MIN_SIZE = 4096             # di bawah ini overhead header zlib tidak sebanding
+MAX_RATIO = 0.95            # sampel harus mengecil minimal 5%
+MAX_EXPANSION = 100         # batas ukuran hasil dekompresi / ukuran terkompresi
+EXPANSION_FLOOR = 64 * 1024 * 1024  # hasil dekompresi sampai ukuran ini selalu diterima
+
+COMPRESSED_EXTENSIONS = {
+    '.jpg', '.jpeg', '.png', '.gif', '.webp', '.mp3', '.mp4', '.mkv', '.avi', '.mov',
+    '.zip', '.gz', '.tgz', '.bz2', '.xz', '.7z', '.rar', '.zst', '.docx', '.xlsx', '.pptx',
+}
+
+
+def should_compress(filename, sample, size):
+    # Putuskan dari nama file dan sampel awal data apakah kompresi layak dipakai
+    if size < MIN_SIZE:
+        return False
+    if os.path.splitext(filename)[1].lower() in COMPRESSED_EXTENSIONS:
+        return False
+    if not sample:
+        return False
+    return len(zlib.compress(sample, LEVEL)) < len(sample) * MAX_RATIO
+
+
+def expansion_allowed(size, compressed_size):
+    # True kalau stream sebesar compressed_size boleh didekompres menjadi size bytes
+    return size <= max(EXPANSION_FLOOR, compressed_size * MAX_EXPANSION)
+
+
+class CompressedBody:
+    """
+    Isi region yang sudah dikompres ke file sementara, supaya payload_len
+    (ukuran terkompresi) diketahui sebelum header dikirim dan body tetap
+    bisa di-stream dengan sendfile. Disimpan di ResponseCache (len() =
+    ukuran terkompresi), jadi GET berikutnya untuk versi file yang sama
+    tidak mengompres ulang. File sementara ditutup oleh GC setelah
+    di-evict dan tidak ada CompressedRegion yang memakainya lagi
+    """
+    def __init__(self, region):
+        self.fp = tempfile.TemporaryFile()
+        try:
+            compressor = zlib.compressobj(LEVEL)
+            # pread dari body_offset: fd region segment dipakai bersama, posisinya tidak boleh diandalkan
+            position = region.body_offset
+            remaining = region.length
+            while remaining > 0:
+                chunk = os.pread(region.fileno(), min(CHUNK_SIZE, remaining), position)
+                if not chunk:
+                    raise ValueError('File truncated while compressing')
+                self.fp.write(compressor.compress(chunk))
+                position += len(chunk)
+                remaining -= len(chunk)
+            self.fp.write(compressor.flush())
+            self.length = self.fp.tell()
+            self.fp.flush()     # sendfile membaca lewat fd, bukan buffer file object
+        except Exception:
+            self.fp.close()
+            raise
+
+    def __len__(self):
+        return self.length
+
+
+# Nilai cache untuk region yang tidak layak dikompres (ResponseCache menganggap None sebagai miss)
+NOT_COMPRESSED = b''
+
+
+class CompressedRegion:
+    """
+    Region respons GET dengan body dari CompressedBody. fp adalah dup fd
+    file sementara, jadi beberapa respons bisa men-stream body yang sama
+    bersamaan. offset/total_size tetap mengacu ke file asli untuk header
+    respons GET
+    """
+    flags = FLAG_ZLIB
+
+    def __init__(self, region, body):
+        self.offset = region.offset
+        self.total_size = region.total_size
+        self.raw_length = region.length
+        self.body_offset = 0
+        self.length = body.length
+        self.fp = os.fdopen(os.dup(body.fp.fileno()), 'rb')
+
+    def fileno(self):
+        return self.fp.fileno()
+
+    def close(self):
+        self.fp.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def compress_region(region, filename):
+    # CompressedBody, atau NOT_COMPRESSED kalau kompresi tidak layak
+    sample = os.pread(region.fileno(), min(SAMPLE_SIZE, region.length), region.body_offset)
+    if not should_compress(filename, sample, region.length):
+        return NOT_COMPRESSED
+    body = CompressedBody(region)
+    if not expansion_allowed(region.length, body.length):
+        # Akan ditolak DecompressingWriter di penerima, kirim apa adanya
+        body.fp.close()
+        return NOT_COMPRESSED
+    return body
+
+
+def maybe_compress(region, filename, cache=None):
+    """
+    Return CompressedRegion kalau kompresi layak, selain itu region
+    aslinya. cache (ResponseCache) menyimpan hasil kompresi per versi
+    file dan potongan yang diminta, dan hanya satu thread yang
+    mengompres kalau beberapa GET miss bersamaan
+    """
+    try:
+        if cache is None:
+            body = compress_region(region, filename)
+        else:
+            key = (filename, region.version, region.offset, region.length)
+            body = cache.get_or_load(key, lambda: compress_region(region, filename))
+        if body is NOT_COMPRESSED:
+            return region
+        compressed = CompressedRegion(region, body)
+    except Exception:
+        region.close()
+        raise
+    region.close()
+    return compressed
+
+
+def compress_file(fp):
+    # Kompres isi fp per chunk ke file sementara (memory sebesar satu chunk), return file tersebut
+    out = tempfile.TemporaryFile()
+    try:
+        compressor = zlib.compressobj(LEVEL)
+        for chunk in iter(lambda: fp.read(CHUNK_SIZE), b''):
+            out.write(compressor.compress(chunk))
+        out.write(compressor.flush())
+        out.flush()
+        out.seek(0)
+    except Exception:
+        out.close()
+        raise
+    return out
+
+
+class DecompressingWriter:
+    """
+    Membungkus writer (UploadWriter/PartialWriter, atau file biasa di sisi
+    klien): stream zlib yang diterima didekompres per chunk sebelum ditulis.
+    Output setiap decompress dibatasi CHUNK_SIZE, dan ValueError kalau
+    hasilnya mengembang melewati expansion_allowed
+    """
+    def __init__(self, writer):
+        self.writer = writer
+        self.decompressor = zlib.decompressobj()
+        self.received = 0   # bytes terkompresi yang diterima
+        self.size = 0       # bytes hasil dekompresi yang sudah ditulis
+
+    def write(self, data):
+        self.received += len(data)
+        while data:
+            self._write(self.decompressor.decompress(data, CHUNK_SIZE))
+            data = self.decompressor.unconsumed_tail
+
+    def _write(self, data):
+        self.size += len(data)
+        if not expansion_allowed(self.size, self.received):
+            raise ValueError('Compressed body expands too much')
+        self.writer.write(data)
+
+    def finish(self):
+        # Tulis sisa data di decompressor dan pastikan stream zlib lengkap
+        self._write(self.decompressor.flush())
+        if not self.decompressor.eof:
+            raise ValueError('Incomplete compressed body')
+
+    def commit(self):
+        self.finish()
+        return self.writer.commit()
+
+    def abort(self):
+        self.writer.abort()
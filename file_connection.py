@@ -0,0 +1,383 @@
+import binascii
+import json
+import socket
+import logging
+import threading
+import time
+
+import file_binary_protocol as fbp
+from file_framing import DELIMITER, RECV_SIZE, FrameBuffer, send_parts
+from file_protocol import BATCH_COMMANDS, STREAMED_UPLOADS, is_batch_command, split_binary_command
+from file_admission import AdmissionController, ServerBusy, busy_result, request_cost, text_request_cost
+
+"""
+* file_connection berisi loop pengelolaan koneksi klien yang dipakai
+bersama oleh semua server (threadpool maupun processpool)
+
+* pada satu koneksi, klien boleh mengirim perintah teks yang diakhiri
+"\\r\\n\\r\\n" maupun frame biner (lihat file_binary_protocol), dipilih
+per perintah berdasarkan prefix MAGIC
+
+* body UPLOAD tidak pernah di-buffer utuh: base64 di-decode per chunk
+(framing teks) atau di-recv_into FrameBuffer koneksi (framing biner,
+lihat file_framing), lalu ditulis ke file sementara yang di-rename saat
+selesai
+
+* setiap request mengambil slot dari AdmissionController (lane small /
+large) sebelum diproses; koneksi yang idle tidak memegang slot apa pun
+
+* server threadpool/processpool memakai satu thread per koneksi terbuka
+(maksimal --max-connections). Kalau semua thread terpakai, koneksi baru
+menunggu di ConnectionQueue; selama ada yang menunggu, koneksi keep-alive
+yang idle lebih dari SATURATED_IDLE_TIMEOUT ditutup supaya thread-nya
+dipakai koneksi berikutnya (klien FileClient otomatis connect ulang)
+"""
+
+SENDFILE_CHUNK = 8 * 1024 * 1024
+IDLE_TIMEOUT = 300 # Timeout koneksi idle (detik)
+SATURATED_IDLE_TIMEOUT = 1 # Timeout koneksi idle (detik) selama ada koneksi yang menunggu thread
+
+
+class ConnectionQueue:
+    # Jumlah koneksi yang sudah di-accept tapi belum mendapat thread
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.count = 0
+
+    def add(self, n=1):
+        with self.lock:
+            self.count += n
+
+    def remove(self):
+        self.add(-1)
+
+    def __bool__(self):
+        return self.count > 0
+
+
+
+class Base64StreamDecoder:
+    # Decode base64 per chunk, sisa yang belum kelipatan 4 disimpan untuk chunk berikutnya.
+    # Dengan codec (CodecPool), chunk besar didecode di codec process pool
+    def __init__(self, codec=None):
+        self.pending = b''
+        self.codec = codec
+
+    def feed(self, data):
+        # data boleh berupa memoryview dari FrameBuffer, hanya disalin kalau ada sisa chunk sebelumnya
+        if self.pending:
+            data = self.pending + bytes(data)
+        usable = len(data) - len(data) % 4
+        self.pending = bytes(data[usable:])
+        if self.codec is not None:
+            return self.codec.b64decode(data[:usable])
+        return binascii.a2b_base64(data[:usable])
+
+    def flush(self):
+        if self.pending.strip():
+            raise ValueError('Incorrect padding')
+
+
+def send_file_body(connection, fileobj, offset, count):
+    # Kirim isi file langsung dari file descriptor per chunk. socket.sendfile
+    # memakai os.sendfile (zero-copy) kalau tersedia, dan fallback ke
+    # read/send biasa di platform yang tidak mendukung
+    end = offset + count
+    while offset < end:
+        sent = connection.sendfile(fileobj, offset, min(SENDFILE_CHUNK, end - offset))
+        if sent == 0:
+            raise ConnectionError('File truncated while sending')
+        offset += sent
+
+
+def region_command(command, region):
+    # Respons GET membawa offset dan ukuran total file: "GET <offset> <total_size>"
+    return f"{split_binary_command(command)[0].upper()} {region.offset} {region.total_size}"
+
+
+def send_binary_response(connection, command, filename, status, payload, flags=0):
+    # Return jumlah bytes yang dikirim (header + body)
+    if hasattr(payload, 'fileno'):
+        # Streaming: header kecil dulu, lalu body langsung dari file
+        with payload:
+            header = fbp.pack_header(region_command(command, payload), filename, payload.length, status,
+                                     payload.flags)
+            connection.sendall(header)
+            send_file_body(connection, payload.fp, payload.body_offset, payload.length)
+            return len(header) + payload.length
+
+    header = fbp.pack_header(command, filename, len(payload), status, flags)
+    connection.sendall(header)
+    if payload:
+        connection.sendall(payload)
+    return len(header) + len(payload)
+
+
+def match_text_upload(buffer):
+    """
+    Perintah upload teks ("UPLOAD <filename> <base64...>" atau
+    "UPLOAD_AT <filename> <offset> <base64...>") yang belum selesai diterima
+    di-stream. Return list argumen sebelum body kalau bagian itu sudah
+    lengkap (dan membuangnya dari buffer), selain itu None.
+    """
+    space = buffer.find(b' ', 0, 16)
+    if space < 0:
+        return None
+    n_args = STREAMED_UPLOADS.get(bytes(buffer.view(0, space)).decode(errors='replace').lower())
+    if n_args is None:
+        return None
+
+    args = []
+    start = space + 1
+    for _ in range(n_args):
+        end = buffer.find(b' ', start)
+        if end < 0:
+            return None
+        args.append(buffer.text(start, end))
+        start = end + 1
+    buffer.consume(start)
+    return args
+
+
+class ClientConnection:
+    def __init__(self, connection, address, fp, admission=None, idle_timeout=IDLE_TIMEOUT, waiting=None):
+        self.connection = connection
+        self.address = address
+        self.idle_timeout = idle_timeout
+        self.waiting = waiting
+        self.fp = fp
+        self.metrics = fp.metrics
+        self.admission = admission if admission is not None else AdmissionController()
+        # Buffer recv dialokasikan sekali per koneksi, recv_into langsung ke sini
+        self.buffer = FrameBuffer()
+
+    def fill(self, limit=RECV_SIZE):
+        # Tambah data dari socket ke buffer, False kalau koneksi ditutup klien
+        n = self.buffer.recv_from(self.connection, limit)
+        if n == 0:
+            return False
+        self.metrics.add('bytes_in', n)
+        return True
+
+    def send(self, response):
+        self.connection.sendall(response)
+        self.metrics.add('bytes_out', len(response))
+
+    def send_text(self, hasil):
+        # Respons JSON (bisa berisi base64 file utuh) dikirim tanpa digabung dulu dengan delimiter
+        body = hasil.encode()
+        send_parts(self.connection, body, DELIMITER)
+        self.metrics.add('bytes_out', len(body) + len(DELIMITER))
+
+    def send_binary(self, *frame):
+        self.metrics.add('bytes_out', send_binary_response(self.connection, *frame))
+
+    def serve(self):
+        while True:
+            self.process_buffer()
+            # Buffer kosong = di antara request; sisa data di buffer = request belum lengkap
+            if not (self.fill() if self.buffer or self.waiting is None else self.wait_request()):
+                break
+
+    def wait_request(self):
+        # Tunggu request berikutnya pada koneksi idle, False kalau koneksi ditutup (oleh klien,
+        # idle_timeout, atau idle lebih dari SATURATED_IDLE_TIMEOUT selama ada koneksi yang menunggu thread)
+        deadline = time.monotonic() + self.idle_timeout
+        self.connection.settimeout(min(SATURATED_IDLE_TIMEOUT, self.idle_timeout))
+        try:
+            while True:
+                try:
+                    return self.fill()
+                except socket.timeout:
+                    if self.waiting:
+                        logging.debug("closing idle connection from %s, other connections are waiting",
+                                      self.address)
+                        return False
+                    if time.monotonic() >= deadline:
+                        return False
+        finally:
+            self.connection.settimeout(self.idle_timeout)
+
+    def process_buffer(self):
+        # Proses semua perintah yang sudah lengkap di buffer
+        while self.buffer:
+            if fbp.is_binary_frame(self.buffer.view(0, len(fbp.MAGIC))):
+                header = fbp.parse_header(self.buffer.view())
+                if header is None:
+                    return
+                command, filename, status, flags, payload_len, header_len = header
+
+                c_request, args = split_binary_command(command)
+                if c_request in STREAMED_UPLOADS:
+                    self.buffer.consume(header_len)
+                    self.handle_binary_upload(command, payload_len, [filename] + args, flags)
+                    continue
+
+                if len(self.buffer) < header_len + payload_len:
+                    return
+                self.buffer.consume(header_len)
+                payload = self.buffer.take(payload_len)
+
+                batch = c_request in BATCH_COMMANDS
+                names = payload.decode(errors='replace').splitlines() if c_request == 'mget' else ()
+                try:
+                    ticket = self.admission.acquire(*request_cost(c_request, filename, args, payload_len, names))
+                except ServerBusy as e:
+                    self.send_binary(command, filename, fbp.STATUS_BUSY, json.dumps(busy_result(e, batch)).encode(),
+                                     fbp.FLAG_BATCH_END if batch else 0)
+                    continue
+
+                with ticket:
+                    if batch:
+                        # Satu frame per item dikirim begitu item tersebut siap
+                        for frame in self.fp.proses_batch_binary(command, filename, payload):
+                            self.send_binary(*frame)
+                    else:
+                        status, hasil = self.fp.proses_binary(command, filename, payload, flags)
+                        self.send_binary(command, filename, status, hasil)
+            else:
+                idx = self.buffer.find_delimiter()
+                if idx < 0:
+                    upload_args = match_text_upload(self.buffer)
+                    if upload_args is None:
+                        return
+                    self.handle_text_upload(upload_args)
+                    continue
+
+                command = self.buffer.text(0, idx)
+                self.buffer.consume(idx + len(DELIMITER))
+
+                batch = is_batch_command(command)
+                try:
+                    ticket = self.admission.acquire(*text_request_cost(command))
+                except ServerBusy as e:
+                    self.send((json.dumps(busy_result(e, batch)) + "\r\n\r\n").encode())
+                    continue
+
+                with ticket:
+                    if batch:
+                        for hasil in self.fp.proses_batch(command):
+                            self.send_text(hasil)
+                    else:
+                        hasil = self.fp.proses_string(command)
+                        self.send_text(hasil) # Kirim respons ke klien
+
+    def open_upload(self, upload_args, compressed=False, body_len=None):
+        # Return (writer, ticket, error). Kalau ditolak (ServerBusy) atau gagal dibuka,
+        # body tetap dibaca dari socket lalu dibuang supaya framing koneksi tetap benar
+        try:
+            ticket = self.admission.acquire(*request_cost('upload', body_len=body_len))
+        except ServerBusy as e:
+            return None, None, e
+        try:
+            return self.fp.open_upload(*upload_args, compressed=compressed), ticket, None
+        except Exception as e:
+            ticket.release()
+            return None, None, e
+
+    def handle_text_upload(self, upload_args):
+        writer, ticket, error = self.open_upload(upload_args)
+        try:
+            self.receive_text_upload(writer, error)
+        finally:
+            if ticket is not None:
+                ticket.release()
+
+    def receive_text_upload(self, writer, error):
+        decoder = Base64StreamDecoder(self.fp.file.codec)
+        keep = len(DELIMITER) - 1
+
+        try:
+            while True:
+                idx = self.buffer.find_delimiter()
+                end = idx if idx >= 0 else max(len(self.buffer) - keep, 0)
+                if end and error is None:
+                    try:
+                        writer.write(decoder.feed(self.buffer.view(0, end)))
+                    except Exception as e:
+                        error = e
+                if idx >= 0:
+                    self.buffer.consume(idx + len(DELIMITER))
+                    break
+                # Sisakan beberapa byte terakhir, delimiter bisa terpotong antar recv
+                self.buffer.consume(end)
+                if not self.fill():
+                    raise ConnectionError('Connection closed during upload')
+        except Exception:
+            if writer is not None:
+                writer.abort()
+            raise
+
+        if error is None:
+            try:
+                decoder.flush()
+            except Exception as e:
+                error = e
+
+        hasil = self.fp.finish_upload(writer, error)
+        response = json.dumps(hasil) + "\r\n\r\n"
+        self.send(response.encode())
+
+    def handle_binary_upload(self, command, payload_len, upload_args, flags=0):
+        writer, ticket, error = self.open_upload(upload_args, bool(flags & fbp.FLAG_ZLIB), payload_len)
+        try:
+            self.receive_binary_upload(command, payload_len, upload_args, writer, error)
+        finally:
+            if ticket is not None:
+                ticket.release()
+
+    def receive_binary_upload(self, command, payload_len, upload_args, writer, error):
+        remaining = payload_len
+
+        # Sebagian body mungkin sudah ada di buffer, sisanya di-recv_into per chunk;
+        # recv tidak melewati akhir body supaya perintah berikutnya tetap di buffer
+        try:
+            while remaining:
+                if not self.buffer and not self.fill(min(RECV_SIZE, remaining)):
+                    raise ConnectionError('Connection closed during upload')
+                take = min(len(self.buffer), remaining)
+                if error is None:
+                    try:
+                        writer.write(self.buffer.view(0, take))
+                    except Exception as e:
+                        error = e
+                self.buffer.consume(take)
+                remaining -= take
+        except Exception:
+            if writer is not None:
+                writer.abort()
+            raise
+
+        hasil = self.fp.finish_upload(writer, error)
+        status = upload_status(hasil)
+        self.send_binary(command, upload_args[0], status, json.dumps(hasil).encode())
+
+
+def upload_status(hasil):
+    if hasil['status'] == 'OK':
+        return fbp.STATUS_OK
+    return fbp.STATUS_BUSY if 'retry_after' in hasil else fbp.STATUS_ERROR
+
+
+# Fungsi untuk manage setiap koneksi klien
+def manage_connection(connection, address, fp, admission=None, idle_timeout=IDLE_TIMEOUT, waiting=None):
+    # waiting: ConnectionQueue tempat koneksi ini menunggu thread (sudah ditambah oleh accept loop)
+    if waiting is not None:
+        waiting.remove()
+    logging.debug("manage connection from %s", address)
+    client = ClientConnection(connection, address, fp, admission, idle_timeout, waiting)
+    fp.metrics.add('connections')
+    fp.metrics.add('active_connections')
+    try:
+        connection.settimeout(idle_timeout)
+        # Respons kecil yang berurutan (pipelining) langsung dikirim tanpa menunggu ACK (Nagle),
+        # sama seperti default transport asyncio
+        connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        client.serve()
+
+    except Exception as e:
+        logging.warning(f"error: {str(e)}")
+    finally:
+        logging.debug("connection from %s has closed", address)
+        fp.metrics.add('active_connections', -1)
+        connection.close()
@@ -0,0 +1,188 @@
+import os
+import uuid
+import hashlib
+import tempfile
+import threading
+import contextlib
+
+"""
+* DedupStore menyimpan isi file sekali per digest (sha256) di direktori
+tersembunyi .objects/<2 huruf awal>/<digest>; nama file yang terlihat di
+LIST hanyalah hard link ke blob tersebut
+
+* jumlah referensi sebuah blob = st_nlink - 1 (link milik blob sendiri),
+jadi tidak perlu metadata tambahan dan tetap konsisten antar worker
+server processpool. Saat referensi terakhir dihapus/ditimpa, blob ikut
+dihapus
+
+* upload di-hash sambil di-stream ke file sementara di .objects; kalau
+digest-nya sudah ada, file sementara dibuang dan nama cukup di-link ke
+blob yang lama
+"""
+
+OBJECTS_DIR = '.objects'
+HASH_CHUNK = 1024 * 1024
+
+
+class DedupStore:
+    def __init__(self, directory='.'):
+        self.root = os.path.join(directory, OBJECTS_DIR)
+        os.makedirs(self.root, exist_ok=True)
+        self.lock = threading.Lock()
+        self.digest_by_inode = {}   # (st_dev, st_ino) -> digest, untuk release
+        self.scan()
+
+    def blob_path(self, digest):
+        return os.path.join(self.root, digest[:2], digest)
+
+    def scan(self):
+        # Bangun ulang map inode -> digest, sekaligus buang blob yatim (nlink 1)
+        digest_by_inode = {}
+        for prefix in os.listdir(self.root):
+            subdir = os.path.join(self.root, prefix)
+            if prefix.startswith('.') or not os.path.isdir(subdir):
+                continue
+            for digest in os.listdir(subdir):
+                st = os.stat(os.path.join(subdir, digest))
+                if st.st_nlink <= 1:
+                    os.remove(os.path.join(subdir, digest))
+                    continue
+                digest_by_inode[(st.st_dev, st.st_ino)] = digest
+        with self.lock:
+            self.digest_by_inode = digest_by_inode
+
+    def temp_file(self, filename):
+        # File sementara di filesystem yang sama dengan blob, supaya bisa di-link
+        fd, temp_path = tempfile.mkstemp(dir=self.root, prefix=f'.{os.path.basename(filename)}.', suffix='.upload')
+        return os.fdopen(fd, 'wb'), temp_path
+
+    def publish(self, temp_path, digest, filename):
+        """
+        Jadikan isi temp_path (digest sudah dihitung) sebagai `filename`.
+        Return True kalau isi yang sama sudah tersimpan sebelumnya.
+        temp_path selalu dihapus.
+        """
+        blob = self.blob_path(digest)
+        os.makedirs(os.path.dirname(blob), exist_ok=True)
+        try:
+            while True:
+                try:
+                    os.link(temp_path, blob)
+                    deduplicated = False
+                except FileExistsError:
+                    deduplicated = True
+                try:
+                    self.link_name(blob, filename)
+                    break
+                except FileNotFoundError:
+                    # Blob lama baru saja di-release oleh worker lain, ulangi
+                    continue
+            st = os.stat(blob)
+            with self.lock:
+                self.digest_by_inode[(st.st_dev, st.st_ino)] = digest
+            return deduplicated
+        finally:
+            os.remove(temp_path)
+
+    def publish_file(self, path, filename):
+        # Publish file yang sudah utuh di disk (mis. upload parsial): hash dulu, lalu link
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(HASH_CHUNK), b''):
+                digest.update(chunk)
+        digest = digest.hexdigest()
+        return digest, self.publish(path, digest, filename)
+
+    def link_name(self, blob, filename):
+        # Link ke nama sementara lalu os.replace, supaya penggantian nama tetap atomic. Nama
+        # sementara ada di .objects (di-skip scan), bukan di direktori yang di-index LIST
+        link_path = os.path.join(self.root, f'.{os.path.basename(filename)}.{uuid.uuid4().hex}.link')
+        os.link(blob, link_path)
+        try:
+            old = self.stat_name(filename)
+            os.replace(link_path, filename)
+        finally:
+            # rename tidak melakukan apa-apa kalau filename sudah link ke inode yang sama
+            if os.path.lexists(link_path):
+                os.remove(link_path)
+        if old is not None:
+            self.release(old)
+
+    @staticmethod
+    def stat_name(filename):
+        try:
+            return os.stat(filename)
+        except FileNotFoundError:
+            return None
+
+    def refs(self, filename):
+        return os.stat(filename).st_nlink - 1
+
+    def release(self, st):
+        """
+        Dipanggil setelah sebuah nama yang dulu menunjuk ke inode `st`
+        dihapus/ditimpa. Kalau tidak ada referensi lain, blob-nya dihapus.
+        """
+        if st.st_nlink < 2:
+            return  # nama tersebut satu-satunya link, bukan blob dedup
+        key = (st.st_dev, st.st_ino)
+        with self.lock:
+            digest = self.digest_by_inode.get(key)
+        if digest is None:
+            # Blob mungkin dibuat oleh worker lain
+            self.scan()
+            with self.lock:
+                digest = self.digest_by_inode.get(key)
+            if digest is None:
+                return
+
+        blob = self.blob_path(digest)
+        with self.lock:
+            try:
+                current = os.stat(blob)
+            except FileNotFoundError:
+                self.digest_by_inode.pop(key, None)
+                return
+            if (current.st_dev, current.st_ino) == key and current.st_nlink <= 1:
+                os.remove(blob)
+                self.digest_by_inode.pop(key, None)
+
+
+class DedupWriter:
+    """
+    Pengganti UploadWriter untuk storage dedup: isi upload di-hash sambil
+    ditulis ke file sementara, lalu di-publish sebagai blob saat commit
+    (di bawah exclusive lock nama tersebut kalau locks diberikan)
+    """
+    def __init__(self, filename, store, on_commit=None, locks=None):
+        if filename == '':
+            raise ValueError('Filename is required')
+        self.filename = filename
+        self.store = store
+        self.on_commit = on_commit
+        self.locks = locks
+        self.size = 0
+        self.digest = hashlib.sha256()
+        self.fp, self.temp_path = store.temp_file(filename)
+
+    def write(self, data):
+        self.digest.update(data)
+        self.fp.write(data)
+        self.size += len(data)
+
+    def commit(self):
+        self.fp.close()
+        digest = self.digest.hexdigest()
+        lock = self.locks.exclusive(self.filename) if self.locks is not None else contextlib.nullcontext()
+        with lock:
+            deduplicated = self.store.publish(self.temp_path, digest, self.filename)
+            if self.on_commit is not None:
+                self.on_commit(self.filename)
+            refs = self.store.refs(self.filename)
+        return dict(status='OK', data='File uploaded successfully', sha256=digest, deduplicated=deduplicated,
+                    refs=refs)
+
+    def abort(self):
+        self.fp.close()
+        if os.path.exists(self.temp_path):
+            os.remove(self.temp_path)
@@ -0,0 +1,126 @@
+"""
+* file_framing berisi buffer penerimaan yang dipakai bersama oleh loop
+koneksi server (threadpool/processpool dan asyncio) dan klien
+(FileClient, stress test client)
+
+* FrameBuffer adalah bytearray yang tumbuh sendiri: recv_into langsung
+ke ruang kosong di belakang data, bagian yang sudah diproses cukup
+dilewati (start maju). Isi buffer baru digeser ke depan saat ruang di
+belakang habis, dan hanya dialokasikan ulang kalau memang kurang besar
+
+* find_delimiter() hanya memindai data yang baru masuk sejak pemanggilan
+sebelumnya, jadi menunggu perintah/respons teks yang besar tetap linear
+terhadap ukurannya, bukan kuadratik
+
+* view() memberi memoryview tanpa copy dan tanpa decode. View hanya
+berlaku sampai recv/append berikutnya (isi buffer bisa digeser atau
+ditimpa), pakai take() untuk data yang perlu disimpan lebih lama
+
+* di sisi kirim, send_parts() mengirim beberapa potongan bytes (mis.
+"UPLOAD nama ", body base64, delimiter) dengan sendmsg tanpa
+menggabungkannya dulu menjadi satu string/bytes besar
+"""
+
+DELIMITER = b"\r\n\r\n"
+RECV_SIZE = 1024 * 1024
+
+
+class FrameBuffer:
+    def __init__(self, size=RECV_SIZE):
+        self.data = bytearray(size)
+        self.start = 0      # awal data yang belum diproses
+        self.end = 0        # akhir data yang sudah diterima
+        self.scanned = 0    # sebelum posisi ini sudah pasti tidak ada delimiter
+
+    def __len__(self):
+        return self.end - self.start
+
+    def __bool__(self):
+        return self.end > self.start
+
+    def reserve(self, size):
+        # Pastikan ada ruang kosong minimal `size` bytes setelah end
+        if len(self.data) - self.end >= size:
+            return
+        used = len(self)
+        if used + size <= len(self.data):
+            # Geser ke depan di tempat, ukuran bytearray tetap jadi aman walaupun masih ada view
+            self.data[:used] = self.data[self.start:self.end]
+        else:
+            # bytearray yang masih punya view tidak bisa di-resize, pindah ke yang baru
+            data = bytearray(max(len(self.data) * 2, used + size))
+            data[:used] = memoryview(self.data)[self.start:self.end]
+            self.data = data
+        self.scanned = max(self.scanned - self.start, 0)
+        self.start, self.end = 0, used
+
+    def recv_from(self, sock, limit=RECV_SIZE):
+        # recv_into langsung ke buffer, return jumlah bytes (0 = koneksi ditutup)
+        self.reserve(limit)
+        with memoryview(self.data) as view:
+            n = sock.recv_into(view[self.end:self.end + limit])
+        self.end += n
+        return n
+
+    def append(self, data):
+        # Untuk sumber yang sudah berupa bytes (mis. asyncio StreamReader)
+        self.reserve(len(data))
+        self.data[self.end:self.end + len(data)] = data
+        self.end += len(data)
+
+    def find_delimiter(self, delimiter=DELIMITER):
+        # Posisi delimiter relatif terhadap awal data, -1 kalau belum ada
+        idx = self.data.find(delimiter, max(self.scanned, self.start), self.end)
+        if idx < 0:
+            # Delimiter bisa terpotong di akhir data, sisakan len - 1 byte untuk dipindai lagi
+            self.scanned = max(self.end - len(delimiter) + 1, self.start)
+            return -1
+        return idx - self.start
+
+    def find(self, sub, start=0, end=None):
+        end = self.end if end is None else min(self.start + end, self.end)
+        idx = self.data.find(sub, self.start + start, end)
+        return idx - self.start if idx >= 0 else -1
+
+    def view(self, start=0, end=None):
+        end = self.end if end is None else min(self.start + end, self.end)
+        return memoryview(self.data)[self.start + start:end]
+
+    def text(self, start=0, end=None):
+        return str(self.view(start, end), 'utf-8')
+
+    def consume(self, n):
+        self.start += n
+        if self.start >= self.end:
+            # Buffer kosong: mulai lagi dari depan, tanpa alokasi baru
+            self.start = self.end = self.scanned = 0
+
+    def take(self, n):
+        # Salin n bytes pertama (untuk payload yang disimpan lebih lama dari satu recv)
+        data = bytes(self.view(0, n))
+        self.consume(n)
+        return data
+
+
+def command_parts(command):
+    # Perintah teks boleh berupa str, bytes, atau list potongan str/bytes yang sudah di-encode
+    if isinstance(command, (list, tuple)):
+        return [part.encode() if isinstance(part, str) else part for part in command]
+    return [command.encode() if isinstance(command, str) else command]
+
+
+def send_parts(sock, *parts):
+    # sendall untuk beberapa buffer sekaligus (scatter/gather), tanpa copy ke satu buffer besar
+    views = [memoryview(part).cast('B') for part in parts if len(part)]
+    if not hasattr(sock, 'sendmsg'):    # Windows
+        for view in views:
+            sock.sendall(view)
+        return
+    while views:
+        sent = sock.sendmsg(views)
+        while sent:
+            if sent >= len(views[0]):
+                sent -= len(views.pop(0))
+            else:
+                views[0] = views[0][sent:]
+                sent = 0
@@ -0,0 +1,98 @@
+import math
+
+"""
+* LatencyHistogram adalah histogram latency sisi klien yang bisa
+digabung (merge): setiap load generator mengirim histogramnya sendiri
+dan coordinator cukup menjumlahkan count per bucket, tidak perlu
+mengirim atau mengurutkan jutaan sampel latency
+
+* bucket log-linear dalam mikrodetik: di bawah 2^SUB_BITS setiap nilai
+punya bucket sendiri, di atasnya setiap rentang [2^k, 2^(k+1)) dibagi
+2^(SUB_BITS-1) bucket sama lebar. Error relatif percentile paling besar
+~3% (SUB_BITS=6), jauh lebih halus dari bucket pangkat dua file_metrics
+
+* to_dict()/from_dict() hanya menyimpan bucket yang terisi, supaya
+mudah dikirim sebagai JSON lewat control socket dan disimpan di hasil
+"""
+
+SUB_BITS = 6
+SUB_COUNT = 1 << SUB_BITS           # nilai < SUB_COUNT disimpan tepat
+HALF_COUNT = SUB_COUNT >> 1         # bucket per pangkat dua di atasnya
+
+
+def bucket_index(us):
+    us = max(int(us), 0)
+    if us < SUB_COUNT:
+        return us
+    shift = us.bit_length() - SUB_BITS
+    return SUB_COUNT + (shift - 1) * HALF_COUNT + (us >> shift) - HALF_COUNT
+
+
+def bucket_upper_us(index):
+    # Nilai terbesar yang masuk ke bucket index
+    if index < SUB_COUNT:
+        return index
+    shift = (index - SUB_COUNT) // HALF_COUNT + 1
+    mantissa = (index - SUB_COUNT) % HALF_COUNT + HALF_COUNT
+    return ((mantissa + 1) << shift) - 1
+
+
+class LatencyHistogram:
+    def __init__(self):
+        self.counts = {}
+        self.count = 0
+        self.total_us = 0
+        self.min_us = None
+        self.max_us = 0
+
+    def record(self, seconds):
+        us = max(int(seconds * 1_000_000), 0)
+        index = bucket_index(us)
+        self.counts[index] = self.counts.get(index, 0) + 1
+        self.count += 1
+        self.total_us += us
+        self.min_us = us if self.min_us is None else min(self.min_us, us)
+        self.max_us = max(self.max_us, us)
+
+    def merge(self, other):
+        for index, n in other.counts.items():
+            self.counts[index] = self.counts.get(index, 0) + n
+        self.count += other.count
+        self.total_us += other.total_us
+        if other.min_us is not None:
+            self.min_us = other.min_us if self.min_us is None else min(self.min_us, other.min_us)
+        self.max_us = max(self.max_us, other.max_us)
+        return self
+
+    def percentile(self, fraction):
+        # Nearest-rank seperti percentile() di stress client, dalam detik. Batas atas bucket
+        # dipotong ke max supaya p99 tidak pernah lebih besar dari latency terbesar yang tercatat
+        if self.count == 0:
+            return 0
+        rank = min(max(math.ceil(fraction * self.count), 1), self.count)
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= rank:
+                return min(bucket_upper_us(index), self.max_us) / 1_000_000
+        return self.max_us / 1_000_000
+
+    def mean(self):
+        return self.total_us / self.count / 1_000_000 if self.count else 0
+
+    def max(self):
+        return self.max_us / 1_000_000
+
+    def to_dict(self):
+        return {'counts': {str(index): n for index, n in sorted(self.counts.items())}, 'count': self.count,
+                'total_us': self.total_us, 'min_us': self.min_us, 'max_us': self.max_us}
+
+    @classmethod
+    def from_dict(cls, data):
+        histogram = cls()
+        histogram.counts = {int(index): n for index, n in data.get('counts', {}).items()}
+        histogram.count = data.get('count', 0)
+        histogram.total_us = data.get('total_us', 0)
+        histogram.min_us = data.get('min_us')
+        histogram.max_us = data.get('max_us', 0)
+        return histogram
@@ -0,0 +1,117 @@
+import os
+import bisect
+import threading
+
+"""
+* DirectoryIndex menyimpan daftar file di direktori penyimpanan (nama,
+size, mtime) di memory, dibangun sekali dengan os.scandir lalu di-update
+oleh upload/delete, sehingga LIST tidak perlu membaca direktori lagi
+
+* nama disimpan terurut, jadi filter prefix dan pagination berbasis
+cursor cukup bisect + membaca satu halaman: O(log n + page size)
+
+* perubahan dari luar process ini (mis. worker lain di server
+processpool) dideteksi lewat mtime direktori; kalau berubah, index
+dibangun ulang
+
+* dengan storage packed, nama yang disimpan di SegmentStore ikut
+di-list dengan size dan mtime dari index segment. Perubahan dari
+process lain dideteksi lewat SegmentStore.generation
+"""
+
+DEFAULT_PAGE_SIZE = 1000
+MAX_PAGE_SIZE = 10000
+
+
+class DirectoryIndex:
+    def __init__(self, directory='.', packed=None):
+        self.directory = directory
+        self.packed = packed
+        self.packed_generation = None
+        self.lock = threading.Lock()
+        self.names = []   # terurut
+        self.meta = {}    # name -> (size, mtime)
+        self.dir_mtime_ns = None
+        self.rebuild()
+
+    @staticmethod
+    def is_indexed(name):
+        # File tersembunyi (termasuk file sementara upload) tidak ikut di-list
+        return not name.startswith('.') and '/' not in name and os.sep not in name
+
+    def rebuild(self):
+        meta = {}
+        dir_mtime_ns = os.stat(self.directory).st_mtime_ns
+        packed_generation = None
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                if self.is_indexed(entry.name) and entry.is_file():
+                    st = entry.stat()
+                    meta[entry.name] = (st.st_size, st.st_mtime)
+        if self.packed is not None:
+            listing = self.packed.listing()
+            packed_generation = self.packed.generation
+            meta.update((name, stat) for name, stat in listing.items() if self.is_indexed(name))
+        with self.lock:
+            self.meta = meta
+            self.names = sorted(meta)
+            self.dir_mtime_ns = dir_mtime_ns
+            self.packed_generation = packed_generation
+
+    def refresh_if_changed(self):
+        if self.packed is not None:
+            # Generation hanya naik karena process lain, perubahan sendiri sudah lewat update()
+            self.packed.refresh()
+            if self.packed.generation != self.packed_generation:
+                self.rebuild()
+                return
+        if os.stat(self.directory).st_mtime_ns != self.dir_mtime_ns:
+            self.rebuild()
+
+    def update(self, name):
+        # Dipanggil setelah file dibuat/ditimpa/dihapus oleh process ini
+        if not self.is_indexed(name):
+            return
+        try:
+            st = os.stat(os.path.join(self.directory, name))
+            st = (st.st_size, st.st_mtime)
+        except FileNotFoundError:
+            st = self.packed.stat(name) if self.packed is not None else None
+
+        with self.lock:
+            if st is None:
+                if self.meta.pop(name, None) is not None:
+                    del self.names[bisect.bisect_left(self.names, name)]
+            else:
+                if name not in self.meta:
+                    bisect.insort(self.names, name)
+                self.meta[name] = st
+            self.dir_mtime_ns = os.stat(self.directory).st_mtime_ns
+
+    def page(self, prefix='', cursor='', limit=DEFAULT_PAGE_SIZE):
+        """
+        Return (entries, next_cursor). entries berisi dict name/size/mtime
+        untuk nama yang diawali prefix dan > cursor; next_cursor None kalau
+        sudah halaman terakhir.
+        """
+        self.refresh_if_changed()
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+
+        with self.lock:
+            start = bisect.bisect_left(self.names, prefix)
+            if cursor:
+                start = max(start, bisect.bisect_right(self.names, cursor))
+
+            entries = []
+            i = start
+            while i < len(self.names) and len(entries) < limit:
+                name = self.names[i]
+                if not name.startswith(prefix):
+                    break
+                size, mtime = self.meta[name]
+                entries.append(dict(name=name, size=size, mtime=mtime))
+                i += 1
+
+            has_more = i < len(self.names) and self.names[i].startswith(prefix)
+        next_cursor = entries[-1]['name'] if has_more and entries else None
+        return entries, next_cursor
@@ -1,30 +1,265 @@
 import os
 import json
-import base64
-from glob import glob
+import re
+import tempfile
+import itertools
+import urllib.parse
+import contextlib
+import collections
+import concurrent.futures
+
+from file_cache import ResponseCache
+from file_codec import CodecPool
+from file_dedup import DedupStore, DedupWriter
+from file_index import DirectoryIndex, DEFAULT_PAGE_SIZE
+from file_locks import StripedLocks
+from file_segments import SegmentStore, PackedWriter
+
+# Direktori penyimpanan di-resolve sekali saat import, sehingga membuat
+# FileInterface lebih dari sekali (mis. dengan opsi berbeda) tetap aman
+FILES_DIR = os.path.abspath('files')
+
+# File sementara upload dan upload parsial disimpan di subdirektori
+# tersembunyi, supaya membuatnya tidak mengubah mtime direktori penyimpanan
+# (yang membuat DirectoryIndex dibangun ulang pada LIST berikutnya)
+STAGING_DIR = '.staging'
+
+# Perintah batch (MGET/MDELETE/MUPLOAD): jumlah thread I/O dan jumlah item
+# yang boleh diproses mendahului item yang sedang dikirim ke klien
+BATCH_IO_WORKERS = 4
+BATCH_WINDOW = 8
+
+
+class UploadWriter:
+    """
+    Menulis upload ke file sementara di STAGING_DIR, lalu
+    di-rename ke nama aslinya (os.replace) saat upload selesai. Dengan
+    begitu isi file bisa ditulis per chunk tanpa buffer seluruh file,
+    dan upload yang gagal tidak meninggalkan file setengah jadi.
+    Kalau locks diberikan, rename dan on_commit dilakukan di bawah
+    exclusive lock nama tersebut.
+    """
+    def __init__(self, filename, on_commit=None, locks=None):
+        if filename == '':
+            raise ValueError('Filename is required')
+        self.filename = filename
+        self.on_commit = on_commit
+        self.locks = locks
+        self.size = 0
+        basename = os.path.basename(filename)
+        fd, self.temp_path = tempfile.mkstemp(dir=STAGING_DIR, prefix=f'{basename}.', suffix='.upload')
+        self.fp = os.fdopen(fd, 'wb')
+
+    def write(self, data):
+        self.fp.write(data)
+        self.size += len(data)
+
+    def commit(self):
+        self.fp.close()
+        with publish_lock(self.locks, self.filename):
+            os.replace(self.temp_path, self.filename)
+            if self.on_commit is not None:
+                self.on_commit(self.filename)
+        return dict(status='OK', data='File uploaded successfully')
+
+    def abort(self):
+        self.fp.close()
+        if os.path.exists(self.temp_path):
+            os.remove(self.temp_path)
+
+
+def publish_lock(locks, filename):
+    return locks.exclusive(filename) if locks is not None else contextlib.nullcontext()
+
+
+def partial_path(filename, upload_id=None):
+    # Lokasi upload parsial (resumable) di STAGING_DIR sampai di-commit, nama di-quote
+    # supaya nama dengan subdirektori tidak bertabrakan. upload_id opsional memisahkan
+    # beberapa upload paralel ke nama yang sama
+    name = urllib.parse.quote(os.path.normpath(filename), safe='')
+    if upload_id is None:
+        return os.path.join(STAGING_DIR, f'{name}.partial')
+    if not re.fullmatch(r'[A-Za-z0-9_-]+', upload_id):
+        raise ValueError('Invalid upload id')
+    return os.path.join(STAGING_DIR, f'{name}.{upload_id}.partial')
+
+
+class PartialWriter:
+    """
+    Menulis potongan upload pada offset tertentu di file parsial. Data
+    yang sudah tertulis tetap disimpan walaupun koneksi putus, jadi klien
+    bisa melanjutkan (UPLOAD_STATUS) lalu mempublish-nya (UPLOAD_COMMIT).
+    """
+    def __init__(self, filename, offset, upload_id=None):
+        if filename == '':
+            raise ValueError('Filename is required')
+        if offset < 0:
+            raise ValueError('Offset must not be negative')
+        self.filename = filename
+        self.offset = offset
+        self.size = 0
+        self.path = partial_path(filename, upload_id)
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT | getattr(os, 'O_BINARY', 0), 0o644)
+        self.fp = os.fdopen(fd, 'r+b')
+        self.fp.seek(offset)
+
+    def write(self, data):
+        self.fp.write(data)
+        self.size += len(data)
+
+    def commit(self):
+        self.fp.close()
+        return dict(status='OK', data='Part uploaded successfully', offset=self.offset, length=self.size,
+                    received=os.path.getsize(self.path))
+
+    def abort(self):
+        self.fp.close()
+
+
+class FileRegion:
+    """
+    Potongan file (offset, length) yang sudah dibuka untuk di-stream oleh
+    connection loop dengan sendfile, dipakai oleh GET biner (full maupun range)
+    """
+    flags = 0   # flags header respons, lihat CompressedRegion
+
+    def __init__(self, filename, offset=0, length=None):
+        self.fp = open(filename, 'rb')
+        self.total_size = os.fstat(self.fp.fileno()).st_size
+        if offset < 0 or offset > self.total_size:
+            self.fp.close()
+            raise ValueError('Offset is outside the file')
+        self.offset = offset
+        self.body_offset = offset   # posisi body di self.fp
+        available = self.total_size - offset
+        self.length = available if length is None else max(0, min(length, available))
+
+    @property
+    def version(self):
+        # Key cache GET: berubah setiap kali file ditimpa
+        st = os.fstat(self.fp.fileno())
+        return (st.st_size, st.st_mtime_ns)
+
+    def read(self):
+        self.fp.seek(self.offset)
+        return self.fp.read(self.length)
+
+    def fileno(self):
+        return self.fp.fileno()
+
+    def close(self):
+        self.fp.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
 
 class FileInterface:
-    def __init__(self):
-        os.chdir('files/')
+    def __init__(self, cache_size=128 * 1024 * 1024, storage='plain', codec_workers=0):
+        os.chdir(FILES_DIR)
+        os.makedirs(STAGING_DIR, exist_ok=True)
+        # Cache payload GET (base64) bersama untuk semua thread, 0 = nonaktif
+        self.cache = ResponseCache(max_bytes=cache_size)
+        # Body GET biner terkompresi (file sementara, lihat file_compression), budget sama dengan cache di atas
+        self.compressed = ResponseCache(max_bytes=cache_size)
+        # storage 'dedup' = isi upload disimpan sekali per digest (lihat file_dedup)
+        # storage 'packed' = upload kecil di-append ke file segment (lihat file_segments)
+        if storage not in ('plain', 'dedup', 'packed'):
+            raise ValueError(f'Unknown storage mode: {storage}')
+        self.store = DedupStore('.') if storage == 'dedup' else None
+        self.packed = SegmentStore('.') if storage == 'packed' else None
+        # Index isi direktori (dan segment) untuk LIST, dibangun sekali saat start
+        self.index = DirectoryIndex('.', packed=self.packed)
+        # Reader/writer lock per nama file (lihat file_locks), juga antar worker process
+        self.locks = StripedLocks(directory='.')
+        # Pool kecil untuk overlap disk I/O antar item perintah batch
+        self.io_pool = concurrent.futures.ThreadPoolExecutor(max_workers=BATCH_IO_WORKERS,
+                                                             thread_name_prefix='batch-io')
+        # base64 payload besar dikerjakan di process pool (lihat file_codec), 0 = di thread sendiri
+        self.codec = CodecPool(codec_workers)
+
+    # Dipanggil setiap kali isi sebuah file berubah (upload selesai / delete)
+    def _on_change(self, filename):
+        self.cache.invalidate(filename)
+        self.compressed.invalidate(filename)
+        self.index.update(filename)
+
+    # Nama yang dipublish sebagai file biasa tidak boleh tertutup entry segment lamanya
+    def _on_unpack(self, filename):
+        if self.packed is not None:
+            self.packed.delete(filename)
+        self._on_change(filename)
 
     def list(self, params=[]):
+        # LIST [prefix] [prefix=...] [cursor=...] [limit=...]
         try:
-            filelist = glob('*.*')
-            return dict(status='OK', data=filelist)
+            options = dict(prefix='', cursor='', limit=str(DEFAULT_PAGE_SIZE))
+            for param in params:
+                key, sep, value = param.partition('=')
+                if not sep:
+                    key, value = 'prefix', param
+                if key not in options:
+                    return dict(status='ERROR', data=f'Unknown LIST option: {key}')
+                options[key] = value
+
+            filelist, next_cursor = self.index.page(options['prefix'], options['cursor'], int(options['limit']))
+            return dict(status='OK', data=filelist, next_cursor=next_cursor)
         except Exception as e:
             return dict(status='ERROR', data=str(e))
 
     def get(self, params=[]):
+        # GET filename [offset [length]]
         try:
             filename = params[0]
             if (filename == ''):
                 return None
-            fp = open(f"{filename}", 'rb')
-            isifile = base64.b64encode(fp.read()).decode()
-            fp.close()
+            if len(params) > 1:
+                offset = int(params[1])
+                length = int(params[2]) if len(params) > 2 else None
+                with self._open_region(filename, offset, length) as region:
+                    isifile = self.codec.b64encode(region.read()).decode()
+                return dict(status='OK', data_namafile=filename, data_file=isifile,
+                            offset=region.offset, length=region.length, size=region.total_size)
+
+            # Key cache diambil dari file yang sudah dibuka, jadi selalu cocok dengan isi yang dibaca
+            with self._open_region(filename) as region:
+                isifile = self.cache.get_or_load((filename, region.version),
+                                                 lambda: self.codec.b64encode(region.read()).decode())
             return dict(status='OK', data_namafile=filename, data_file=isifile)
         except Exception as e:
             return dict(status='ERROR', data=str(e))
+
+    # Versi mentah (tanpa base64) untuk framing biner. GET tidak membaca isi
+    # file ke memory, FileRegion dikembalikan supaya bisa di-stream (sendfile)
+    def _open_region(self, filename, offset=0, length=None):
+        if filename == '':
+            raise ValueError('Filename is required')
+        # Lock cukup selama open: setelah itu fd menunjuk ke snapshot yang tidak akan ditulis ulang
+        with self.locks.shared(filename):
+            if self.packed is not None:
+                region = self.packed.open_region(filename, offset, length)
+                if region is not None:
+                    return region
+            return FileRegion(filename, offset, length)
+
+    # offset None = upload utuh (atomic replace), selain itu tulis di file parsial
+    def _open_upload(self, filename, offset=None, upload_id=None):
+        if offset is None:
+            if self.store is not None:
+                return DedupWriter(filename, self.store, on_commit=self._on_change, locks=self.locks)
+            if self.packed is not None:
+                # Upload yang ternyata besar tetap jadi file biasa, entry segment lamanya dihapus
+                return PackedWriter(filename, self.packed, on_commit=self._on_change, locks=self.locks,
+                                    make_spill=lambda: UploadWriter(filename, on_commit=self._on_unpack,
+                                                                    locks=self.locks))
+            return UploadWriter(filename, on_commit=self._on_change, locks=self.locks)
+        return PartialWriter(filename, int(offset), upload_id)
+
+    def cachestats(self, params=[]):
+        return dict(status='OK', data=dict(self.cache.stats(), compressed=self.compressed.stats()))
     
     def upload(self, params=[]):
         try:
@@ -32,27 +267,180 @@ class FileInterface:
                 return dict(status='ERROR', data='Parameter tidak cocok, karena kurang')
             
             filename = params[0]
-            isifile = base64.b64decode(params[1])
+            isifile = self.codec.b64decode(params[1])
 
-            with open(filename, 'wb') as fp:
-                fp.write(isifile)
-            return dict(status='OK', data='File uploaded successfully')
+            writer = self._open_upload(filename)
+            try:
+                writer.write(isifile)
+                return writer.commit()
+            except Exception:
+                writer.abort()
+                raise
         
         except Exception as e:
             return dict(status='ERROR', data=str(e))
     
+    def upload_at(self, params=[]):
+        # UPLOAD_AT filename offset base64
+        try:
+            if len(params) < 3:
+                return dict(status='ERROR', data='Parameter tidak cocok, karena kurang')
+
+            writer = self._open_upload(params[0], params[1])
+            try:
+                writer.write(self.codec.b64decode(params[2]))
+                return writer.commit()
+            except Exception:
+                writer.abort()
+                raise
+
+        except Exception as e:
+            return dict(status='ERROR', data=str(e))
+
+    def upload_status(self, params=[]):
+        # UPLOAD_STATUS filename [upload_id], berapa byte upload parsial yang sudah diterima server
+        try:
+            if len(params) < 1:
+                return dict(status='ERROR', data='Parameter tidak cocok, karena kurang')
+            path = partial_path(params[0], params[1] if len(params) > 1 else None)
+            received = os.path.getsize(path) if os.path.exists(path) else 0
+            return dict(status='OK', data=received)
+
+        except Exception as e:
+            return dict(status='ERROR', data=str(e))
+
+    def upload_commit(self, params=[]):
+        # UPLOAD_COMMIT filename [expected_size [upload_id]], publish upload parsial ke nama aslinya
+        try:
+            if len(params) < 1:
+                return dict(status='ERROR', data='Parameter tidak cocok, karena kurang')
+            filename = params[0]
+            path = partial_path(filename, params[2] if len(params) > 2 else None)
+            if not os.path.exists(path):
+                return dict(status='ERROR', data='No partial upload found')
+
+            received = os.path.getsize(path)
+            if len(params) > 1 and params[1] != '-' and received != int(params[1]):
+                return dict(status='ERROR', data=f'Partial upload has {received} bytes, expected {params[1]}')
+
+            if self.store is not None:
+                with self.locks.exclusive(filename):
+                    digest, deduplicated = self.store.publish_file(path, filename)
+                    self._on_change(filename)
+                    refs = self.store.refs(filename)
+                return dict(status='OK', data='File uploaded successfully', size=received,
+                            sha256=digest, deduplicated=deduplicated, refs=refs)
+
+            with self.locks.exclusive(filename):
+                os.replace(path, filename)
+                self._on_unpack(filename)
+            return dict(status='OK', data='File uploaded successfully', size=received)
+
+        except Exception as e:
+            return dict(status='ERROR', data=str(e))
+
+    def upload_abort(self, params=[]):
+        # UPLOAD_ABORT filename [upload_id], buang upload parsial (kalau ada)
+        try:
+            if len(params) < 1:
+                return dict(status='ERROR', data='Parameter tidak cocok, karena kurang')
+            path = partial_path(params[0], params[1] if len(params) > 1 else None)
+            if os.path.exists(path):
+                os.remove(path)
+            return dict(status='OK', data='Partial upload discarded')
+
+        except Exception as e:
+            return dict(status='ERROR', data=str(e))
+
+    def _batch(self, func, items):
+        """
+        Jalankan func(item) di io_pool dan yield hasilnya sesuai urutan
+        items. Paling banyak BATCH_WINDOW item berjalan sekaligus, jadi
+        memory tetap terbatas walaupun jumlah item besar. Exception dari
+        func ikut di-yield sebagai hasil item tersebut.
+        """
+        def run(item):
+            try:
+                return func(item)
+            except Exception as e:
+                return e
+
+        items = iter(items)
+        pending = collections.deque(self.io_pool.submit(run, item) for item in itertools.islice(items, BATCH_WINDOW))
+        try:
+            while pending:
+                result = pending.popleft().result()
+                for item in itertools.islice(items, 1):
+                    pending.append(self.io_pool.submit(run, item))
+                yield result
+        finally:
+            # Klien putus di tengah batch: batalkan sisa item, tutup region yang sudah dibuka
+            for future in pending:
+                if not future.cancel():
+                    close = getattr(future.result(), 'close', None)
+                    if close is not None:
+                        close()
+
+    def _batch_results(self, command, func, items, names):
+        # Hasil per item (dict) ditambah index dan nama item, diakhiri satu ringkasan (done=True)
+        if not items:
+            yield dict(status='ERROR', data='Parameter tidak cocok, karena kurang', done=True)
+            return
+        ok = 0
+        for index, (name, hasil) in enumerate(zip(names, self._batch(func, items))):
+            if isinstance(hasil, Exception):
+                hasil = dict(status='ERROR', data=str(hasil))
+            hasil = dict(hasil or dict(status='ERROR', data='Filename is required'), index=index, name=name)
+            ok += hasil['status'] == 'OK'
+            yield hasil
+        yield dict(status='OK', data=f'{command} selesai', count=len(items), ok=ok, failed=len(items) - ok, done=True)
+
+    def mget(self, params=[]):
+        # MGET file1 file2 ..., hasil per file sama dengan GET (di-stream satu per satu)
+        return self._batch_results('MGET', lambda name: self.get([name]), params, params)
+
+    def mdelete(self, params=[]):
+        # MDELETE file1 file2 ...
+        return self._batch_results('MDELETE', lambda name: self.delete([name]), params, params)
+
+    def mupload(self, params=[]):
+        # MUPLOAD file1 base64_1 file2 base64_2 ...
+        if len(params) % 2:
+            return iter([dict(status='ERROR', data='Parameter tidak cocok, harus berpasangan nama dan isi', done=True)])
+        pairs = [list(pair) for pair in zip(params[0::2], params[1::2])]
+        return self._batch_results('MUPLOAD', self.upload, pairs, params[0::2])
+
+    def _prefetch_region(self, filename):
+        # Buka region untuk MGET biner dan minta kernel membaca isinya lebih dulu,
+        # supaya disk read item berikutnya overlap dengan pengiriman item sekarang
+        region = self._open_region(filename)
+        if hasattr(os, 'posix_fadvise') and region.length:
+            os.posix_fadvise(region.fileno(), region.body_offset, region.length, os.POSIX_FADV_WILLNEED)
+        return region
+
     def delete(self, params=[]):
         try:
             if len(params) < 1:
                 return dict(status='ERROR', data='Parameter tidak cocok, karena kurang')
             filename = params[0]
             
-            if os.path.exists(filename):
-                os.remove(filename)
-                return dict(status='OK', data='File deleted successfully')
-            
-            else:
-                return dict(status='ERROR', data='File not found')
+            # Exclusive: upload yang dipublish bersamaan tidak ikut terhapus (atau blob-nya di-release)
+            with self.locks.exclusive(filename):
+                if os.path.exists(filename):
+                    st = os.stat(filename)
+                    os.remove(filename)
+                    if self.store is not None:
+                        # Hapus blob kalau ini referensi terakhirnya
+                        self.store.release(st)
+                    self._on_change(filename)
+                    return dict(status='OK', data='File deleted successfully')
+
+                elif self.packed is not None and self.packed.delete(filename):
+                    self._on_change(filename)
+                    return dict(status='OK', data='File deleted successfully')
+
+                else:
+                    return dict(status='ERROR', data='File not found')
         
         except Exception as e:
             return dict(status='ERROR', data=str(e))
@@ -0,0 +1,293 @@
+import json
+import time
+import socket
+import logging
+import multiprocessing
+from collections import defaultdict
+
+from file_histogram import LatencyHistogram
+
+"""
+* satu process klien Python tidak cukup untuk membebani server multi
+core (GIL, satu event loop). LoadCoordinator membagi satu stress test
+ke M load generator: process lokal (--generators M) dan/atau generator
+di host lain (--remote-generators host:port) yang dijalankan dengan
+`file_stress_test_client.py --generator`
+
+* coordinator dan generator bicara lewat control socket TCP, satu
+pesan JSON per baris: configure (opsi klien dan alamat server), prepare
+(buat test file, upload dulu untuk download), start, lalu generator
+membalas result. Generator disiapkan satu per satu (test file lokal
+yang sama tidak dibuat bersamaan), baru setelah semua ready start
+dikirim dengan delay ke satu waktu mulai yang sama (barrier), dihitung
+dari jam coordinator jadi jam antar host tidak perlu sinkron
+
+* generator tidak mengirim sampel mentah, hanya ringkasan yang bisa
+dijumlahkan: LatencyHistogram, counter sukses/gagal, bytes, jumlah dan
+total durasi/throughput, dan timeline per detik sejak barrier. Hasil
+gabungannya punya key yang sama dengan stats run_stress_test, jadi CSV
+dan JSON StressTestClient dipakai apa adanya
+"""
+
+CONTROL_PORT = 7070
+START_DELAY = 0.5       # detik antara pesan start dan waktu mulai bersama
+CONNECT_TIMEOUT = 10
+
+
+def send_message(stream, message):
+    stream.write(json.dumps(message).encode() + b'\n')
+    stream.flush()
+
+
+def receive_message(stream):
+    line = stream.readline()
+    if not line:
+        raise ConnectionError('Control connection closed')
+    return json.loads(line)
+
+
+def summarize_results(client, all_results, test_start, elapsed):
+    # Ringkasan hasil satu generator yang bisa digabung dengan merge_summaries
+    ok = [r for r in all_results if r['status'] == 'OK']
+    histogram = LatencyHistogram()
+    for r in all_results:
+        for _, latency, _ in r.get('samples', []):
+            histogram.record(latency)
+    throughputs = [r['throughput'] for r in all_results if r.get('throughput', 0) > 0]
+    return {
+        'success_count': len(ok),
+        'fail_count': len(all_results) - len(ok),
+        'duration_total': sum(r['duration'] for r in ok),
+        'latency_total': sum(r.get('latency', r['duration']) for r in ok),
+        'throughput_total': sum(throughputs),
+        'throughput_count': len(throughputs),
+        'raw_bytes': sum(r.get('file_size', 0) for r in ok),
+        'wire_bytes': sum(r.get('wire_bytes', 0) for r in ok),
+        'elapsed': elapsed,
+        'histogram': histogram.to_dict(),
+        'timeline': client.timeline(all_results, test_start),
+    }
+
+
+def merge_summaries(summaries):
+    # Jumlahkan ringkasan semua generator, return dict counter + LatencyHistogram gabungan
+    merged = defaultdict(float)
+    histogram = LatencyHistogram()
+    seconds = defaultdict(lambda: {'completed': 0, 'bytes': 0, 'errors': 0})
+    for summary in summaries:
+        for key in ('success_count', 'fail_count', 'duration_total', 'latency_total', 'throughput_total',
+                    'throughput_count', 'raw_bytes', 'wire_bytes'):
+            merged[key] += summary[key]
+        # Semua generator mulai di barrier yang sama, jadi test selesai saat generator terakhir selesai
+        merged['elapsed'] = max(merged['elapsed'], summary['elapsed'])
+        histogram.merge(LatencyHistogram.from_dict(summary['histogram']))
+        for point in summary['timeline']:
+            for key in ('completed', 'bytes', 'errors'):
+                seconds[point['second']][key] += point[key]
+    timeline = [dict(second=second, **seconds[second]) for second in range(max(seconds) + 1)] if seconds else []
+    return merged, histogram, timeline
+
+
+def split_clients(client_pool_size, generators):
+    # Bagi worker serata mungkin, generator yang kebagian 0 worker tidak ikut test ini
+    base, extra = divmod(client_pool_size, generators)
+    return [base + (1 if i < extra else 0) for i in range(generators)]
+
+
+def handle_coordinator(stream):
+    # Satu sesi coordinator: configure sekali, lalu prepare/start berulang sampai shutdown/putus
+    from file_stress_test_client import StressTestClient
+
+    client = None
+    test = None
+    try:
+        while True:
+            try:
+                message = receive_message(stream)
+            except ConnectionError:
+                return
+            kind = message.get('type')
+            try:
+                if kind == 'configure':
+                    client = StressTestClient(tuple(message['server_address']), **message['options'])
+                    send_message(stream, {'type': 'ready'})
+                elif kind == 'prepare':
+                    test = message
+                    client.rate = message['rate']
+                    client.reset_counters()
+                    test_file = client.prepare_test(message['operation'], message['file_size_mb'])
+                    if test_file is False:
+                        send_message(stream, {'type': 'error', 'error': 'Failed to upload the test file'})
+                        continue
+                    test['test_file'] = test_file
+                    send_message(stream, {'type': 'ready'})
+                elif kind == 'start':
+                    time.sleep(max(message.get('delay', 0), 0))
+                    all_results, test_start, elapsed = client.collect_results(
+                        test['operation'], test['test_file'], test['clients'], test['executor_type'])
+                    send_message(stream, {'type': 'result',
+                                          'summary': summarize_results(client, all_results, test_start, elapsed)})
+                    client.results = {'upload': [], 'download': [], 'list': []}
+                elif kind == 'shutdown':
+                    return
+                else:
+                    send_message(stream, {'type': 'error', 'error': f'Unknown message type: {kind}'})
+            except Exception as e:
+                logging.warning(f"generator failed on {kind}: {str(e)}")
+                send_message(stream, {'type': 'error', 'error': str(e)})
+    finally:
+        # Pool keep-alive klien dipakai selama sesi, ditutup sekali di akhir
+        if client is not None:
+            client.close()
+
+
+def serve_generator(listener, once=False):
+    # Layani coordinator satu per satu; once=True untuk generator lokal (selesai setelah satu sesi)
+    while True:
+        connection, address = listener.accept()
+        connection.settimeout(None)     # test panjang: coordinator bisa diam lama menunggu hasil
+        logging.warning(f"coordinator connected from {address}")
+        with connection, connection.makefile('rwb') as stream:
+            handle_coordinator(stream)
+        if once:
+            return
+
+
+def run_generator(host='0.0.0.0', port=CONTROL_PORT):
+    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    listener.bind((host, port))
+    listener.listen(1)
+    logging.warning(f"load generator waiting for a coordinator on {host}:{port}")
+    try:
+        serve_generator(listener)
+    finally:
+        listener.close()
+
+
+def _local_generator(pipe):
+    # Target process generator lokal: port kontrol dipilih OS dan dikirim balik lewat pipe
+    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listener.bind(('127.0.0.1', 0))
+    listener.listen(1)
+    listener.settimeout(CONNECT_TIMEOUT)   # jangan menunggu selamanya kalau coordinator mati duluan
+    pipe.send(listener.getsockname()[1])
+    pipe.close()
+    with listener:
+        serve_generator(listener, once=True)
+
+
+class LoadCoordinator:
+    def __init__(self, client, local=0, remote=()):
+        # client: StressTestClient coordinator, sumber alamat server dan opsi yang diteruskan ke generator
+        self.client = client
+        self.processes = []
+        self.generators = []    # (alamat, socket, stream)
+        addresses = []
+        for _ in range(local):
+            parent, child = multiprocessing.Pipe(duplex=False)
+            # Bukan daemon: generator dengan --executor process perlu membuat child process sendiri
+            process = multiprocessing.Process(target=_local_generator, args=(child,))
+            process.start()
+            child.close()
+            addresses.append(('127.0.0.1', parent.recv()))
+            parent.close()
+            self.processes.append(process)
+        addresses.extend(remote)
+        try:
+            for address in addresses:
+                sock = socket.create_connection(address, timeout=CONNECT_TIMEOUT)
+                sock.settimeout(None)
+                stream = sock.makefile('rwb')
+                self.generators.append((address, sock, stream))
+                send_message(stream, {'type': 'configure', 'server_address': list(client.server_address),
+                                      'options': self.generator_options()})
+                self.expect(address, stream, 'ready')
+        except Exception:
+            self.close()
+            raise
+        logging.info(f"Coordinating {len(self.generators)} load generators ({local} local, {len(remote)} remote)")
+
+    def generator_options(self):
+        client = self.client
+        return dict(binary=client.binary, parallel=client.parallel, compress=client.compress,
+                    test_data=client.test_data, keepalive=client.client is not None, pipeline=client.pipeline,
+                    requests_per_worker=client.requests_per_worker, duration=client.duration)
+
+    @staticmethod
+    def expect(address, stream, kind):
+        message = receive_message(stream)
+        if message.get('type') != kind:
+            raise RuntimeError(f"Generator {address[0]}:{address[1]}: {message.get('error', message)}")
+        return message
+
+    def run_stress_test(self, operation, file_size_mb, client_pool_size, executor_type='thread'):
+        # Return stats dengan format yang sama dengan StressTestClient.run_stress_test, None kalau gagal
+        shares = split_clients(client_pool_size, len(self.generators))
+        active = [(generator, clients) for generator, clients in zip(self.generators, shares) if clients]
+        rate = self.client.rate
+        try:
+            for (address, _, stream), clients in active:
+                # Open loop: rate dibagi sebanding dengan jumlah worker tiap generator
+                send_message(stream, {'type': 'prepare', 'operation': operation, 'file_size_mb': file_size_mb,
+                                      'clients': clients, 'executor_type': executor_type,
+                                      'rate': rate * clients / client_pool_size if rate else None})
+                self.expect(address, stream, 'ready')
+
+            start_at = time.time() + START_DELAY
+            for (_, _, stream), _ in active:
+                send_message(stream, {'type': 'start', 'delay': start_at - time.time()})
+            summaries = [self.expect(address, stream, 'result')['summary'] for (address, _, stream), _ in active]
+        except (OSError, RuntimeError, ValueError) as e:
+            logging.error(f"Coordinated test failed: {str(e)}")
+            return None
+        return self.build_stats(operation, file_size_mb, client_pool_size, executor_type, summaries)
+
+    def build_stats(self, operation, file_size_mb, client_pool_size, executor_type, summaries):
+        merged, histogram, timeline = merge_summaries(summaries)
+        client = self.client
+        success_count = int(merged['success_count'])
+        elapsed = merged['elapsed']
+        return {
+            'operation': operation,
+            'file_size_mb': file_size_mb,
+            'client_pool_size': client_pool_size,
+            'executor_type': executor_type,
+            'avg_duration': merged['duration_total'] / success_count if success_count else 0,
+            'avg_throughput': merged['throughput_total'] / merged['throughput_count'] if merged['throughput_count'] else 0,
+            'success_count': success_count,
+            'fail_count': int(merged['fail_count']),
+            'protocol': 'binary' if client.binary or client.parallel > 1 else 'text',
+            'parallel': client.parallel,
+            'compress': client.compress,
+            'raw_bytes': int(merged['raw_bytes']),
+            'wire_bytes': int(merged['wire_bytes']),
+            'connection_mode': 'per client' if executor_type == 'asyncio' else client.connection_mode(),
+            'avg_latency': merged['latency_total'] / success_count if success_count else 0,
+            'load_mode': client.load_mode(),
+            'target_rate': client.rate or 0,
+            'achieved_rate': histogram.count / elapsed if elapsed > 0 else 0,
+            'requests': histogram.count,
+            'p50_latency': histogram.percentile(0.50),
+            'p90_latency': histogram.percentile(0.90),
+            'p99_latency': histogram.percentile(0.99),
+            'max_latency': histogram.max(),
+            'generators': len(summaries),
+            'latency_histogram': histogram.to_dict(),
+            'timeline': timeline
+        }
+
+    def close(self):
+        for _, sock, stream in self.generators:
+            try:
+                send_message(stream, {'type': 'shutdown'})
+                stream.close()
+            except OSError:
+                pass
+            sock.close()
+        self.generators = []
+        for process in self.processes:
+            process.join(timeout=CONNECT_TIMEOUT)
+            if process.is_alive():
+                process.terminate()
+        self.processes = []
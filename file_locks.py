@@ -0,0 +1,107 @@
+import os
+import zlib
+import threading
+import contextlib
+
+try:
+    import fcntl
+except ImportError:     # Windows: lock hanya berlaku di dalam satu process
+    fcntl = None
+
+"""
+* StripedLocks memberi reader/writer lock per nama file tanpa membuat
+satu lock per file: nama di-hash (crc32, stabil antar process) ke salah
+satu dari N stripe, nama yang berbeda kadang berbagi stripe tapi itu
+hanya membuat mereka saling menunggu sebentar
+
+* reader (GET) memegang shared lock hanya selama membuka file; setelah
+file descriptor didapat, isinya adalah snapshot karena upload selalu
+dipublish dengan os.replace/link (inode lama tidak pernah ditulis ulang).
+Writer memegang exclusive lock hanya saat publish (replace + update
+cache/index) dan delete, menulis body upload ke file sementara tidak
+memegang lock apa pun, jadi upload ke nama yang sama tetap paralel
+
+* kalau directory diberikan, setiap stripe juga di-flock pada file di
+.locks/ supaya worker server processpool (process terpisah) ikut saling
+mengunci. flock per open file description, jadi setiap acquire membuka
+fd sendiri dan thread dalam process yang sama tidak saling berbagi lock
+"""
+
+DEFAULT_STRIPES = 64
+LOCKS_DIR = '.locks'
+
+
+class RWLock:
+    """
+    Reader/writer lock untuk thread. Writer diprioritaskan: reader baru
+    menunggu kalau ada writer yang sedang antri, supaya upload tidak
+    kelaparan di bawah GET yang terus-menerus
+    """
+    def __init__(self):
+        self.cond = threading.Condition(threading.Lock())
+        self.readers = 0
+        self.writer = False
+        self.waiting_writers = 0
+
+    def acquire_read(self):
+        with self.cond:
+            while self.writer or self.waiting_writers:
+                self.cond.wait()
+            self.readers += 1
+
+    def release_read(self):
+        with self.cond:
+            self.readers -= 1
+            if self.readers == 0:
+                self.cond.notify_all()
+
+    def acquire_write(self):
+        with self.cond:
+            self.waiting_writers += 1
+            try:
+                while self.writer or self.readers:
+                    self.cond.wait()
+            finally:
+                self.waiting_writers -= 1
+            self.writer = True
+
+    def release_write(self):
+        with self.cond:
+            self.writer = False
+            self.cond.notify_all()
+
+
+class StripedLocks:
+    def __init__(self, stripes=DEFAULT_STRIPES, directory=None):
+        self.locks = [RWLock() for _ in range(stripes)]
+        self.lock_dir = None
+        if directory is not None and fcntl is not None:
+            self.lock_dir = os.path.join(directory, LOCKS_DIR)
+            os.makedirs(self.lock_dir, exist_ok=True)
+
+    def stripe(self, name):
+        return zlib.crc32(os.path.normpath(name).encode()) % len(self.locks)
+
+    @contextlib.contextmanager
+    def locked(self, name, exclusive):
+        index = self.stripe(name)
+        lock = self.locks[index]
+        acquire, release = (lock.acquire_write, lock.release_write) if exclusive else \
+            (lock.acquire_read, lock.release_read)
+        acquire()
+        fd = None
+        try:
+            if self.lock_dir is not None:
+                fd = os.open(os.path.join(self.lock_dir, f'stripe-{index:03d}'), os.O_RDWR | os.O_CREAT, 0o644)
+                fcntl.flock(fd, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            yield
+        finally:
+            if fd is not None:
+                os.close(fd)    # menutup fd sekaligus melepas flock
+            release()
+
+    def shared(self, name):
+        return self.locked(name, exclusive=False)
+
+    def exclusive(self, name):
+        return self.locked(name, exclusive=True)
@@ -0,0 +1,140 @@
+import time
+import array
+import threading
+
+"""
+* Metrics menyimpan counter, gauge, dan histogram latency per perintah
+dalam satu array int64 dengan layout tetap, sehingga update cukup
+beberapa operasi integer dan array yang sama bisa dipakai bersama antar
+process (multiprocessing RawArray, satu slot per worker)
+
+* histogram memakai bucket logaritmik: bucket i berisi latency
+[2^i, 2^(i+1)) mikrodetik, jadi 32 bucket mencakup 1us sampai ~1 jam
+dan percentile bisa diestimasi dari batas atas bucket
+
+* latency yang dicatat adalah service time di server (parse sampai hasil
+siap dikirim). Untuk upload yang di-stream, waktunya dari open_upload
+sampai finish_upload (termasuk menerima body)
+"""
+
+N_BUCKETS = 32
+
+COUNTERS = (
+    'connections',          # total koneksi yang pernah dilayani
+    'active_connections',   # koneksi yang sedang dilayani
+    'queued',               # pekerjaan yang menunggu (koneksi / request di antrian lane / task executor)
+    'busy',                 # slot worker yang sedang dipakai request
+    'workers',              # jumlah worker
+    'bytes_in',
+    'bytes_out',
+    'rejected',             # request yang ditolak admission control (server busy)
+)
+
+# Gauge di-reset saat worker process (re)start, counter tetap akumulatif
+GAUGES = ('active_connections', 'queued', 'busy', 'workers')
+
+COMMANDS = (
+    'list', 'get', 'upload', 'upload_at', 'upload_status', 'upload_commit', 'upload_abort',
+    'delete', 'mget', 'mdelete', 'mupload', 'cachestats', 'stats', 'other',
+)
+
+# Per perintah: count, errors, total_us, max_us, lalu histogram
+COMMAND_FIELDS = ('count', 'errors', 'total_us', 'max_us')
+COMMAND_SIZE = len(COMMAND_FIELDS) + N_BUCKETS
+SLOT_SIZE = len(COUNTERS) + len(COMMANDS) * COMMAND_SIZE
+
+COUNTER_INDEX = {name: i for i, name in enumerate(COUNTERS)}
+COMMAND_INDEX = {name: len(COUNTERS) + i * COMMAND_SIZE for i, name in enumerate(COMMANDS)}
+
+
+def bucket_index(us):
+    return min(max(int(us).bit_length() - 1, 0), N_BUCKETS - 1)
+
+
+def bucket_upper_ms(index):
+    return (1 << (index + 1)) / 1000
+
+
+def percentile_ms(histogram, count, fraction):
+    # Estimasi percentile: batas atas bucket tempat percentile tersebut jatuh
+    if count == 0:
+        return 0
+    rank = fraction * count
+    seen = 0
+    for i, n in enumerate(histogram):
+        seen += n
+        if seen >= rank:
+            return bucket_upper_ms(i)
+    return bucket_upper_ms(N_BUCKETS - 1)
+
+
+def new_values(n_slots=1):
+    # Array lokal untuk server satu process (threadpool/asyncio)
+    return array.array('q', bytes(8 * SLOT_SIZE * n_slots))
+
+
+class Metrics:
+    def __init__(self, values=None, slot=0, n_slots=1):
+        # values: array int64 sepanjang n_slots * SLOT_SIZE (array lokal atau RawArray bersama),
+        # process ini hanya menulis ke slot miliknya sendiri
+        self.values = values if values is not None else new_values(n_slots)
+        self.n_slots = n_slots
+        self.base = slot * SLOT_SIZE
+        self.lock = threading.Lock()
+        self.started = time.time()
+
+    def add(self, name, delta=1):
+        i = self.base + COUNTER_INDEX[name]
+        with self.lock:
+            self.values[i] += delta
+
+    def reset_gauges(self):
+        with self.lock:
+            for name in GAUGES:
+                self.values[self.base + COUNTER_INDEX[name]] = 0
+
+    def observe(self, command, seconds, ok=True):
+        us = int(seconds * 1000000)
+        i = self.base + COMMAND_INDEX.get(command, COMMAND_INDEX['other'])
+        with self.lock:
+            values = self.values
+            values[i] += 1
+            if not ok:
+                values[i + 1] += 1
+            values[i + 2] += us
+            if us > values[i + 3]:
+                values[i + 3] = us
+            values[i + len(COMMAND_FIELDS) + bucket_index(us)] += 1
+
+    def snapshot(self):
+        # Gabungkan semua slot: counter/histogram dijumlah, max diambil maksimumnya
+        totals = [0] * SLOT_SIZE
+        max_index = {COMMAND_INDEX[command] + 3 for command in COMMANDS}
+        for slot in range(self.n_slots):
+            base = slot * SLOT_SIZE
+            for i in range(SLOT_SIZE):
+                value = self.values[base + i]
+                totals[i] = max(totals[i], value) if i in max_index else totals[i] + value
+
+        stats = {name: totals[COUNTER_INDEX[name]] for name in COUNTERS}
+        stats['uptime'] = round(time.time() - self.started, 3)
+        stats['commands'] = {}
+        for command in COMMANDS:
+            i = COMMAND_INDEX[command]
+            count, errors, total_us, max_us = totals[i:i + len(COMMAND_FIELDS)]
+            if count == 0:
+                continue
+            histogram = totals[i + len(COMMAND_FIELDS):i + COMMAND_SIZE]
+            max_ms = max_us / 1000
+            stats['commands'][command] = dict(
+                count=count, errors=errors,
+                avg_ms=round(total_us / count / 1000, 3),
+                # batas atas bucket bisa melebihi latency terbesar yang pernah tercatat
+                p50_ms=min(percentile_ms(histogram, count, 0.50), max_ms),
+                p90_ms=min(percentile_ms(histogram, count, 0.90), max_ms),
+                p99_ms=min(percentile_ms(histogram, count, 0.99), max_ms),
+                max_ms=max_ms,
+                # [batas atas bucket (ms), jumlah], hanya bucket yang terisi
+                histogram=[[bucket_upper_ms(b), n] for b, n in enumerate(histogram) if n],
+            )
+        return stats
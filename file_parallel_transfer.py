@@ -0,0 +1,138 @@
+import os
+import json
+import uuid
+import socket
+import logging
+import threading
+import concurrent.futures
+
+import file_binary_protocol as fbp
+
+"""
+* ParallelTransfer memindahkan satu file besar lewat beberapa koneksi TCP
+sekaligus. File dibagi menjadi range (chunk_size), lalu K worker thread,
+masing-masing dengan satu koneksi persistent, mengambil range dari antrian
+
+* download memakai range GET biner ("GET <offset> <length>") dan menulis
+setiap range langsung ke posisinya di file output yang sudah dialokasikan
+
+* upload memakai "UPLOAD_AT <offset> <upload_id>" (body dikirim dengan
+sendfile dari file sumber) lalu "UPLOAD_COMMIT" setelah semua range
+terkirim. upload_id unik per transfer supaya beberapa klien yang upload ke
+nama yang sama tidak saling menimpa file parsial
+"""
+
+DEFAULT_CHUNK_SIZE = 8 * 1024 * 1024
+
+
+class ParallelTransfer:
+    def __init__(self, server_address=('localhost', 6666), connections=4, chunk_size=DEFAULT_CHUNK_SIZE, timeout=600):
+        self.server_address = server_address
+        self.connections = connections
+        self.chunk_size = chunk_size
+        self.timeout = timeout
+
+    def connect(self):
+        sock = socket.create_connection(self.server_address, timeout=self.timeout)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        return sock
+
+    def split_ranges(self, size):
+        if size == 0:
+            return [(0, 0)]
+        return [(offset, min(self.chunk_size, size - offset)) for offset in range(0, size, self.chunk_size)]
+
+    def run_workers(self, ranges, work):
+        # Setiap worker punya koneksi sendiri dan mengambil range dari antrian bersama
+        lock = threading.Lock()
+        pending = list(reversed(ranges))
+
+        def worker():
+            sock = self.connect()
+            try:
+                while True:
+                    with lock:
+                        if not pending:
+                            return
+                        offset, length = pending.pop()
+                    work(sock, offset, length)
+            finally:
+                sock.close()
+
+        n_workers = max(1, min(self.connections, len(ranges)))
+        with concurrent.futures.ThreadPoolExecutor(max_workers=n_workers) as executor:
+            futures = [executor.submit(worker) for _ in range(n_workers)]
+            for future in concurrent.futures.as_completed(futures):
+                future.result()
+
+    def command(self, sock, command, filename='', payload=b''):
+        fbp.send_frame(sock, command, filename, payload)
+        _, _, status, _, data = fbp.recv_frame(sock)
+        result = json.loads(data)
+        if status != fbp.STATUS_OK:
+            raise RuntimeError(f"{command} {filename} failed: {result.get('data')}")
+        return result
+
+    def control(self, command, filename=''):
+        # Perintah tunggal di koneksi terpisah
+        sock = self.connect()
+        try:
+            return self.command(sock, command, filename)
+        finally:
+            sock.close()
+
+    def remote_size(self, filename):
+        # Range kosong hanya untuk tahu ukuran total file dari header respons
+        sock = self.connect()
+        try:
+            fbp.send_frame(sock, 'GET 0 0', filename)
+            command, _, status, _, payload_len = fbp.recv_frame_header(sock)
+            payload = fbp.recv_exact(sock, payload_len) if payload_len else b''
+            if status != fbp.STATUS_OK:
+                raise RuntimeError(f"GET {filename} failed: {json.loads(payload).get('data')}")
+            return int(command.split()[2])
+        finally:
+            sock.close()
+
+    def download(self, filename, output_path):
+        size = self.remote_size(filename)
+        # Alokasikan file output sekali, setiap range ditulis di posisinya sendiri
+        with open(output_path, 'wb') as f:
+            f.truncate(size)
+
+        def fetch(sock, offset, length):
+            fbp.send_frame(sock, f'GET {offset} {length}', filename)
+            _, _, status, _, payload_len = fbp.recv_frame_header(sock)
+            if status != fbp.STATUS_OK:
+                error = json.loads(fbp.recv_exact(sock, payload_len)).get('data')
+                raise RuntimeError(f"GET {filename} {offset} {length} failed: {error}")
+            with open(output_path, 'r+b') as f:
+                f.seek(offset)
+                fbp.recv_into_file(sock, f, payload_len)
+
+        self.run_workers(self.split_ranges(size), fetch)
+        logging.debug(f"Parallel download of {filename} ({size} bytes) over {self.connections} connections done")
+        return size
+
+    def upload(self, file_path, filename):
+        size = os.path.getsize(file_path)
+        upload_id = uuid.uuid4().hex
+
+        def send(sock, offset, length):
+            sock.sendall(fbp.pack_header(f'UPLOAD_AT {offset} {upload_id}', filename, length))
+            with open(file_path, 'rb') as f:
+                if length:
+                    sock.sendfile(f, offset, length)
+            _, _, status, _, data = fbp.recv_frame(sock)
+            if status != fbp.STATUS_OK:
+                raise RuntimeError(f"UPLOAD_AT {filename} {offset} failed: {json.loads(data).get('data')}")
+
+        try:
+            self.run_workers(self.split_ranges(size), send)
+        except Exception:
+            # Jangan tinggalkan file parsial yang tidak akan pernah di-commit
+            self.control(f'UPLOAD_ABORT {upload_id}', filename)
+            raise
+        self.control(f'UPLOAD_COMMIT {size} {upload_id}', filename)
+        logging.debug(f"Parallel upload of {filename} ({size} bytes) over {self.connections} connections done")
+        return size
@@ -1,81 +1,175 @@
 from socket import *
 import logging
 import socket
+import signal
+import sys
+import time
 from file_protocol import FileProtocol # Import protokol file untuk parsing perintah
-import multiprocessing
+from file_connection import manage_connection, ConnectionQueue, IDLE_TIMEOUT # Fungsi untuk manage setiap koneksi klien (teks maupun frame biner)
+from file_server_options import add_file_arguments, file_options, add_server_arguments, server_options, log_level
+from file_access_log import setup_logging
+from file_admission import admission_controller
+from file_metrics import Metrics, SLOT_SIZE
 import concurrent.futures
+import multiprocessing
+import multiprocessing.connection
+import multiprocessing.sharedctypes
 
-fp = FileProtocol()
+# Worker yang mati lebih cepat dari ini dianggap crash loop, restart diberi jeda
+MIN_WORKER_UPTIME = 1.0
+# Supervisor berhenti (exit code 1) setelah sekian crash cepat berturut-turut
+MAX_FAST_CRASHES = 5
 
-# Fungsi untuk manage setiap koneksi klien
-def manage_client(connection, address):
-    logging.warning(f"manage connection from {address}")
-    buffer = ""
-    try:
-        connection.settimeout(1800) # Timeout koneksi selama 30 menit
 
+def create_listener(ipinfo, reuse_port=False, listen=True):
+    my_socket=socket.socket(socket.AF_INET, socket.SOCK_STREAM) # Buat socket TCP
+    my_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    if reuse_port:
+        # Setiap worker punya listener sendiri di port yang sama, kernel yang membagi koneksi
+        my_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    my_socket.bind(ipinfo)
+    if listen:
+        my_socket.listen(128)
+    return my_socket
+
+
+# Loop utama setiap worker process: accept lalu layani koneksi
+def worker_main(worker_id, ipinfo, listener=None, file_options=None, shared_metrics=None, pool_size=1,
+                server_options=None):
+    # FileProtocol dibuat di dalam masing-masing worker process, bukan saat
+    # module di-import. Setiap worker punya cache GET sendiri
+    metrics = None
+    if shared_metrics is not None:
+        # Worker menulis ke slot-nya sendiri, STATS dari worker mana pun menjumlahkan semua slot
+        metrics = Metrics(shared_metrics, slot=worker_id, n_slots=pool_size)
+        metrics.reset_gauges() # gauge worker lama yang mati tidak sempat dikembalikan
+        metrics.add('workers')
+    fp = FileProtocol(metrics=metrics, **(file_options or {}))
+    server_options = server_options or {}
+    # Setiap worker melayani banyak koneksi dengan thread, tapi secara default hanya
+    # memproses satu request per lane sekaligus; koneksi idle tidak lagi menahan worker
+    admission = admission_controller(server_options, default_slots=1, metrics=fp.metrics)
+    idle_timeout = server_options.get('idle_timeout', IDLE_TIMEOUT)
+    if listener is None:
+        listener = create_listener(ipinfo, reuse_port=True)
+    logging.warning(f"worker {worker_id} (pid {multiprocessing.current_process().pid}) accepting connections")
+
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=server_options.get('max_connections', 256))
+    waiting = ConnectionQueue()
+    try:
         while True:
-            data=connection.recv(1024*1024)
-            if not data:
-                break
-            buffer=buffer + data.decode()
-            while "\r\n\r\n" in buffer:
-                command, buffer=buffer.split("\r\n\r\n", 1)
-                hasil=fp.proses_string(command)
-                response=hasil + "\r\n\r\n"
-                connection.sendall(response.encode()) # Kirim respons ke klien
-    
-    except Exception as e:
-        logging.warning(f"error: {str(e)}")
+            connection, client_address=listener.accept()
+            logging.debug("connection from %s on worker %d", client_address, worker_id)
+            waiting.add()
+            executor.submit(manage_connection, connection, client_address, fp, admission, idle_timeout, waiting)
+    except KeyboardInterrupt:
+        pass
     finally:
-        logging.warning(f"connection from {address} has closed")
-        connection.close()
+        listener.close()
+        executor.shutdown(wait=False)
 
 
 class Server:
-    def __init__(self, ipaddress='0.0.0.0', port=8889, pool_size=5):
+    def __init__(self, ipaddress='0.0.0.0', port=8889, pool_size=5, file_options=None, server_options=None):
         self.ipinfo=(ipaddress, port)
         self.pool_size=pool_size
-        self.my_socket=socket.socket(socket.AF_INET, socket.SOCK_STREAM) # Buat socket TCP
-        self.my_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.file_options=dict(file_options or {})
+        if self.file_options.get('codec_workers'):
+            # Worker daemon tidak boleh punya child process, dan base64 di sini sudah paralel per worker
+            logging.warning("--codec-workers is ignored by the processpool server, each worker is its own process")
+            self.file_options['codec_workers']=0
+        self.server_options=server_options or {}
+        # Tanpa SO_REUSEPORT (mis. Windows), satu listener dibuat supervisor dan diwariskan ke worker
+        self.reuse_port=hasattr(socket, 'SO_REUSEPORT')
+        self.my_socket=None
+        self.reserved_socket=None
+        self.workers={}
+        self.fast_crashes=0
+        # Metrics bersama: satu slot int64 per worker, tanpa lock antar process
+        self.shared_metrics=multiprocessing.sharedctypes.RawArray('q', pool_size*SLOT_SIZE)
 
-        self.my_socket.settimeout(1800)
+    def start_worker(self, worker_id):
+        worker=multiprocessing.Process(target=worker_main, args=(worker_id, self.ipinfo, self.my_socket, self.file_options,
+                                                                 self.shared_metrics, self.pool_size,
+                                                                 self.server_options), daemon=True)
+        worker.start()
+        self.workers[worker_id]=(worker, time.monotonic())
 
-    # Fungsi utama server untuk menerima dan memproses koneksi masuk
+    # Supervisor: jalankan N worker pre-fork dan restart worker yang mati
     def run(self):
+        if self.reuse_port:
+            # Port di-bind dulu oleh supervisor (tanpa listen, jadi tidak ikut menerima koneksi)
+            # dan dipegang selama server jalan: port yang sudah dipakai langsung gagal di sini,
+            # bukan membuat semua worker crash di create_listener
+            self.reserved_socket=create_listener(self.ipinfo, reuse_port=True, listen=False)
+        else:
+            self.my_socket=create_listener(self.ipinfo)
         logging.warning(f"server running on ip address {self.ipinfo}, process pool size is {self.pool_size}")
-        self.my_socket.bind(self.ipinfo)
-        self.my_socket.listen(1)
-        
-        # ProcessPoolExecutor
-        with concurrent.futures.ProcessPoolExecutor(max_workers=self.pool_size) as executor:
-            try:
-                while True:
-                    connection, client_address=self.my_socket.accept()
-                    logging.warning(f"connection from {client_address}")
-                    
-                    executor.submit(manage_client, connection, client_address)
-            except KeyboardInterrupt:
-                logging.warning("now server shutting down")
-            except Exception as e:
-                logging.warning(f"error in server: {str(e)}")
-            finally:
-                if self.my_socket:
-                    self.my_socket.close()
+        # SIGTERM juga menjalankan shutdown di bawah supaya worker tidak jadi orphan
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+
+        for worker_id in range(self.pool_size):
+            self.start_worker(worker_id)
+
+        # Worker yang crash cepat di-restart dengan jeda; selama menunggu, worker lain tetap
+        # diawasi supaya crash mereka juga langsung terhitung
+        restart_at={}   # worker_id -> waktu restart
+        try:
+            while True:
+                sentinels=[worker.sentinel for worker_id, (worker, _) in self.workers.items() if worker_id not in restart_at]
+                timeout=min([1, *(at - time.monotonic() for at in restart_at.values())])
+                multiprocessing.connection.wait(sentinels, timeout=max(timeout, 0))
+
+                now=time.monotonic()
+                for worker_id, (worker, started) in self.workers.items():
+                    if worker_id in restart_at or worker.is_alive():
+                        continue
+                    logging.warning(f"worker {worker_id} (pid {worker.pid}) died with exit code {worker.exitcode}")
+                    if now - started < MIN_WORKER_UPTIME:
+                        self.fast_crashes+=1
+                        restart_at[worker_id]=now + MIN_WORKER_UPTIME
+                    else:
+                        self.fast_crashes=0
+                        restart_at[worker_id]=now
+                if self.fast_crashes >= MAX_FAST_CRASHES:
+                    # Mis. port/direktori tidak bisa dipakai: restart terus tidak akan membantu
+                    logging.warning(f"workers keep crashing at startup ({self.fast_crashes} times in a row), giving up")
+                    sys.exit(1)
+                for worker_id, at in list(restart_at.items()):
+                    if at <= now:
+                        del restart_at[worker_id]
+                        logging.warning(f"restarting worker {worker_id}")
+                        self.start_worker(worker_id)
+        except KeyboardInterrupt:
+            logging.warning("now server shutting down")
+        except Exception as e:
+            logging.warning(f"error in server: {str(e)}")
+        finally:
+            for worker, _ in self.workers.values():
+                worker.terminate()
+            for worker, _ in self.workers.values():
+                worker.join()
+            if self.my_socket:
+                self.my_socket.close()
+            if self.reserved_socket:
+                self.reserved_socket.close()
 
 
 def main():
     import argparse
     parser=argparse.ArgumentParser(description='File Server')
     parser.add_argument('--port', type=int, default=6666, help='Server port (default: 6666)')
-    parser.add_argument('--pool-size', type=int, default=1, help='Thread pool size (default: 1)')
+    parser.add_argument('--pool-size', type=int, default=1, help='Number of pre-forked worker processes (default: 1)')
+    add_file_arguments(parser)
+    add_server_arguments(parser)
     args=parser.parse_args()
-    
-    svr=Server(ipaddress='0.0.0.0', port=args.port, pool_size=args.pool_size)
+    setup_logging(log_level(args))
+
+    svr=Server(ipaddress='0.0.0.0', port=args.port, pool_size=args.pool_size, file_options=file_options(args),
+               server_options=server_options(args))
     svr.run()
 
 
 if __name__ == "__main__":
     multiprocessing.freeze_support()
-    logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(levelname)s - %(message)s')
     main()
@@ -1,8 +1,13 @@
 import json
+import time
 import logging
 import shlex
 
 from file_interface import FileInterface
+from file_compression import DecompressingWriter, maybe_compress
+from file_metrics import Metrics
+from file_access_log import AccessLog, TraceLog
+import file_binary_protocol as fbp
 
 """
 * class FileProtocol bertugas untuk memproses 
@@ -15,46 +20,297 @@ pada akhirnya akan diproses dalam bentuk string
 * class FileProtocol akan memproses data yang masuk dalam bentuk
 string
 """
+
+# Perintah upload yang body-nya di-stream, dan jumlah argumen sebelum body
+# (UPLOAD filename <body>, UPLOAD_AT filename offset <body>). Frame biner
+# boleh menambah upload_id setelah offset: "UPLOAD_AT <offset> <upload_id>"
+STREAMED_UPLOADS = {'upload': 1, 'upload_at': 2}
+
+# Perintah batch: hasilnya di-stream per item lalu diakhiri satu ringkasan
+# (teks: satu JSON per item, ringkasan punya "done": true; biner: lihat
+# FLAG_BATCH_END). MGET/MDELETE biner membawa daftar nama di payload,
+# satu nama per baris
+BATCH_COMMANDS = {'mget', 'mdelete', 'mupload'}
+
+# Perintah biasa yang boleh dipanggil klien, masing-masing dijalankan oleh
+# method FileInterface dengan nama yang sama. Atribut dan method lain
+# FileInterface (index, cache, io_pool, ...) tidak bisa diakses sebagai perintah
+COMMANDS = {'list', 'get', 'upload', 'upload_at', 'upload_status', 'upload_commit', 'upload_abort', 'delete',
+            'cachestats'}
+
+
+def split_binary_command(command):
+    parts = command.split()
+    if not parts:
+        return '', []
+    return parts[0].lower(), parts[1:]
+
+
+def b64_size(data):
+    # Ukuran isi data base64 tanpa men-decode-nya
+    return len(data) // 4 * 3 - data[-2:].count('=')
+
+
+def is_batch_command(command):
+    # Cukup lihat kata pertama, perintah MUPLOAD bisa sangat panjang
+    return command[:16].partition(' ')[0].strip().lower() in BATCH_COMMANDS
+
+
 class FileProtocol:
-    def __init__(self):
-        self.file = FileInterface()
+    def __init__(self, metrics=None, access_log=None, access_log_sample=1.0, trace=None, **file_options):
+        self.file = FileInterface(**file_options)
+        # Metrics server (STATS), server processpool memberi slot di array bersama
+        self.metrics = metrics if metrics is not None else Metrics()
+        # Access log per request (opsional), ditulis thread background
+        self.access_log = AccessLog(access_log, access_log_sample)
+        # Trace workload (opsional) untuk diputar ulang, lihat file_trace_replay
+        self.trace = TraceLog(trace)
+
+    def observe(self, c_request, seconds, ok=True, name='', bytes_in=0, bytes_out=0):
+        self.metrics.observe(c_request, seconds, ok)
+        self.access_log.record(c_request, name, bytes_in, bytes_out, ok, seconds)
+        self.trace.record(c_request, name, bytes_in, bytes_out, ok, seconds)
+
+    def stats(self):
+        return dict(status='OK', data=self.metrics.snapshot())
         
-    def proses_string(self, string_datamasuk=''):
-        logging.warning(f"processing string of length: {len(string_datamasuk)}")
-        try:
-            if " " not in string_datamasuk:
-                c_request = string_datamasuk.strip().lower()
+    def parse_request(self, string_datamasuk):
+        # Pisahkan nama perintah dan parameternya, return (c_request, params)
+        if " " not in string_datamasuk:
+            c_request = string_datamasuk.strip().lower()
+            params = []
+        else:
+            parts = string_datamasuk.split(" ", 1)
+            c_request = parts[0].strip().lower()
+            
+            if len(parts) < 2:
                 params = []
             else:
-                parts = string_datamasuk.split(" ", 1)
-                c_request = parts[0].strip().lower()
+                if c_request == "upload": # ada case khusus untuk upload untuk manage large base64 content
+                    filename_and_content = parts[1].split(" ", 1)
+                    params = filename_and_content
+
+                elif c_request == "upload_at": # sama seperti upload, dengan offset sebelum content
+                    params = parts[1].split(" ", 2)
+
+                elif c_request == "mupload": # pasangan nama dan base64, shlex terlalu lambat untuk content besar
+                    params = parts[1].split()
                 
-                if len(parts) < 2:
-                    params = []
                 else:
-                    if c_request == "upload": # ada case khusus untuk upload untuk manage large base64 content
-                        filename_and_content = parts[1].split(" ", 1)
-                        params = filename_and_content
-                    
-                    else:
-                        try:
-                            params = shlex.split(parts[1])
-                        except Exception as e:
-                            logging.warning(f"error parsing parameters with shlex: {str(e)}")
-                            params = parts[1].split()
-            
-            logging.warning(f"request processing: {c_request} --> {len(params)} parameters")
+                    try:
+                        params = shlex.split(parts[1])
+                    except Exception as e:
+                        logging.warning(f"error parsing parameters with shlex: {str(e)}")
+                        params = parts[1].split()
+        
+        logging.debug("request processing: %s --> %d parameters", c_request, len(params))
+        return c_request, params
+
+    def proses_string(self, string_datamasuk=''):
+        # Log per request hanya di level debug (argumen %-style, tidak di-format kalau level-nya mati)
+        logging.debug("processing string of length: %d", len(string_datamasuk))
+        start = time.perf_counter()
+        c_request = 'other'
+        params = []
+        response = ''
+        cl = None
+        ok = False
+        try:
+            if is_batch_command(string_datamasuk):
+                # Tanpa streaming: semua bagian respons batch digabung jadi satu string
+                c_request = None # dicatat sendiri oleh proses_batch
+                return "\r\n\r\n".join(self.proses_batch(string_datamasuk))
 
+            c_request, params = self.parse_request(string_datamasuk)
 
-            if hasattr(self.file, c_request):
+            if c_request == 'stats':
+                cl = self.stats()
+            elif c_request in COMMANDS:
                 cl = getattr(self.file, c_request)(params)
-                return json.dumps(cl)
             else:
-                return json.dumps(dict(status='ERROR', data='Unknown command'))
+                cl = dict(status='ERROR', data='Unknown command')
+            ok = bool(cl) and cl.get('status') == 'OK'
+            response = json.dumps(cl)
+            return response
         
         except Exception as e:
             logging.warning(f"Request processing error: {str(e)}")
-            return json.dumps(dict(status='ERROR', data=f'Request processing error: {str(e)}'))
+            response = json.dumps(dict(status='ERROR', data=f'Request processing error: {str(e)}'))
+            return response
+
+        finally:
+            if c_request is not None:
+                bytes_in, bytes_out = len(string_datamasuk), len(response)
+                # GET/UPLOAD dicatat dengan ukuran isi file (seperti frame biner), bukan base64/JSON-nya
+                if ok and c_request == 'get':
+                    bytes_out = b64_size(cl['data_file'])
+                elif ok and c_request in STREAMED_UPLOADS and len(params) > STREAMED_UPLOADS[c_request]:
+                    bytes_in = b64_size(params[-1])
+                self.observe(c_request, time.perf_counter() - start, ok, params[0] if params else '',
+                             bytes_in, bytes_out)
+
+    def proses_binary(self, command, filename='', payload=b'', flags=0):
+        """
+        Proses satu frame biner. GET memakai bytes mentah (UPLOAD di-stream
+        lewat open_upload/finish_upload), perintah lain memakai method FileInterface yang sama dengan
+        hasil JSON sebagai payload. Field command boleh membawa argumen
+        tambahan setelah nama perintah, mis. "GET <offset> <length>".
+        Return (status, payload); untuk GET payload berupa FileRegion
+        yang sudah terbuka dan akan di-stream oleh pemanggil. Kalau
+        request GET membawa FLAG_ZLIB, region dikompres bila layak
+        """
+        logging.debug("processing binary frame: %s %s (%d bytes)", command, filename, len(payload))
+        start = time.perf_counter()
+        c_request, args = split_binary_command(command)
+        status = fbp.STATUS_ERROR
+        bytes_out = 0
+        try:
+            if c_request == 'get':
+                offset = int(args[0]) if len(args) > 0 else 0
+                length = int(args[1]) if len(args) > 1 else None
+                region = self.file._open_region(filename, offset, length)
+                # Ukuran isi file (sebelum kompresi), sama dengan GET teks, supaya trace bisa di-replay
+                size = region.length
+                if flags & fbp.FLAG_ZLIB:
+                    region = maybe_compress(region, filename, self.file.compressed)
+                    logging.debug("GET %s: %d bytes on the wire (flags %d)", filename, region.length, region.flags)
+                status = fbp.STATUS_OK
+                bytes_out = size
+                return status, region
+
+            if c_request == 'stats':
+                cl = self.stats()
+            elif c_request in COMMANDS:
+                params = ([filename] if filename else []) + args
+                cl = getattr(self.file, c_request)(params)
+            else:
+                cl = dict(status='ERROR', data='Unknown command')
+            status = fbp.STATUS_OK if cl and cl.get('status') == 'OK' else fbp.STATUS_ERROR
+            response = json.dumps(cl).encode()
+            bytes_out = len(response)
+            return status, response
+
+        except Exception as e:
+            logging.warning(f"Binary request processing error: {str(e)}")
+            return fbp.STATUS_ERROR, json.dumps(dict(status='ERROR', data=str(e))).encode()
+
+        finally:
+            self.observe(c_request, time.perf_counter() - start, status == fbp.STATUS_OK, filename, len(payload),
+                         bytes_out)
+
+    def proses_batch(self, string_datamasuk=''):
+        """
+        Proses perintah batch teks. Yield string JSON per item, lalu satu
+        ringkasan dengan "done": true. Connection loop mengirim setiap
+        bagian diakhiri "\r\n\r\n" begitu tersedia.
+        """
+        logging.debug("processing batch of length: %d", len(string_datamasuk))
+        start = time.perf_counter()
+        c_request = 'other'
+        bytes_out = 0
+        ok = False
+        try:
+            try:
+                c_request, params = self.parse_request(string_datamasuk)
+                results = getattr(self.file, c_request)(params)
+            except Exception as e:
+                logging.warning(f"Batch request processing error: {str(e)}")
+                yield json.dumps(dict(status='ERROR', data=f'Request processing error: {str(e)}', done=True))
+                return
+            for hasil in results:
+                ok = hasil.get('done', False) and hasil['status'] == 'OK'
+                response = json.dumps(hasil)
+                bytes_out += len(response)
+                yield response
+        finally:
+            # Termasuk waktu mengirim item sebelumnya, karena item diproses sesuai laju pengiriman
+            self.observe(c_request, time.perf_counter() - start, ok, bytes_in=len(string_datamasuk),
+                         bytes_out=bytes_out)
+
+    def proses_batch_binary(self, command, filename='', payload=b''):
+        """
+        Versi biner proses_batch, daftar nama file di payload (satu per
+        baris). Yield (command, filename, status, payload, flags) per frame:
+        MGET mengirim isi file mentah sebagai FileRegion (atau JSON error),
+        MDELETE mengirim JSON per item. Frame terakhir adalah ringkasan
+        JSON dengan FLAG_BATCH_END.
+        """
+        logging.debug("processing binary batch: %s (%d bytes)", command, len(payload))
+        start = time.perf_counter()
+        c_request, _ = split_binary_command(command)
+        bytes_out = 0
+        try:
+            for frame in self.binary_batch_frames(command, c_request, payload):
+                body = frame[3]
+                bytes_out += len(body) if isinstance(body, bytes) else body.length
+                yield frame
+        finally:
+            self.observe(c_request, time.perf_counter() - start, bytes_in=len(payload), bytes_out=bytes_out)
+
+    def binary_batch_frames(self, command, c_request, payload):
+        names = [name for name in payload.decode().splitlines() if name]
+        if c_request == 'mget':
+            results = self.file._batch(self.file._prefetch_region, names)
+        elif c_request == 'mdelete':
+            results = self.file._batch(lambda name: self.file.delete([name]), names)
+        else:
+            summary = dict(status='ERROR', data=f'{command} is not supported on binary frames', done=True)
+            yield command, '', fbp.STATUS_ERROR, json.dumps(summary).encode(), fbp.FLAG_BATCH_END
+            return
+
+        ok = 0
+        try:
+            for name, hasil in zip(names, results):
+                if isinstance(hasil, Exception):
+                    hasil = dict(status='ERROR', data=str(hasil))
+                if isinstance(hasil, dict):
+                    status = fbp.STATUS_OK if hasil.get('status') == 'OK' else fbp.STATUS_ERROR
+                    hasil = json.dumps(hasil).encode()
+                else:
+                    status = fbp.STATUS_OK
+                ok += status == fbp.STATUS_OK
+                yield command, name, status, hasil, 0
+        finally:
+            results.close()
+        summary = dict(status='OK', data=f'{c_request.upper()} selesai', count=len(names), ok=ok,
+                       failed=len(names) - ok, done=True)
+        yield command, '', fbp.STATUS_OK, json.dumps(summary).encode(), fbp.FLAG_BATCH_END
+
+    # Upload yang di-stream oleh connection loop: body ditulis per chunk
+    # ke writer, lalu finish_upload menghasilkan respons yang sama dengan upload
+    # biasa. compressed=True kalau body berupa stream zlib (FLAG_ZLIB); writer.size
+    # (bytes_in di access log dan trace) tetap ukuran isi file setelah didekompres
+    def open_upload(self, filename, offset=None, upload_id=None, compressed=False):
+        logging.debug("streaming upload: %s (offset %s, compressed %s)", filename, offset, compressed)
+        started = time.perf_counter()
+        writer = self.file._open_upload(filename, offset, upload_id)
+        writer = DecompressingWriter(writer) if compressed else writer
+        # Untuk metrics dan access log: service time upload dihitung sampai finish_upload
+        writer.command = 'upload' if offset is None else 'upload_at'
+        writer.started = started
+        writer.name = filename
+        return writer
+
+    def finish_upload(self, writer, error=None):
+        if writer is not None and error is None:
+            try:
+                hasil = writer.commit()
+                self.observe(writer.command, time.perf_counter() - writer.started, name=writer.name,
+                             bytes_in=writer.size)
+                return hasil
+            except Exception as e:
+                error = e
+        if writer is not None:
+            writer.abort()
+            self.observe(writer.command, time.perf_counter() - writer.started, ok=False, name=writer.name,
+                         bytes_in=writer.size)
+        else:
+            self.observe('upload', 0, ok=False)
+        logging.warning(f"streaming upload failed: {str(error)}")
+        hasil = dict(status='ERROR', data=str(error))
+        if getattr(error, 'retry_after', None) is not None:
+            hasil['retry_after'] = error.retry_after # ditolak admission control, boleh dicoba lagi
+        return hasil
 
 
 if __name__=='__main__':
@@ -0,0 +1,435 @@
+import io
+import os
+import json
+import mmap
+import time
+import logging
+import threading
+import contextlib
+from collections import namedtuple, defaultdict
+
+try:
+    import fcntl
+except ImportError:     # Windows: hanya aman untuk satu process server
+    fcntl = None
+
+"""
+* SegmentStore (storage 'packed') menyimpan upload kecil (<= MAX_BYTES)
+dengan cara di-append ke beberapa file segment besar di .segments/,
+bukan satu file per nama. GET tidak perlu open/close per file dan
+direktori penyimpanan tidak berisi jutaan entry. File besar tetap
+disimpan sebagai file biasa (lihat PackedWriter)
+
+* index nama -> (segment, offset, length, mtime) ada di memory dan
+di-journal ke .segments/index.log (satu JSON per baris, put/del).
+Process lain (worker server processpool) mengikuti perubahan dengan
+membaca lanjutan journal setiap kali lookup; kalau journal ditulis
+ulang (inode berubah), index dibaca ulang dari awal. Semua perubahan
+(append data + journal) dilakukan di bawah flock .segments/.lock
+
+* nomor segment tidak pernah dipakai ulang: journal yang ditulis ulang
+diawali record seg berisi nomor segment terbesar yang pernah dipakai,
+jadi segment yang sudah dihapus compaction tidak akan dibuat lagi
+dengan nomor yang sama (process lain mungkin masih memegang fd/mmap
+segment lama dengan nomor itu)
+
+* GET teks membaca isi lewat mmap segment, GET biner men-stream region
+segment dengan sendfile dari fd hasil dup (tanpa membuka path lagi)
+
+* data di segment tidak pernah ditimpa. Upload ulang dan delete hanya
+menambah record journal, jadi segment lama berisi data mati. Thread
+compaction memindahkan entry yang masih hidup dari segment yang
+sebagian besar (>= COMPACT_RATIO) sudah mati ke segment aktif lalu
+menghapus segment tersebut, dan menulis ulang journal kalau sudah jauh
+lebih panjang dari jumlah entry hidup
+"""
+
+SEGMENTS_DIR = '.segments'
+JOURNAL_NAME = 'index.log'
+LOCK_NAME = '.lock'
+MAX_BYTES = 1024 * 1024             # upload sampai ukuran ini disimpan di segment
+SEGMENT_SIZE = 64 * 1024 * 1024     # segment baru dimulai kalau append melewati ukuran ini
+COMPACT_INTERVAL = 30               # detik antar pengecekan compaction, 0 = nonaktif
+COMPACT_RATIO = 0.5                 # bagian segment yang sudah mati sebelum di-compact
+JOURNAL_SLACK = 1024                # record journal tambahan yang ditoleransi sebelum ditulis ulang
+
+Entry = namedtuple('Entry', 'segment offset length mtime')
+
+
+class Segment:
+    # File segment yang dibuka sekali per process, di-mmap saat dibaca
+    def __init__(self, path, create=False):
+        flags = os.O_RDWR | (os.O_CREAT if create else 0) | getattr(os, 'O_BINARY', 0)
+        # FileIO menutup fd saat Segment tidak dipakai lagi (termasuk oleh region yang masih terbuka)
+        self.file = io.FileIO(os.open(path, flags, 0o644), 'r+')
+        self.mm = None
+        self.lock = threading.Lock()
+
+    def fileno(self):
+        return self.file.fileno()
+
+    def view(self, end):
+        # mmap yang mencakup minimal `end` bytes; segment aktif di-map ulang kalau sudah bertambah
+        mm = self.mm
+        if mm is None or len(mm) < end:
+            with self.lock:
+                if self.mm is None or len(self.mm) < end:
+                    # mmap lama tidak ditutup, mungkin masih dibaca thread lain (dilepas oleh GC)
+                    self.mm = mmap.mmap(self.fileno(), 0, access=mmap.ACCESS_READ)
+                mm = self.mm
+        return mm
+
+    def append(self, data, offset):
+        view = memoryview(data)
+        while view:
+            written = os.pwrite(self.fileno(), view, offset)
+            view = view[written:]
+            offset += written
+
+
+class SegmentRegion:
+    """
+    Pengganti FileRegion untuk nama yang disimpan di segment: offset,
+    length dan total_size mengacu ke isi file, body_offset ke posisinya di
+    segment. fp (dup fd segment) baru dibuat kalau region di-stream
+    """
+    flags = 0
+
+    def __init__(self, segment, entry, offset=0, length=None):
+        self.total_size = entry.length
+        if offset < 0 or offset > self.total_size:
+            raise ValueError('Offset is outside the file')
+        self.segment = segment
+        self.offset = offset
+        self.body_offset = entry.offset + offset
+        available = self.total_size - offset
+        self.length = available if length is None else max(0, min(length, available))
+        self.version = ('packed', entry.segment, entry.offset, entry.length)
+        self._fp = None
+
+    @property
+    def fp(self):
+        if self._fp is None:
+            self._fp = os.fdopen(os.dup(self.segment.fileno()), 'rb')
+        return self._fp
+
+    def fileno(self):
+        return self.fp.fileno()
+
+    def read(self):
+        if not self.length:
+            return b''
+        end = self.body_offset + self.length
+        return self.segment.view(end)[self.body_offset:end]
+
+    def close(self):
+        if self._fp is not None:
+            self._fp.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class SegmentStore:
+    def __init__(self, directory='.', segment_size=SEGMENT_SIZE, compact_interval=COMPACT_INTERVAL):
+        self.root = os.path.join(directory, SEGMENTS_DIR)
+        os.makedirs(self.root, exist_ok=True)
+        self.segment_size = segment_size
+        self.journal_path = os.path.join(self.root, JOURNAL_NAME)
+        self.lock_path = os.path.join(self.root, LOCK_NAME)
+        self.lock = threading.RLock()
+        self.segments = {}      # nomor segment -> Segment yang sudah dibuka
+        self.journal_fd = None
+        self.generation = 0     # bertambah setiap ada perubahan dari process lain (lihat DirectoryIndex)
+        self.reload()
+        if compact_interval:
+            threading.Thread(target=self.compact_loop, args=(compact_interval,), name='segment-compaction',
+                             daemon=True).start()
+
+    def segment_path(self, number):
+        return os.path.join(self.root, f'seg-{number:06d}.dat')
+
+    # ---- journal
+
+    def reload(self):
+        # Baca ulang seluruh journal (saat start, atau setelah ditulis ulang oleh process lain)
+        with self.lock:
+            if self.journal_fd is not None:
+                os.close(self.journal_fd)
+            self.journal_fd = os.open(self.journal_path, os.O_RDWR | os.O_APPEND | os.O_CREAT, 0o644)
+            self.journal_ino = os.fstat(self.journal_fd).st_ino
+            self.journal_pos = 0
+            self.journal_records = 0
+            self.entries = {}
+            self.live = defaultdict(int)    # nomor segment -> bytes yang masih dipakai
+            self.max_segment = 0
+            # Segment yang sudah dibuka mungkin sudah dihapus compaction, region yang masih
+            # terbuka tetap memegang Segment-nya sendiri
+            self.segments = {}
+            self.read_journal(os.fstat(self.journal_fd).st_size)
+            self.generation += 1
+
+    def read_journal(self, size):
+        # Terapkan record journal dari journal_pos sampai size (hanya baris yang sudah lengkap)
+        data = os.pread(self.journal_fd, size - self.journal_pos, self.journal_pos)
+        end = data.rfind(b'\n') + 1
+        for line in data[:end].splitlines():
+            if line:
+                self.apply(json.loads(line))
+        self.journal_pos += end
+        if end:
+            self.generation += 1
+        return end > 0
+
+    def refresh(self):
+        # Ikuti perubahan dari process lain, return True kalau ada yang dibaca
+        try:
+            st = os.stat(self.journal_path)
+        except FileNotFoundError:
+            return False
+        with self.lock:
+            if st.st_ino != self.journal_ino:
+                self.reload()
+                return True
+            if st.st_size > self.journal_pos:
+                return self.read_journal(st.st_size)
+        return False
+
+    def apply(self, record):
+        self.journal_records += 1
+        if record['op'] == 'seg':
+            self.max_segment = max(self.max_segment, record['seg'])
+            return
+        old = self.entries.pop(record['name'], None)
+        if old is not None:
+            self.live[old.segment] -= old.length
+        if record['op'] == 'put':
+            entry = Entry(record['seg'], record['off'], record['len'], record['mtime'])
+            self.entries[record['name']] = entry
+            self.live[entry.segment] += entry.length
+            self.max_segment = max(self.max_segment, entry.segment)
+
+    def append_journal(self, record):
+        line = (json.dumps(record, separators=(',', ':')) + '\n').encode()
+        os.write(self.journal_fd, line)
+        self.journal_pos += len(line)
+        self.apply(record)
+
+    @contextlib.contextmanager
+    def exclusive(self):
+        # Lock perubahan store, antar thread dan (lewat flock) antar worker process
+        with self.lock:
+            fd = None
+            try:
+                if fcntl is not None:
+                    fd = os.open(self.lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+                    fcntl.flock(fd, fcntl.LOCK_EX)
+                self.refresh()
+                yield
+            finally:
+                if fd is not None:
+                    os.close(fd)
+
+    # ---- data
+
+    def segment(self, number, create=False):
+        with self.lock:
+            segment = self.segments.get(number)
+            if segment is None:
+                segment = self.segments[number] = Segment(self.segment_path(number), create)
+            return segment
+
+    def append(self, name, data, mtime=None):
+        # Dipanggil di bawah exclusive(): tulis data di akhir segment aktif lalu catat di journal
+        number = self.max_segment or 1
+        segment = self.segment(number, create=True)
+        offset = os.fstat(segment.fileno()).st_size
+        if offset and offset + len(data) > self.segment_size:
+            number += 1
+            segment = self.segment(number, create=True)
+            offset = os.fstat(segment.fileno()).st_size
+        segment.append(data, offset)
+        self.append_journal(dict(op='put', name=name, seg=number, off=offset, len=len(data),
+                                 mtime=time.time() if mtime is None else mtime))
+
+    def put(self, name, data):
+        with self.exclusive():
+            self.append(name, data)
+
+    def delete(self, name):
+        # Return True kalau nama tersebut memang ada di store
+        with self.exclusive():
+            if name not in self.entries:
+                return False
+            self.append_journal(dict(op='del', name=name))
+            return True
+
+    def lookup(self, name):
+        self.refresh()
+        return self.entries.get(name)
+
+    def open_region(self, name, offset=0, length=None):
+        # Return SegmentRegion, atau None kalau nama tidak ada di store
+        for attempt in range(2):
+            entry = self.lookup(name)
+            if entry is None:
+                return None
+            try:
+                return SegmentRegion(self.segment(entry.segment), entry, offset, length)
+            except FileNotFoundError:
+                # Segment baru saja di-compact oleh process lain, index dibaca ulang
+                if attempt:
+                    raise
+                self.reload()
+
+    def stat(self, name):
+        # (size, mtime) seperti DirectoryIndex, None kalau tidak ada
+        entry = self.lookup(name)
+        return None if entry is None else (entry.length, entry.mtime)
+
+    def listing(self):
+        self.refresh()
+        with self.lock:
+            return {name: (entry.length, entry.mtime) for name, entry in self.entries.items()}
+
+    # ---- compaction
+
+    def compact_loop(self, interval):
+        while True:
+            time.sleep(interval)
+            try:
+                self.compact()
+            except Exception as e:
+                logging.warning(f"segment compaction failed: {str(e)}")
+
+    def segment_size_on_disk(self, number):
+        try:
+            return os.stat(self.segment_path(number)).st_size
+        except FileNotFoundError:
+            return 0
+
+    def compact(self, ratio=COMPACT_RATIO):
+        # Return jumlah segment yang dihapus
+        self.refresh()
+        with self.lock:
+            numbers = [number for number in self.live if number != self.max_segment]
+        removed = 0
+        for number in numbers:
+            size = self.segment_size_on_disk(number)
+            with self.lock:
+                live = self.live.get(number, 0)
+            if not size or (size - live) / size < ratio:
+                continue
+            with self.lock:
+                names = [name for name, entry in self.entries.items() if entry.segment == number]
+            # Per entry supaya upload lain tidak menunggu seluruh segment selesai disalin
+            for name in names:
+                with self.exclusive():
+                    entry = self.entries.get(name)
+                    if entry is None or entry.segment != number:
+                        continue
+                    end = entry.offset + entry.length
+                    data = self.segment(number).view(end)[entry.offset:end] if entry.length else b''
+                    self.append(name, data, entry.mtime)
+            with self.exclusive():
+                if self.live.get(number, 0) == 0 and number != self.max_segment:
+                    # Region yang sudah terbuka tetap bisa membaca lewat fd/mmap-nya sendiri
+                    with contextlib.suppress(FileNotFoundError):
+                        os.remove(self.segment_path(number))
+                    self.segments.pop(number, None)
+                    self.live.pop(number, None)
+                    removed += 1
+        if removed:
+            logging.warning(f"segment compaction removed {removed} segments")
+        if self.journal_records > 2 * len(self.entries) + JOURNAL_SLACK:
+            self.rewrite_journal()
+        return removed
+
+    def rewrite_journal(self):
+        # Journal baru berisi satu record put per entry hidup, dipasang dengan os.replace
+        with self.exclusive():
+            temp_path = self.journal_path + '.tmp'
+            with open(temp_path, 'wb') as f:
+                # Segment aktif bisa saja tidak punya entry hidup lagi, nomornya tetap harus diingat
+                f.write((json.dumps(dict(op='seg', seg=self.max_segment), separators=(',', ':')) + '\n').encode())
+                for name, entry in self.entries.items():
+                    f.write((json.dumps(dict(op='put', name=name, seg=entry.segment, off=entry.offset,
+                                             len=entry.length, mtime=entry.mtime),
+                                        separators=(',', ':')) + '\n').encode())
+            os.replace(temp_path, self.journal_path)
+            self.reload()
+
+
+class PackedWriter:
+    """
+    Writer upload untuk storage packed: body ditampung di memory selama
+    masih <= max_bytes lalu di-append ke segment saat commit. Kalau
+    ternyata lebih besar, isinya dipindah ke writer file biasa dari
+    make_spill (UploadWriter) dan nama tersebut disimpan sebagai file
+    """
+    def __init__(self, filename, store, make_spill, on_commit=None, locks=None, max_bytes=MAX_BYTES):
+        if filename == '':
+            raise ValueError('Filename is required')
+        self.filename = filename
+        self.store = store
+        self.make_spill = make_spill
+        self.on_commit = on_commit
+        self.locks = locks
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.buffer = bytearray()
+        self.spill = None
+
+    def write(self, data):
+        self.size += len(data)
+        if self.spill is None and len(self.buffer) + len(data) <= self.max_bytes:
+            self.buffer += data
+            return
+        if self.spill is None:
+            self.spill = self.make_spill()
+            self.spill.write(self.buffer)
+            self.buffer = bytearray()
+        self.spill.write(data)
+
+    def commit(self):
+        if self.spill is not None:
+            return self.spill.commit()
+        lock = self.locks.exclusive(self.filename) if self.locks is not None else contextlib.nullcontext()
+        with lock:
+            self.store.put(self.filename, self.buffer)
+            # Versi file biasa yang lama (upload besar sebelumnya) tidak boleh menutupi isi baru
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(self.filename)
+            if self.on_commit is not None:
+                self.on_commit(self.filename)
+        return dict(status='OK', data='File uploaded successfully')
+
+    def abort(self):
+        if self.spill is not None:
+            self.spill.abort()
+        self.buffer = bytearray()
+
+
+if __name__ == '__main__':
+    # Cek cepat: dua store di direktori yang sama (seperti dua worker processpool),
+    # segment di-compact dan journal ditulis ulang, lalu append baru harus terbaca benar dari store lain
+    import tempfile
+    directory = tempfile.mkdtemp()
+    a = SegmentStore(directory, segment_size=16, compact_interval=0)
+    b = SegmentStore(directory, segment_size=16, compact_interval=0)
+    a.put('x', b'XXXXX')
+    a.put('y', b'Y' * 12)                       # tidak muat di segment 1, masuk segment 2
+    with b.open_region('x') as region:          # b membuka (dan menyimpan) segment 1
+        assert region.read() == b'XXXXX'
+    a.delete('x')
+    a.delete('y')
+    assert a.compact() == 1                     # segment 1 dihapus
+    a.rewrite_journal()
+    a.put('z', b'ZZZZZ')
+    assert a.lookup('z').segment != 1, 'segment number reused'
+    with b.open_region('z') as region:
+        assert region.read() == b'ZZZZZ', region.read()
+    print('OK')
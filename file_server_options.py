@@ -0,0 +1,88 @@
+import os
+import logging
+
+"""
+* opsi CLI yang dipakai bersama oleh semua engine server (threadpool,
+processpool, asyncio), supaya ketiganya menerima flag yang sama
+
+* file_options() menerjemahkan argumen CLI menjadi keyword argument
+untuk FileProtocol / FileInterface (file_server_args() kebalikannya,
+untuk server yang dijalankan file_benchmark), server_options() untuk koneksi dan
+admission control (lihat file_admission), log_level() untuk
+setup_logging (lihat file_access_log)
+"""
+
+MB = 1024 * 1024
+
+
+def add_file_arguments(parser):
+    parser.add_argument('--cache-size', type=int, default=128,
+                        help='GET response cache budget in MB, 0 disables the cache (default: 128)')
+    parser.add_argument('--storage', choices=['plain', 'dedup', 'packed'], default='plain',
+                        help='plain = one file per name, dedup = content-addressed blobs shared by '
+                             'identical uploads, packed = small uploads appended to large segment files '
+                             '(default: plain)')
+    parser.add_argument('--codec-workers', type=int, default=0,
+                        help='Worker processes for base64 encode/decode of large payloads, 0 = encode/decode '
+                             'in the serving thread (default: 0)')
+    parser.add_argument('--access-log', default=None, metavar='PATH',
+                        help='Append one JSON record per request (command, name, bytes, status, service time) '
+                             'to this file, written by a background thread (default: disabled)')
+    parser.add_argument('--access-log-sample', type=float, default=1.0,
+                        help='Fraction of successful requests written to the access log; errors are always '
+                             'written (default: 1.0)')
+    parser.add_argument('--trace', default=None, metavar='PATH',
+                        help='Record every request (arrival time, command, name, sizes, no payloads) as JSON '
+                             'lines, for replay with file_stress_test_client.py --replay (default: disabled)')
+
+
+def file_options(args):
+    return dict(cache_size=args.cache_size * MB, storage=args.storage, codec_workers=args.codec_workers,
+                access_log=args.access_log, access_log_sample=args.access_log_sample, trace=args.trace)
+
+
+def file_server_args(args):
+    # Argumen add_file_arguments sebagai command line server. Path di-absolutkan karena
+    # server dijalankan dari direktori lain (lihat file_benchmark.running_server)
+    server_args = ['--cache-size', str(args.cache_size), '--storage', args.storage,
+                   '--codec-workers', str(args.codec_workers), '--access-log-sample', str(args.access_log_sample)]
+    if args.access_log:
+        server_args += ['--access-log', os.path.abspath(args.access_log)]
+    if args.trace:
+        server_args += ['--trace', os.path.abspath(args.trace)]
+    return server_args
+
+
+def add_server_arguments(parser):
+    parser.add_argument('--max-connections', type=int, default=256,
+                        help='Threads serving connections (one per open connection) for the threadpool server, '
+                             'per worker process for the processpool server. While connections wait for a '
+                             'thread, idle keep-alive connections are closed after 1s. The asyncio server does '
+                             'not cap connections and only uses this as its default lane slots (default: 256)')
+    parser.add_argument('--idle-timeout', type=int, default=300,
+                        help='Seconds an idle connection is kept open (default: 300)')
+    parser.add_argument('--small-slots', type=int, default=None,
+                        help='Concurrent small requests (LIST, STATS, DELETE, GET/UPLOAD up to 1 MB) '
+                             '(default: depends on the engine, see --pool-size)')
+    parser.add_argument('--large-slots', type=int, default=None,
+                        help='Concurrent large transfers (default: depends on the engine, see --pool-size)')
+    parser.add_argument('--max-inflight-mb', type=int, default=1024,
+                        help='Cap on bytes of large transfers in flight, in MB (default: 1024)')
+    parser.add_argument('--queue-timeout', type=float, default=30,
+                        help='Seconds a request may wait for a slot before it is rejected as busy (default: 30)')
+    parser.add_argument('--max-queue', type=int, default=64,
+                        help='Requests waiting per lane before new ones are rejected immediately (default: 64)')
+    parser.add_argument('--log-level', choices=['debug', 'info', 'warning', 'error'], default='warning',
+                        help='Diagnostic log level; per-request and per-connection messages are debug '
+                             '(default: warning)')
+
+
+def server_options(args):
+    return dict(max_connections=args.max_connections, idle_timeout=args.idle_timeout,
+                small_slots=args.small_slots, large_slots=args.large_slots,
+                max_inflight_bytes=args.max_inflight_mb * MB, queue_timeout=args.queue_timeout,
+                max_queue=args.max_queue)
+
+
+def log_level(args):
+    return getattr(logging, args.log_level.upper())
@@ -12,20 +12,64 @@ import csv
 import threading
 import argparse
 import statistics
+import math
+import zlib
+import contextlib
 from collections import defaultdict
 
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler("checking.log"),
-        logging.StreamHandler()
-    ]
-)
+import file_binary_protocol as fbp
+import file_compression
+from file_client import FileClient
+from file_framing import DELIMITER, FrameBuffer, command_parts, send_parts
+from file_parallel_transfer import ParallelTransfer
+from file_async_stress_client import AsyncLoadGenerator
+from file_load_coordinator import CONTROL_PORT, LoadCoordinator, run_generator
+from file_access_log import setup_logging
+from file_trace_replay import TraceReplayer, load_trace
+
+# File dan stderr ditulis thread background (file_access_log.AsyncHandler), log per operasi
+# worker hanya di level debug (--debug)
+setup_logging(logging.INFO, [
+    logging.FileHandler("checking.log"),
+    logging.StreamHandler()
+])
+
+def percentile(values, fraction):
+    # Nearest-rank percentile dari sampel yang sudah diurutkan
+    if not values:
+        return 0
+    return values[min(max(math.ceil(fraction * len(values)) - 1, 0), len(values) - 1)]
+
+
+def positive_int(value):
+    # Tipe argparse untuk jumlah yang minimal 1 (--requests, --pipeline)
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f'must be at least 1, got {value}')
+    return number
+
 
 class StressTestClient:
-    def __init__(self, server_address=('localhost', 6666)):
+    def __init__(self, server_address=('localhost', 6666), binary=False, parallel=1, compress=False, test_data='random',
+                 keepalive=False, pipeline=1, requests_per_worker=1, rate=None, duration=10):
         self.server_address = server_address
+        # Kompresi dinegosiasikan lewat header biner, jadi compress=True selalu memakai framing biner
+        self.binary = binary or compress # True = pakai framing biner, False = teks/base64/JSON
+        # >1 = upload/download dipecah per range lewat beberapa koneksi (framing biner)
+        self.parallel = parallel
+        self.compress = compress
+        self.test_data = test_data # 'random' (tidak bisa dikompres) atau 'text' (log/teks)
+        # keepalive = koneksi dipakai ulang lewat connection pool FileClient,
+        # pipeline > 1 = LIST dikirim N kali sekaligus di satu koneksi (butuh keepalive)
+        self.pipeline = pipeline
+        self.requests_per_worker = requests_per_worker # jumlah LIST per worker pada operasi list
+        # rate = open loop: request dijadwalkan rate/detik selama duration detik,
+        # None = closed loop (satu operasi per worker, seperti sebelumnya)
+        self.rate = rate
+        self.duration = duration
+        self.client = FileClient(server_address, pool_size=64) if keepalive or pipeline > 1 else None
+        # LoadCoordinator (opsional): beban dijalankan oleh beberapa load generator, lihat file_load_coordinator
+        self.coordinator = None
         self.results = {
             'upload': [], 'download': [], 'list': []
         }
@@ -44,8 +88,17 @@ class StressTestClient:
         if not os.path.exists('downloads'):
             os.makedirs('downloads')
 
+    def __getstate__(self):
+        # Dipickle untuk setiap task --executor process: hasil yang sudah terkumpul dan coordinator
+        # (socket ke generator) tidak ikut dikirim ke worker
+        state = self.__dict__.copy()
+        state['results'] = {'upload': [], 'download': [], 'list': []}
+        state['coordinator'] = None
+        return state
+
     def generate_testfile(self, size_mb):
-        filename=f"test_file_{size_mb}MB.bin" # format nama testfile
+        extension = 'log' if self.test_data == 'text' else 'bin'
+        filename=f"test_file_{size_mb}MB.{extension}" # format nama testfile
         filepath=os.path.join('testfiles', filename)
         
         if os.path.exists(filepath) and os.path.getsize(filepath) == size_mb * 1024 * 1024:
@@ -58,12 +111,42 @@ class StressTestClient:
             # Untuk menghindari memory issues
             chunk_size=1024 * 1024  
             for _ in range(size_mb):
-                f.write(os.urandom(chunk_size))
+                if self.test_data == 'text':
+                    f.write(self.generate_text_chunk(chunk_size))
+                else:
+                    f.write(os.urandom(chunk_size))
         
         logging.info(f"Test file generated: {filepath}")
         return filepath
 
+    def generate_text_chunk(self, size):
+        # Baris log sintetis, mirip workload teks/log yang mudah dikompres
+        levels = ['INFO', 'INFO', 'INFO', 'WARNING', 'ERROR']
+        paths = ['/files/rfc2616.pdf', '/files/pokijan.jpg', '/files/donalbebek.jpg', '/list', '/upload']
+        lines = []
+        length = 0
+        while length < size:
+            line = (f"2024-05-{random.randint(1, 28):02d} {random.randint(0, 23):02d}:{random.randint(0, 59):02d}:"
+                    f"{random.randint(0, 59):02d} {random.choice(levels)} worker-{random.randint(1, 16)} "
+                    f"{random.choice(paths)} status={random.choice([200, 200, 200, 404, 500])} "
+                    f"bytes={random.randint(0, 10**7)} duration_ms={random.randint(1, 5000)}\n")
+            lines.append(line)
+            length += len(line)
+        return ''.join(lines).encode()[:size]
+
+    def connection_mode(self):
+        if self.client is None:
+            return 'new'
+        return f'pipeline x{self.pipeline}' if self.pipeline > 1 else 'keepalive'
+
+    def load_mode(self):
+        return f'open {self.rate:g}/s' if self.rate else 'closed'
+
     def send_command(self, command_str=""):
+        # command_str boleh str, bytes, atau list potongan yang sudah di-encode (lihat file_framing)
+        if self.client is not None:
+            return self.send_pooled_command(command_str)
+
         sock=socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         # Untuk large files
         sock.settimeout(600)
@@ -72,33 +155,25 @@ class StressTestClient:
             start_connect=time.time()
             sock.connect(self.server_address)
             connect_time = time.time() - start_connect
-            logging.debug(f"Connection established in {connect_time:.2f}s")
-            
-            # Apabila file besar, command dikirim dalam chunk
-            chunks=[command_str[i:i+65536] for i in range(0, len(command_str), 65536)]
-            for chunk in chunks:
-                sock.sendall((chunk).encode())
+            logging.debug("Connection established in %.2fs", connect_time)
             
-            sock.sendall("\r\n\r\n".encode())
+            # Command yang sudah berupa bytes dikirim langsung, tanpa dipotong dan di-encode ulang
+            send_parts(sock, *command_parts(command_str), DELIMITER)
             
-            # Menerima respons dalam bentuk chunk
-            data_received = "" 
+            # Menerima respons langsung ke buffer, delimiter hanya dicari di data yang baru masuk
+            buffer = FrameBuffer()
 
             while True:
                 try:
-                    data=sock.recv(1024*1024) 
-                    if data:
-                        data_received += data.decode()
-                        if "\r\n\r\n" in data_received:
-                            break
-                    else:
+                    idx = buffer.find_delimiter()
+                    if idx >= 0 or not buffer.recv_from(sock):
                         break
                 
                 except socket.timeout:
                     logging.error("Socket timeout when receiving data")
                     return {'status': 'ERROR', 'data': 'Socket timeout when receiving data'}
             
-            json_response=data_received.split("\r\n\r\n")[0]
+            json_response=buffer.text(0, idx if idx >= 0 else None)
             result=json.loads(json_response)
             return result
         
@@ -117,20 +192,120 @@ class StressTestClient:
         finally:
             sock.close()
 
-    def remote_list(self, worker_id):
-        # For list operation
+    def send_pooled_command(self, command_str):
+        # Seperti send_command, tapi koneksi diambil dari pool (keep-alive)
+        try:
+            return self.client.command(command_str)
+
+        except socket.timeout as e:
+            logging.error(f"Socket timeout: {str(e)}")
+            return {'status': 'ERROR', 'data': f'Socket timeout: {str(e)}'}
+
+        except ConnectionRefusedError:
+            logging.error("Connection refused. Is the server running?")
+            return {'status': 'ERROR', 'data': 'Connection refused. Server running or not?'}
+
+        except Exception as e:
+            logging.error(f"Error in send_pooled_command: {str(e)}")
+            return {'status': 'ERROR', 'data': str(e)}
+
+    @contextlib.contextmanager
+    def binary_connection(self):
+        # Socket dari pool kalau keepalive, selain itu koneksi baru per perintah
+        if self.client is not None:
+            with self.client.connection() as conn:
+                yield conn.sock
+            return
+
+        sock=socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.settimeout(600)
+        try:
+            sock.connect(self.server_address)
+            yield sock
+        finally:
+            sock.close()
+
+    def send_binary_command(self, command, filename='', payload=b'', output_path=None, flags=0):
+        # Versi biner dari send_command, return (result_dict, payload mentah).
+        # Kalau output_path diisi, body GET di-stream langsung ke file tersebut.
+        # Untuk GET, result berisi 'size' (bytes asli) dan 'wire_size' (bytes di jaringan)
+        try:
+            with self.binary_connection() as sock:
+                if hasattr(payload, 'fileno'):
+                    # Payload berupa file: di-stream tanpa dibaca ke memory
+                    fbp.send_file_frame(sock, command, filename, payload, os.fstat(payload.fileno()).st_size,
+                                        flags=flags)
+                else:
+                    fbp.send_frame(sock, command, filename, payload, flags=flags)
+                _, _, status, response_flags, payload_len = fbp.recv_frame_header(sock)
+
+                if command.upper() == 'GET' and status == fbp.STATUS_OK:
+                    result = {'status': 'OK', 'data_namafile': filename, 'size': payload_len, 'wire_size': payload_len}
+                    compressed = response_flags & fbp.FLAG_ZLIB
+                    if output_path is None:
+                        body = fbp.recv_exact(sock, payload_len)
+                        if compressed:
+                            body = zlib.decompress(body)
+                        result['size'] = len(body)
+                        return result, body
+                    with open(output_path, 'wb') as f:
+                        if compressed:
+                            writer = file_compression.DecompressingWriter(f)
+                            fbp.recv_into_file(sock, writer, payload_len)
+                            writer.finish()
+                        else:
+                            fbp.recv_into_file(sock, f, payload_len)
+                        result['size'] = f.tell()
+                    return result, b''
+                return json.loads(fbp.recv_exact(sock, payload_len)), b''
+
+        except socket.timeout as e:
+            logging.error(f"Socket timeout: {str(e)}")
+            return {'status': 'ERROR', 'data': f'Socket timeout: {str(e)}'}, b''
+
+        except ConnectionRefusedError:
+            logging.error("Connection refused. Is the server running?")
+            return {'status': 'ERROR', 'data': 'Connection refused. Server running or not?'}, b''
+
+        except Exception as e:
+            logging.error(f"Error in send_binary_command: {str(e)}")
+            return {'status': 'ERROR', 'data': str(e)}, b''
+
+    def remote_list(self, worker_id, scheduled=None):
+        # For list operation. scheduled = waktu kirim yang dijadwalkan (open loop)
         start_time = time.time()
-        
+
+        requests = self.requests_per_worker
+        samples = [] # (waktu selesai, latency, bytes) per request yang sukses
+
         try:
-            command_str = "LIST"
-            result = self.send_command(command_str)
-            
+            sent_at = scheduled or start_time
+            for sent in range(0, requests, self.pipeline):
+                count = min(self.pipeline, requests - sent)
+                if self.pipeline > 1:
+                    # Beberapa LIST sekaligus di satu koneksi, respons dibaca setelahnya
+                    batch = self.client.pipeline(["LIST"] * count)
+                    result = next((r for r in batch if r['status'] != 'OK'), batch[-1])
+                elif self.binary:
+                    result, _ = self.send_binary_command("LIST")
+                else:
+                    command_str = "LIST"
+                    result = self.send_command(command_str)
+                now = time.time()
+                if result['status'] != 'OK':
+                    break
+                # Request yang di-pipeline baru terjawab semua setelah batch selesai
+                samples.extend((now, now - sent_at, 0) for _ in range(count))
+                sent_at = now
+
             end_time = time.time()
             duration = end_time - start_time
+            latency = (end_time - (scheduled or start_time)) / requests
             
             if result['status'] == 'OK':
                 file_count = len(result['data'])
-                logging.info(f"Worker {worker_id}: List successful - {file_count} files in {duration:.2f}s")
+                logging.debug("Worker %s: List successful - %d files, %d requests in %.2fs (%.2f ms/request)",
+                              worker_id, file_count, requests, duration, latency * 1000)
                 self.success_count['list'] += 1
             
             else:
@@ -138,54 +313,84 @@ class StressTestClient:
                 self.fail_count['list'] += 1
                 
             return {
-                'worker_id': worker_id, 'operation': 'list', 'duration': duration,
-                'status': result['status']
+                'worker_id': worker_id, 'operation': 'list', 'duration': duration, 'latency': latency,
+                'status': result['status'], 'end': end_time, 'samples': samples
             }
-        
+
         except Exception as e:
             end_time = time.time()
             duration = end_time - start_time
 
             logging.error(f"Worker {worker_id}: List exception: {str(e)}")
             self.fail_count['list'] += 1
-            
+
             return {
                 'worker_id': worker_id, 'operation': 'list', 'duration': duration,
-                'status': 'ERROR', 'error': str(e)
+                'status': 'ERROR', 'error': str(e), 'end': end_time
             }
 
-    def remote_upload(self, file_path, worker_id):
-        # For upload operation
+    def remote_upload(self, file_path, worker_id, scheduled=None):
+        # For upload operation. scheduled = waktu kirim yang dijadwalkan (open loop)
         start_time = time.time()
         filename = os.path.basename(file_path)
         file_size = os.path.getsize(file_path)
         
         try:
-            logging.info(f"Worker {worker_id}: Starting upload of {filename} ({file_size/1024/1024:.2f} MB)")
+            logging.debug("Worker %s: Starting upload of %s (%.2f MB)", worker_id, filename, file_size / 1024 / 1024)
             
-            # File dibaca dalam bentuk chunks
-            with open(file_path, 'rb') as fp:
-                file_content = base64.b64encode(fp.read()).decode()
-            
-            command_str = f"UPLOAD {filename} {file_content}"
-            result = self.send_command(command_str)
+            if self.parallel > 1:
+                ParallelTransfer(self.server_address, self.parallel).upload(file_path, filename)
+                result = {'status': 'OK'}
+                wire_bytes = file_size
+            elif self.binary:
+                # Frame biner: isi file di-stream mentah tanpa base64, kalau --compress dikompres
+                # per chunk ke file sementara dulu (ukuran terkompresi dibutuhkan untuk header)
+                with open(file_path, 'rb') as fp:
+                    flags = 0
+                    payload = fp
+                    if self.compress and file_compression.should_compress(
+                            filename, fp.read(file_compression.SAMPLE_SIZE), file_size):
+                        fp.seek(0)
+                        payload = file_compression.compress_file(fp)
+                        flags = fbp.FLAG_ZLIB
+                        if not file_compression.expansion_allowed(file_size, os.fstat(payload.fileno()).st_size):
+                            # Server menolak stream yang mengembang terlalu jauh, kirim apa adanya
+                            payload.close()
+                            fp.seek(0)
+                            payload, flags = fp, 0
+                    try:
+                        wire_bytes = os.fstat(payload.fileno()).st_size
+                        result, _ = self.send_binary_command("UPLOAD", filename, payload, flags=flags)
+                    finally:
+                        if payload is not fp:
+                            payload.close()
+            else:
+                # Body base64 tetap bytes, dikirim sebagai potongan terpisah dari header perintah
+                with open(file_path, 'rb') as fp:
+                    file_content = base64.b64encode(fp.read())
+                wire_bytes = len(file_content)
+
+                result = self.send_command([f"UPLOAD {filename} ", file_content])
             
             end_time = time.time()
             duration = end_time - start_time
             throughput = file_size / duration if duration > 0 else 0
-            
+            latency = end_time - (scheduled or start_time)
+
             if result['status'] == 'OK':
-                logging.info(f"Worker {worker_id}: Upload successful - {filename} ({file_size/1024/1024:.2f} MB) in {duration:.2f}s - {throughput/1024/1024:.2f} MB/s")
+                logging.debug("Worker %s: Upload successful - %s (%.2f MB) in %.2fs - %.2f MB/s", worker_id, filename,
+                              file_size / 1024 / 1024, duration, throughput / 1024 / 1024)
                 self.success_count['upload'] += 1
             else:
                 logging.error(f"Worker {worker_id}: Upload failed - {filename}: {result['data']}")
                 self.fail_count['upload'] += 1
                 
             return {
-                'worker_id': worker_id, 'operation': 'upload', 'file_size': file_size,
-                'duration': duration, 'throughput': throughput, 'status': result['status']
+                'worker_id': worker_id, 'operation': 'upload', 'file_size': file_size, 'wire_bytes': wire_bytes,
+                'duration': duration, 'throughput': throughput, 'latency': latency, 'status': result['status'],
+                'end': end_time, 'samples': [(end_time, latency, file_size)] if result['status'] == 'OK' else []
             }
-        
+
         except Exception as e:
             end_time = time.time()
             duration = end_time - start_time
@@ -195,65 +400,91 @@ class StressTestClient:
 
             return {
                 'worker_id': worker_id, 'operation': 'upload', 'file_size': file_size, 'duration': duration,
-                'throughput': 0, 'status': 'ERROR', 'error': str(e)
+                'throughput': 0, 'status': 'ERROR', 'error': str(e), 'end': end_time
             }
 
-    def remote_download(self, filename, worker_id):
-        # For download operation
+    def remote_download(self, filename, worker_id, scheduled=None):
+        # For download operation. scheduled = waktu kirim yang dijadwalkan (open loop)
         start_time = time.time()
         
         try:
-            logging.info(f"Worker {worker_id}: Starting download of {filename}")
+            logging.debug("Worker %s: Starting download of %s", worker_id, filename)
             
-            command_str = f"GET {filename}"
-            result = self.send_command(command_str)
+            # Setelah download, disimpan ke folder download
+            download_path = os.path.join('downloads', f"worker{worker_id}_{filename}")
+
+            if self.parallel > 1:
+                size = ParallelTransfer(self.server_address, self.parallel).download(filename, download_path)
+                result = {'status': 'OK', 'data_namafile': filename, 'size': size}
+            elif self.binary:
+                # Body di-stream langsung ke download_path, FLAG_ZLIB = boleh dikirim terkompresi
+                flags = fbp.FLAG_ZLIB if self.compress else 0
+                result, _ = self.send_binary_command("GET", filename, output_path=download_path, flags=flags)
+            else:
+                command_str = f"GET {filename}"
+                result = self.send_command(command_str)
             
             if result['status'] == 'OK':
-                file_content = base64.b64decode(result['data_file'])
-                file_size = len(file_content)
-                
-                # Setelah download, disimpan ke folder download
-                download_path = os.path.join('downloads', f"worker{worker_id}_{filename}")
-                with open(download_path, 'wb') as f:
-                    f.write(file_content)
+                if self.binary or self.parallel > 1:
+                    file_size = result['size']
+                    wire_bytes = result.get('wire_size', file_size)
+                else:
+                    wire_bytes = len(result['data_file'])
+                    file_content = base64.b64decode(result['data_file'])
+                    file_size = len(file_content)
+
+                    with open(download_path, 'wb') as f:
+                        f.write(file_content)
                 
                 end_time = time.time()
                 duration = end_time - start_time
                 throughput = file_size / duration if duration > 0 else 0
-                
-                logging.info(f"Worker {worker_id}: Download successful - {filename} ({file_size/1024/1024:.2f} MB) in {duration:.2f}s - {throughput/1024/1024:.2f} MB/s")
+                latency = end_time - (scheduled or start_time)
+
+                logging.debug("Worker %s: Download successful - %s (%.2f MB) in %.2fs - %.2f MB/s", worker_id, filename,
+                              file_size / 1024 / 1024, duration, throughput / 1024 / 1024)
                 self.success_count['download'] += 1
-                
+
                 return {
-                    'worker_id': worker_id, 'operation': 'download', 'file_size': file_size, 'duration': duration, 'throughput': throughput,
-                    'status': 'OK'
+                    'worker_id': worker_id, 'operation': 'download', 'file_size': file_size, 'wire_bytes': wire_bytes,
+                    'duration': duration, 'throughput': throughput, 'latency': latency, 'status': 'OK',
+                    'end': end_time, 'samples': [(end_time, latency, file_size)]
                 }
-            
+
             else:
                 end_time = time.time()
                 duration = end_time - start_time
                 logging.error(f"Worker {worker_id}: Download failed - {filename}: {result['data']}")
                 self.fail_count['download'] += 1
-                
+
                 return {
                     'worker_id': worker_id, 'operation': 'download', 'file_size': 0,
                     'duration': duration, 'throughput': 0, 'status': 'ERROR',
-                    'error': result['data']
+                    'error': result['data'], 'end': end_time
                 }
-            
+
         except Exception as e:
             end_time = time.time()
             duration = end_time - start_time
 
             logging.error(f"Worker {worker_id}: Download exception - {filename}: {str(e)}")
             self.fail_count['download'] += 1
-            
+
             return {
                 'worker_id': worker_id, 'operation': 'download', 'file_size': 0,
                 'duration': duration, 'throughput': 0, 'status': 'ERROR',
-                'error': str(e)
+                'error': str(e), 'end': end_time
             }
 
+    def close(self):
+        # Dipanggil sekali setelah semua test selesai: pool keep-alive dipakai ulang oleh semua
+        # worker selama run (koneksi yang sudah ditutup server diganti otomatis oleh FileClient)
+        if self.client is not None:
+            self.client.close()
+        if self.coordinator is not None:
+            self.coordinator.close()
+            self.coordinator = None
+
     def reset_counters(self):
         # Untuk reset nilai counters
         self.success_count = {
@@ -276,57 +507,115 @@ class StressTestClient:
             logging.error(f"Unknown operation: {operation} please input the correct one")
             return
             
-        logging.info(f"Starting {operation} stress test with {file_size_mb}MB files, {client_pool_size} {executor_type} workers")
-        
-        test_file = None
-        if operation == 'upload' or operation == 'download':
-            test_file = self.generate_testfile(file_size_mb)
+        logging.info(f"Starting {operation} stress test with {file_size_mb}MB files, {client_pool_size} {executor_type} workers "
+                     f"({self.load_mode()} loop)")
         
-        # Apabila operasi download, make sure terlebih dahulu apakah file sudah exist
-        if operation == 'download':
-            logging.info(f"Ensuring test file exists on server for download test")
-            upload_result = self.remote_upload(test_file, 0)
-
-            if upload_result['status'] != 'OK':
-                logging.error(f"Upload failed: {upload_result.get('error', 'Unknown error')}")
+        if self.coordinator is not None:
+            # Beban dijalankan oleh load generator, hasilnya sudah digabung coordinator
+            stats = self.coordinator.run_stress_test(operation, file_size_mb, client_pool_size, executor_type)
+        else:
+            test_file = self.prepare_test(operation, file_size_mb)
+            if test_file is False:
                 return None
-        # Kalau thread, pakai threadpoolexecutor
-        if executor_type == 'thread':
-            executor_class = concurrent.futures.ThreadPoolExecutor
-        else:  # Kalau process, pakai processpoolexecutor
-            executor_class = concurrent.futures.ProcessPoolExecutor
-        
-        # Jalankan stress test nya
-        all_results = []
+            all_results, test_start, elapsed = self.collect_results(operation, test_file, client_pool_size, executor_type)
+            stats = self.summarize(operation, file_size_mb, client_pool_size, executor_type, all_results, test_start,
+                                   elapsed)
+        if stats is None:
+            return None
+
+        # Counter yang di-update di worker ProcessPoolExecutor (atau load generator) hilang bersama
+        # process-nya, jadi counter diambil dari hasil yang dikumpulkan di sini
+        self.success_count[operation] = stats['success_count']
+        self.fail_count[operation] = stats['fail_count']
+        raw_bytes = stats['raw_bytes']
+        wire_bytes = stats['wire_bytes']
         
-        with executor_class(max_workers=client_pool_size) as executor:
-            futures = []
-            
-            for i in range(client_pool_size):
-                if operation == 'upload': # sesuaikan dengan fungsi
-                    futures.append(executor.submit(self.remote_upload, test_file, i))
+        if operation == 'download' and not self.binary and self.parallel == 1:
+            # Lihat efek cache GET di server (hit/miss/eviction)
+            cache_stats = self.send_command("CACHESTATS")
+            if cache_stats.get('status') == 'OK':
+                logging.info(f"Server cache stats: {cache_stats['data']}")
 
-                elif operation == 'download':
-                    file_name = os.path.basename(test_file)
-                    futures.append(executor.submit(self.remote_download, file_name, i))
+        # Service time di sisi server untuk perintah yang sama (akumulatif sejak server start)
+        server_stats = self.send_command("STATS")
+        if server_stats.get('status') == 'OK':
+            command = 'get' if operation == 'download' else operation
+            latency = server_stats['data']['commands'].get(command)
+            if latency:
+                logging.info(f"Server {command.upper()} latency: p50 {latency['p50_ms']} ms, "
+                             f"p99 {latency['p99_ms']} ms, max {latency['max_ms']} ms ({latency['count']} requests)")
 
-                else: # List
-                    futures.append(executor.submit(self.remote_list, i))
-            
-            for future in concurrent.futures.as_completed(futures):
-                try:
-                    result = future.result()
-                    all_results.append(result)
-                    self.results[operation].append(result)
-                except Exception as e:
-                    logging.error(f"Worker failed with exception: {str(e)}")
+        logging.info(f"Test complete: {stats['success_count']} succeeded, {stats['fail_count']} failed")
+        logging.info(f"Average duration: {stats['avg_duration']:.2f}s, Average throughput: {stats['avg_throughput']/1024/1024:.2f} MB/s")
+        logging.info(f"Average latency per request: {stats['avg_latency'] * 1000:.2f} ms ({stats['connection_mode']} connections)")
+        logging.info(f"Latency p50/p90/p99/max: {stats['p50_latency'] * 1000:.2f}/{stats['p90_latency'] * 1000:.2f}/"
+                     f"{stats['p99_latency'] * 1000:.2f}/{stats['max_latency'] * 1000:.2f} ms, "
+                     f"{stats['requests']} requests at {stats['achieved_rate']:.2f} req/s ({stats['load_mode']} loop)")
+        if raw_bytes:
+            logging.info(f"Bytes: {raw_bytes} raw, {wire_bytes} on the wire ({wire_bytes / raw_bytes:.2%})")
         
-        success_count = sum(1 for r in all_results if r['status'] == 'OK')
+        return stats
+
+    def run_replay(self, trace_path, speedup=1.0, client_pool_size=16):
+        # Putar ulang trace server (--trace) dengan jeda antar request aslinya dibagi speedup
+        self.reset_counters()
+        entries, skipped = load_trace(trace_path)
+        logging.info(f"Replaying {len(entries)} requests from {trace_path} at {speedup:g}x with {client_pool_size} "
+                     f"workers ({skipped} requests skipped)")
+        replayer = TraceReplayer(self.server_address, self.binary, speedup, client_pool_size)
+        try:
+            replayer.prepare(entries)
+            test_start = time.time()
+            all_results = replayer.run(entries)
+            elapsed = time.time() - test_start
+        finally:
+            replayer.close()
+
+        stats = self.summarize('replay', 0, client_pool_size, 'thread', all_results, test_start, elapsed)
+        span = (entries[-1]['t'] - entries[0]['t']) / speedup if entries else 0
+        stats.update(connection_mode='keepalive', load_mode=f'replay {speedup:g}x', skipped=skipped,
+                     target_rate=len(entries) / span if span > 0 else 0, commands=self.command_stats(all_results))
+
+        logging.info(f"Replay complete: {stats['success_count']} succeeded, {stats['fail_count']} failed")
+        for command, command_stats in stats['commands'].items():
+            logging.info(f"  {command}: {command_stats['count']} requests, {command_stats['errors']} errors, "
+                         f"p50 {command_stats['p50_latency'] * 1000:.2f} ms, p99 {command_stats['p99_latency'] * 1000:.2f} ms")
+        logging.info(f"Latency p50/p90/p99/max: {stats['p50_latency'] * 1000:.2f}/{stats['p90_latency'] * 1000:.2f}/"
+                     f"{stats['p99_latency'] * 1000:.2f}/{stats['max_latency'] * 1000:.2f} ms, "
+                     f"{stats['requests']} requests at {stats['achieved_rate']:.2f} req/s "
+                     f"(trace rate {stats['target_rate']:.2f} req/s)")
+        return stats
+
+    def command_stats(self, all_results):
+        # Latency per perintah untuk workload campuran (replay)
+        by_command = defaultdict(list)
+        for r in all_results:
+            by_command[r['operation']].append(r)
+        stats = {}
+        for command, results in sorted(by_command.items()):
+            samples = sorted(sample[1] for r in results for sample in r.get('samples', []))
+            stats[command] = {
+                'count': len(results),
+                'errors': sum(1 for r in results if r['status'] != 'OK'),
+                'p50_latency': percentile(samples, 0.50),
+                'p99_latency': percentile(samples, 0.99),
+            }
+        return stats
+
+    def summarize(self, operation, file_size_mb, client_pool_size, executor_type, all_results, test_start, elapsed):
+        # Stats satu test dari hasil semua worker di process ini
+        success_count= sum(1 for r in all_results if r['status'] == 'OK')
         fail_count    = len(all_results) - success_count
-        
         # Menghitung durasi dan throughputs
         durations = [r['duration'] for r in all_results if r['status'] == 'OK']
+        # Upload/download = satu request per worker, list bisa beberapa (--requests)
+        latencies = [r.get('latency', r['duration']) for r in all_results if r['status'] == 'OK']
         throughputs = [r['throughput'] for r in all_results if r.get('throughput', 0) > 0]
+        # Bytes asli vs bytes di jaringan (base64 untuk teks, terkompresi kalau --compress)
+        raw_bytes = sum(r.get('file_size', 0) for r in all_results if r['status'] == 'OK')
+        wire_bytes = sum(r.get('wire_bytes', 0) for r in all_results if r['status'] == 'OK')
+        # Latency per request yang sukses (dari waktu jadwal kalau open loop)
+        samples = sorted(sample[1] for r in all_results for sample in r.get('samples', []))
         
         # if not durations:
         #    logging.warning("There is no successful operations")
@@ -343,37 +632,156 @@ class StressTestClient:
             'avg_duration': statistics.mean(durations) if durations else 0,
             'avg_throughput': statistics.mean(throughputs) if throughputs else 0,
             'success_count': success_count,
-            'fail_count': fail_count
+            'fail_count': fail_count,
+            'protocol': 'binary' if self.binary or self.parallel > 1 else 'text',
+            'parallel': self.parallel,
+            'compress': self.compress,
+            'raw_bytes': raw_bytes,
+            'wire_bytes': wire_bytes,
+            'connection_mode': 'per client' if executor_type == 'asyncio' else self.connection_mode(),
+            'avg_latency': statistics.mean(latencies) if latencies else 0,
+            'load_mode': self.load_mode(),
+            'target_rate': self.rate or 0,
+            'achieved_rate': len(samples) / elapsed if elapsed > 0 else 0,
+            'requests': len(samples),
+            'p50_latency': percentile(samples, 0.50),
+            'p90_latency': percentile(samples, 0.90),
+            'p99_latency': percentile(samples, 0.99),
+            'max_latency': samples[-1] if samples else 0,
+            'timeline': self.timeline(all_results, test_start)
         }
-        
-        logging.info(f"Test complete: {stats['success_count']} succeeded, {stats['fail_count']} failed")
-        logging.info(f"Average duration: {stats['avg_duration']:.2f}s, Average throughput: {stats['avg_throughput']/1024/1024:.2f} MB/s")
-        
         return stats
 
+    def prepare_test(self, operation, file_size_mb):
+        # Return path test file (None untuk list), False kalau file untuk download gagal di-upload
+        test_file = None
+        if operation == 'upload' or operation == 'download':
+            test_file = self.generate_testfile(file_size_mb)
+        
+        # Apabila operasi download, make sure terlebih dahulu apakah file sudah exist
+        if operation == 'download':
+            logging.info(f"Ensuring test file exists on server for download test")
+            upload_result = self.remote_upload(test_file, 0)
+
+            if upload_result['status'] != 'OK':
+                logging.error(f"Upload failed: {upload_result.get('error', 'Unknown error')}")
+                return False
+        return test_file
+
+    def collect_results(self, operation, test_file, client_pool_size, executor_type='thread'):
+        # Jalankan beban dan kumpulkan hasil semua worker, return (hasil, waktu mulai, durasi test)
+        all_results = []
+        test_start = time.time()
+        if executor_type == 'asyncio':
+            # Semua klien sebagai coroutine di process ini (lihat file_async_stress_client)
+            if self.parallel > 1 or self.compress or self.client is not None:
+                logging.warning("--parallel, --compress, --keepalive and --pipeline are ignored by the asyncio executor")
+            generator = AsyncLoadGenerator(self.server_address, self.binary, self.requests_per_worker, self.rate,
+                                           self.duration)
+            all_results = generator.run(operation, test_file, client_pool_size)
+            self.results[operation].extend(all_results)
+        else:
+            # Kalau thread, pakai threadpoolexecutor
+            if executor_type == 'thread':
+                executor_class = concurrent.futures.ThreadPoolExecutor
+            else:  # Kalau process, pakai processpoolexecutor
+                executor_class = concurrent.futures.ProcessPoolExecutor
+
+            with executor_class(max_workers=client_pool_size) as executor:
+                if self.rate:
+                    futures = self.submit_open_loop(executor, operation, test_file, client_pool_size)
+                else:
+                    futures = [self.submit_operation(executor, operation, test_file, i) for i in range(client_pool_size)]
+
+                for future in concurrent.futures.as_completed(futures):
+                    try:
+                        result = future.result()
+                        all_results.append(result)
+                        self.results[operation].append(result)
+                    except Exception as e:
+                        logging.error(f"Worker failed with exception: {str(e)}")
+        elapsed = time.time() - test_start
+        return all_results, test_start, elapsed
+
+    def submit_operation(self, executor, operation, test_file, worker_id, scheduled=None):
+        if operation == 'upload': # sesuaikan dengan fungsi
+            return executor.submit(self.remote_upload, test_file, worker_id, scheduled)
+        elif operation == 'download':
+            return executor.submit(self.remote_download, os.path.basename(test_file), worker_id, scheduled)
+        else: # List
+            return executor.submit(self.remote_list, worker_id, scheduled)
+
+    def submit_open_loop(self, executor, operation, test_file, client_pool_size):
+        # Open loop: request ke-i dijadwalkan pada start + i/rate tanpa menunggu request sebelumnya
+        # selesai. Latency diukur dari waktu jadwal, jadi waktu antri saat server (atau worker klien)
+        # lambat ikut terhitung, bukan disembunyikan (coordinated omission)
+        futures = []
+        start = time.time()
+        for i in range(max(int(self.rate * self.duration), 1)):
+            scheduled = start + i / self.rate
+            delay = scheduled - time.time()
+            if delay > 0:
+                time.sleep(delay)
+            futures.append(self.submit_operation(executor, operation, test_file, i % client_pool_size, scheduled))
+        return futures
+
+    def timeline(self, all_results, test_start):
+        # Time series per detik sejak test dimulai: request selesai, bytes, dan operasi gagal
+        seconds = defaultdict(lambda: {'completed': 0, 'bytes': 0, 'errors': 0})
+        for r in all_results:
+            for end, _, size in r.get('samples', []):
+                seconds[int(end - test_start)]['completed'] += 1
+                seconds[int(end - test_start)]['bytes'] += size
+            if r['status'] != 'OK':
+                seconds[int(r.get('end', test_start) - test_start)]['errors'] += 1
+        if not seconds:
+            return []
+        return [dict(second=second, **seconds[second]) for second in range(max(seconds) + 1)]
+
     def run_combination_tests(self, file_sizes, client_pool_sizes, server_pool_sizes, executor_types, operations):
         all_stats = []
         
         # Kita harus restart manual saat hendak berganti server pool size
+        # (file_benchmark menjalankan server-nya sendiri secara otomatis)
         for server_pool_size in server_pool_sizes:
             logging.info(f"Tests for server pool size: {server_pool_size}")
             logging.info("Input the appropriate pool size to continue and restarting the server!")
             input("Press Enter when the server is ready...")
-            
-            for executor_type in executor_types:
-                for operation in operations:
-                    for file_size in file_sizes:
-                        for client_pool_size in client_pool_sizes:
-                            stats = self.run_stress_test(operation, file_size, client_pool_size, executor_type)
-                            if stats:
-                                stats['server_pool_size'] = server_pool_size
-                                all_stats.append(stats)
+            all_stats.extend(self.run_matrix(file_sizes, client_pool_sizes, executor_types, operations, server_pool_size))
         
-        self.save_csv(all_stats) # save hasilnya ke csv
-    
-    def save_csv(self, all_stats):
+        self.save_results(all_stats) # save hasilnya ke csv dan json
+
+    def run_matrix(self, file_sizes, client_pool_sizes, executor_types, operations, server_pool_size, server_engine=None):
+        # Semua kombinasi terhadap satu server yang sedang berjalan
+        all_stats = []
+        for executor_type in executor_types:
+            for operation in operations:
+                for file_size in file_sizes:
+                    for client_pool_size in client_pool_sizes:
+                        stats = self.run_stress_test(operation, file_size, client_pool_size, executor_type)
+                        if stats:
+                            stats['server_pool_size'] = server_pool_size
+                            if server_engine:
+                                stats['server_engine'] = server_engine
+                            all_stats.append(stats)
+        return all_stats
+
+    def save_results(self, all_stats):
         timestamp = time.strftime("%Y%m%d-%H%M%S")
-        csv_filename = f"stress_test_{timestamp}.csv"
+        return self.save_csv(all_stats, timestamp), self.save_json(all_stats, timestamp)
+
+    def save_json(self, all_stats, timestamp=None):
+        # Versi machine-readable dari CSV, termasuk time series per detik
+        timestamp = timestamp or time.strftime("%Y%m%d-%H%M%S")
+        json_filename = f"stress_test_{timestamp}.json"
+        with open(json_filename, 'w') as f:
+            json.dump({'server_address': list(self.server_address), 'results': all_stats}, f, indent=2)
+        logging.info(f"Results already saved to {json_filename}")
+        return json_filename
+
+    def save_csv(self, all_stats, timestamp=None):
+        timestamp = timestamp or time.strftime("%Y%m%d-%H%M%S")
+        csv_filename= f"stress_test_{timestamp}.csv"
         
         with open(csv_filename, 'w', newline='') as csvfile:
             fieldnames = [
@@ -381,7 +789,12 @@ class StressTestClient:
                 'Operasi', 'Volume (MB)', 'Jumlah Client Worker Pool', 'Jumlah Server Worker Pool',
                 'Waktu total per client (s)', 'Throughput per client (bytes/s)',
                 'Jumlah Worker Sukses', 'Jumlah Worker Gagal',
-                'Executor Type'
+                'Executor Type', 'Protocol', 'Koneksi Paralel per Transfer',
+                'Kompresi', 'Total Bytes Mentah', 'Total Bytes di Jaringan',
+                'Mode Koneksi', 'Latency per Request (s)',
+                'Mode Beban', 'Target Rate (req/s)', 'Achieved Rate (req/s)',
+                'Latency p50 (s)', 'Latency p90 (s)', 'Latency p99 (s)', 'Latency Max (s)',
+                'Server Engine', 'Jumlah Load Generator'
             ]
             writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
             
@@ -400,7 +813,23 @@ class StressTestClient:
                     'Throughput per client (bytes/s)': stats['avg_throughput'],
                     'Jumlah Worker Sukses': stats['success_count'],
                     'Jumlah Worker Gagal': stats['fail_count'],
-                    'Executor Type': stats['executor_type']
+                    'Executor Type': stats['executor_type'],
+                    'Protocol': stats.get('protocol', 'text'),
+                    'Koneksi Paralel per Transfer': stats.get('parallel', 1),
+                    'Kompresi': 'zlib' if stats.get('compress') else '-',
+                    'Total Bytes Mentah': stats.get('raw_bytes', 0),
+                    'Total Bytes di Jaringan': stats.get('wire_bytes', 0),
+                    'Mode Koneksi': stats.get('connection_mode', 'new'),
+                    'Latency per Request (s)': stats.get('avg_latency', stats['avg_duration']),
+                    'Mode Beban': stats.get('load_mode', 'closed'),
+                    'Target Rate (req/s)': stats.get('target_rate', 0),
+                    'Achieved Rate (req/s)': stats.get('achieved_rate', 0),
+                    'Latency p50 (s)': stats.get('p50_latency', 0),
+                    'Latency p90 (s)': stats.get('p90_latency', 0),
+                    'Latency p99 (s)': stats.get('p99_latency', 0),
+                    'Latency Max (s)': stats.get('max_latency', 0),
+                    'Server Engine': stats.get('server_engine', '-'),
+                    'Jumlah Load Generator': stats.get('generators', 1)
                 }
                 total_success += stats['success_count']
                 total_fail += stats['fail_count']
@@ -429,14 +858,54 @@ if __name__ == "__main__":
                         help='Client worker pool sizes (default: 1 5 10)')
     parser.add_argument('--server-pools', type=int, nargs='+', default=[1, 5, 10], 
                         help='Server worker pool sizes to test against (default: 1 5 10)')
-    parser.add_argument('--executor', choices=['thread', 'process', 'both'], default='thread', 
-                        help='Executor type (default: thread)')
+    parser.add_argument('--executor', choices=['thread', 'process', 'both', 'asyncio'], default='thread', 
+                        help='Executor type; asyncio runs every client as a coroutine in one process, '
+                             'for thousands of concurrent clients (default: thread)')
+    parser.add_argument('--binary', action='store_true',
+                        help='Use the length-prefixed binary protocol instead of text/base64/JSON')
+    parser.add_argument('--parallel', type=int, default=1,
+                        help='Connections per upload/download; >1 splits each file into ranges (binary protocol) (default: 1)')
+    parser.add_argument('--compress', action='store_true',
+                        help='Negotiate zlib compression for GET/UPLOAD bodies (binary protocol)')
+    parser.add_argument('--test-data', choices=['random', 'text'], default='random',
+                        help='Content of generated test files: random bytes or compressible log text (default: random)')
+    parser.add_argument('--keepalive', action='store_true',
+                        help='Reuse pooled connections instead of opening one per command')
+    parser.add_argument('--pipeline', type=positive_int, default=1,
+                        help='LIST requests sent back-to-back on one pooled connection before reading responses (default: 1)')
+    parser.add_argument('--requests', type=positive_int, default=1,
+                        help='LIST requests per worker, for per-request latency (default: 1)')
+    parser.add_argument('--rate', type=float, default=None,
+                        help='Open-loop mode: start this many operations per second regardless of completions; '
+                             'latency is measured from the scheduled send time (default: closed loop)')
+    parser.add_argument('--duration', type=float, default=10,
+                        help='Open-loop test duration in seconds (default: 10)')
+    parser.add_argument('--generators', type=int, default=0,
+                        help='Coordinator mode: split each test across this many local load-generator processes, '
+                             'started together and merged into one report (default: 0, run in this process)')
+    parser.add_argument('--remote-generators', nargs='+', default=[], metavar='HOST:PORT',
+                        help='Coordinator mode: also use load generators started with --generator on other hosts '
+                             '(use a --host they can reach)')
+    parser.add_argument('--generator', action='store_true',
+                        help='Run as a load generator waiting for a coordinator on --control-port; '
+                             'the test parameters come from the coordinator')
+    parser.add_argument('--control-port', type=int, default=CONTROL_PORT,
+                        help=f'Control port for --generator (default: {CONTROL_PORT})')
+    parser.add_argument('--replay', default=None, metavar='TRACE',
+                        help='Replay a trace recorded by a server started with --trace, keeping the original '
+                             'request timing; uses the first --client-pools value as worker count')
+    parser.add_argument('--speedup', type=float, default=1.0,
+                        help='Replay speed-up factor, 2 = twice as fast as recorded (default: 1.0)')
     parser.add_argument('--debug', action='store_true', help='Enable debug logging')
     
     args = parser.parse_args()
     
     if args.debug:
         logging.getLogger().setLevel(logging.DEBUG)
+
+    if args.generator:
+        run_generator(port=args.control_port)
+        sys.exit(0)
     
     file_sizes = args.file_sizes
     client_pool_sizes = args.client_pools
@@ -455,17 +924,30 @@ if __name__ == "__main__":
         operations = args.operation
 
     
-    client = StressTestClient((args.host, args.port))
+    client = StressTestClient((args.host, args.port), binary=args.binary, parallel=args.parallel,
+                              compress=args.compress, test_data=args.test_data,
+                              keepalive=args.keepalive, pipeline=args.pipeline, requests_per_worker=args.requests,
+                              rate=args.rate, duration=args.duration)
+    if args.generators or args.remote_generators:
+        remote = [(address.rsplit(':', 1)[0], int(address.rsplit(':', 1)[1])) for address in args.remote_generators]
+        client.coordinator = LoadCoordinator(client, local=args.generators, remote=remote)
     
+    if args.replay:
+        stats = client.run_replay(args.replay, args.speedup, client_pool_sizes[0])
+        stats['server_pool_size'] = server_pool_sizes[0]
+        client.save_results([stats])
+
     # Untuk single test (without combination)
-    if len(operations) == 1 and len(file_sizes) == 1 and len(client_pool_sizes) == 1 and len(server_pool_sizes) == 1:
+    elif len(operations) == 1 and len(file_sizes) == 1 and len(client_pool_sizes) == 1 and len(server_pool_sizes) == 1:
         logging.info(f"Running a single test with operation={operations[0]}, file_size={file_sizes[0]}MB, client_pool={client_pool_sizes[0]}")
         stats = client.run_stress_test(operations[0], file_sizes[0], client_pool_sizes[0], executor_types[0])
         
         if stats:
             stats['server_pool_size'] = server_pool_sizes[0]
-            client.save_csv([stats])
+            client.save_results([stats])
 
     else:
         # Untuk semua test combination
         client.run_combination_tests(file_sizes, client_pool_sizes, server_pool_sizes, executor_types, operations)
+
+    client.close()
@@ -2,40 +2,27 @@ from socket import *
 import logging
 import socket
 from file_protocol import FileProtocol # Import protokol file untuk parsing perintah
+from file_connection import manage_connection, ConnectionQueue, IDLE_TIMEOUT # Fungsi untuk manage setiap koneksi klien (teks maupun frame biner)
+from file_server_options import add_file_arguments, file_options, add_server_arguments, server_options, log_level
+from file_access_log import setup_logging
+from file_admission import admission_controller
 import concurrent.futures
 import sys
 
-fp = FileProtocol()
-
-# Fungsi untuk manage setiap koneksi klien
-def manage_client(connection, address):
-    logging.warning(f"manage connection from {address}")
-    buffer = ""
-    try:
-        connection.settimeout(1800) # Timeout koneksi selama 30 menit
-        
-        while True:
-            data=connection.recv(1024*1024)
-            if not data:
-                break
-            buffer=buffer+data.decode()
-            while "\r\n\r\n" in buffer:
-                command, buffer=buffer.split("\r\n\r\n", 1)
-                hasil=fp.proses_string(command)
-                response=hasil + "\r\n\r\n"
-                connection.sendall(response.encode()) # Kirim respons ke klien
-    
-    except Exception as e:
-        logging.warning(f"error: {str(e)}")
-    finally:
-        logging.warning(f"connection from {address} has closed")
-        connection.close()
-
 
 class Server:
-    def __init__(self, ipaddress='0.0.0.0', port=8889, pool_size=5):
+    def __init__(self, ipaddress='0.0.0.0', port=8889, pool_size=5, file_options=None, server_options=None):
         self.ipinfo=(ipaddress, port)
         self.pool_size=pool_size
+        self.server_options=server_options or {}
+        self.max_connections=self.server_options.get('max_connections', 256)
+        # Satu FileProtocol (dan cache-nya) dipakai bersama semua thread worker
+        self.fp=FileProtocol(**(file_options or {}))
+        self.fp.metrics.add('workers', pool_size)
+        # pool_size sekarang membatasi request yang diproses bersamaan (per lane), bukan jumlah koneksi
+        self.admission=admission_controller(self.server_options, default_slots=pool_size, metrics=self.fp.metrics)
+        # Koneksi yang menunggu thread, selama ada koneksi idle lain ditutup lebih cepat
+        self.waiting=ConnectionQueue()
         self.my_socket=socket.socket(socket.AF_INET, socket.SOCK_STREAM) # Buat socket TCP
         self.my_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
         
@@ -45,34 +32,46 @@ class Server:
     def run(self):
         logging.warning(f"server running on ip address {self.ipinfo}, thread pool size is {self.pool_size}")
         self.my_socket.bind(self.ipinfo)
-        self.my_socket.listen(5)
+        self.my_socket.listen(128)
         
-        # ThreadPoolExecutor
-        with concurrent.futures.ThreadPoolExecutor(max_workers=self.pool_size) as executor:
+        # ThreadPoolExecutor: satu thread per koneksi, koneksi idle tidak memegang slot admission
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_connections) as executor:
             try:
                 while True:
                     connection, client_address=self.my_socket.accept()
-                    logging.warning(f"connection from {client_address}")
+                    logging.debug("connection from %s", client_address)
                     
-                    executor.submit(manage_client, connection, client_address)
+                    # Koneksi menunggu di antrian executor kalau semua thread sedang sibuk
+                    self.fp.metrics.add('queued')
+                    self.waiting.add()
+                    executor.submit(self.serve_queued, connection, client_address)
             except KeyboardInterrupt:
                 logging.warning("now server shutting down")
             finally:
                 if self.my_socket:
                     self.my_socket.close()
 
+    def serve_queued(self, connection, client_address):
+        self.fp.metrics.add('queued', -1)
+        manage_connection(connection, client_address, self.fp, self.admission,
+                          self.server_options.get('idle_timeout', IDLE_TIMEOUT), self.waiting)
+
 
 def main():
     import argparse
     parser=argparse.ArgumentParser(description='File Server')
     parser.add_argument('--port', type=int, default=6666, help='Server port (default: 6666)')
-    parser.add_argument('--pool-size', type=int, default=1, help='thread pool size (default: 1)')
+    parser.add_argument('--pool-size', type=int, default=1,
+                        help='Requests processed at once per lane, small and large (default: 1)')
+    add_file_arguments(parser)
+    add_server_arguments(parser)
     args=parser.parse_args()
+    setup_logging(log_level(args))
     
-    svr=Server(ipaddress='0.0.0.0', port=args.port, pool_size=args.pool_size)
+    svr=Server(ipaddress='0.0.0.0', port=args.port, pool_size=args.pool_size, file_options=file_options(args),
+               server_options=server_options(args))
     svr.run()
 
 
 if __name__ == "__main__":
-    logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(levelname)s - %(message)s')
     main()
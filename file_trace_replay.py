@@ -0,0 +1,158 @@
+import os
+import json
+import time
+import base64
+import logging
+import concurrent.futures
+
+import file_binary_protocol as fbp
+from file_client import FileClient
+from file_protocol import b64_size
+
+"""
+* TraceReplayer memutar ulang trace yang direkam server dengan --trace
+(satu JSON per baris: t, command, name, size_in, size_out, status).
+Setiap request dikirim pada waktu datang aslinya relatif terhadap
+request pertama, dibagi speedup (2 = dua kali lebih cepat), tanpa
+menunggu request sebelumnya selesai (open loop), jadi latency diukur
+dari waktu jadwal seperti --rate
+
+* payload tidak ada di trace: upload mengirim bytes acak sebesar
+size_in yang tercatat, dan sebelum replay setiap file yang di-GET
+dengan sukses di trace di-upload dulu dengan ukuran size_out terbesar.
+Nama file diberi prefix REPLAY_PREFIX supaya replay tidak menimpa file
+lain di server
+
+* perintah yang tidak bisa diulang tanpa state aslinya (batch, upload
+per range dengan upload_id, ...) dilewati dan dihitung sebagai skipped.
+Hasil per request punya format yang sama dengan remote_* di
+StressTestClient, jadi statistik dan CSV/JSON-nya dipakai apa adanya
+"""
+
+REPLAY_PREFIX = 'replay_'
+REPLAYABLE = {'list', 'get', 'upload', 'delete', 'stats', 'cachestats'}
+
+
+def load_trace(path):
+    # Return request di trace yang bisa diulang (urut waktu datang) dan jumlah yang dilewati
+    entries = []
+    skipped = 0
+    with open(path) as f:
+        for line in f:
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            if entry.get('command') in REPLAYABLE and (entry['command'] not in ('get', 'upload', 'delete')
+                                                       or entry.get('name')):
+                entries.append(entry)
+            else:
+                skipped += 1
+    entries.sort(key=lambda entry: entry['t'])
+    return entries, skipped
+
+
+def replay_name(name):
+    return REPLAY_PREFIX + os.path.basename(name)
+
+
+class TraceReplayer:
+    def __init__(self, server_address=('localhost', 6666), binary=False, speedup=1.0, workers=16):
+        self.server_address = server_address
+        self.binary = binary
+        self.speedup = speedup
+        self.workers = workers
+        self.client = FileClient(server_address, pool_size=workers)
+        self.payload = b''
+
+    def make_payload(self, size):
+        # Satu buffer acak dipakai bersama, diperbesar kalau ada upload yang lebih besar
+        if len(self.payload) < size:
+            self.payload = os.urandom(size)
+        return memoryview(self.payload)[:size]     # tanpa copy, bisa dipakai banyak thread sekaligus
+
+    def prepare(self, entries):
+        # Upload dulu file yang di-GET dengan sukses di trace, dengan ukuran terbesar yang tercatat
+        sizes = {}
+        for entry in entries:
+            if entry['command'] == 'get' and entry.get('status', 'OK') == 'OK':
+                sizes[entry['name']] = max(sizes.get(entry['name'], 0), entry.get('size_out', 0))
+        for name, size in sizes.items():
+            result = self.upload(replay_name(name), size)
+            if result.get('status') != 'OK':
+                raise RuntimeError(f"Failed to prepare {name} for replay: {result.get('data')}")
+        logging.info(f"Prepared {len(sizes)} files for replay")
+
+    def run(self, entries):
+        # Return hasil per request, format sama dengan StressTestClient.remote_*
+        if not entries:
+            return []
+        self.make_payload(max(entry.get('size_in', 0) for entry in entries))
+        results = []
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.workers) as executor:
+            futures = []
+            first = entries[0]['t']
+            start = time.time()
+            for i, entry in enumerate(entries):
+                scheduled = start + (entry['t'] - first) / self.speedup
+                delay = scheduled - time.time()
+                if delay > 0:
+                    time.sleep(delay)
+                futures.append(executor.submit(self.replay, entry, i, scheduled))
+            for future in concurrent.futures.as_completed(futures):
+                results.append(future.result())
+        return results
+
+    def replay(self, entry, worker_id, scheduled):
+        command = entry['command']
+        start_time = time.time()
+        result = {'worker_id': worker_id, 'operation': command, 'file_size': 0}
+        try:
+            if command == 'upload':
+                size = entry.get('size_in', 0)
+                hasil = self.upload(replay_name(entry['name']), size)
+            elif command == 'get':
+                hasil, size = self.get(replay_name(entry['name']))
+            else:
+                size = 0
+                hasil = self.simple_command(command, replay_name(entry['name']) if entry.get('name') else '')
+            end_time = time.time()
+            duration = end_time - start_time
+            latency = end_time - scheduled
+            if hasil.get('status') != 'OK':
+                raise RuntimeError(hasil.get('data', 'Unknown error'))
+            result.update(status='OK', file_size=size, wire_bytes=size, duration=duration, end=end_time,
+                          latency=latency, samples=[(end_time, latency, size)],
+                          throughput=size / duration if size and duration > 0 else 0)
+        except Exception as e:
+            end_time = time.time()
+            logging.debug("Replay %s %s failed: %s", command, entry.get('name', ''), e)
+            result.update(status='ERROR', error=str(e), duration=end_time - start_time, throughput=0, end=end_time)
+        return result
+
+    def upload(self, name, size):
+        payload = self.make_payload(size)
+        if self.binary:
+            _, _, _, _, response = self.client.binary_command('UPLOAD', name, payload)
+            return json.loads(response)
+        return self.client.command([f"UPLOAD {name} ", base64.b64encode(payload)])
+
+    def get(self, name):
+        # Return (hasil, bytes isi file yang diterima)
+        if self.binary:
+            _, _, status, _, payload = self.client.binary_command('GET', name)
+            if status != fbp.STATUS_OK:
+                return json.loads(payload), 0
+            return dict(status='OK'), len(payload)
+        hasil = self.client.command(f"GET {name}")
+        if hasil.get('status') != 'OK':
+            return hasil, 0
+        return hasil, b64_size(hasil.get('data_file', ''))
+
+    def simple_command(self, command, name=''):
+        if self.binary:
+            _, _, _, _, response = self.client.binary_command(command.upper(), name)
+            return json.loads(response)
+        return self.client.command(f"{command.upper()} {name}".strip())
+
+    def close(self):
+        self.client.close()